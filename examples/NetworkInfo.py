@@ -18,7 +18,6 @@ from owmeta_core.command import OWM
 from owmeta_core.context import Context
 
 from owmeta.worm import Worm
-from owmeta.neuron import Neuron
 
 print("Connecting to the database using owmeta v%s..." % __version__)
 with OWM('../.owm').connect() as conn:
@@ -33,9 +32,9 @@ with OWM('../.owm').connect() as conn:
     #Make a list of some arbitrary neuron names.
     some_neuron_names = ["ADAL", "AIBL", "I1R", "PVCR", "DD5"]
 
-    #Go through our list and get the neuron object associated with each name.
+    #Get the neuron object associated with each name in our list, all at once.
     #Store these in another list.
-    some_neurons = [ctx(Neuron)(name) for name in some_neuron_names]
+    some_neurons = net.aneurons(some_neuron_names)
 
     print("Going through our list of neurons: %s" % some_neuron_names)
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 """
-This file is used as a module in shortest_path.py
+Computes all pairs shortest paths for a matrix read from a file. See shortest_path.py
+for getting the matrix from owmeta
 """
 
 from __future__ import absolute_import
@@ -12,6 +13,10 @@ import numpy as np
 import fileinput
 from six.moves import range
 from six.moves import zip
+
+from owmeta.analysis.paths import floyd_warshall
+
+
 def lca_table_print_matrix(M,labels,item_width=1):
     for i in labels:
         for j in labels:
@@ -42,13 +47,9 @@ def tree_from_file(file_name):
     return M
 
 def apsp(M):
+    # M may have an extra row at the bottom, which isn't part of the graph
     nv = M.shape[1]
-    for level in range(1,nv+1):
-        for i in range(0,nv):
-            for j in range(0,nv):
-                level_i = min(nv-1,level) # min(4,level) # why the hell is this 4??
-                if (M[i, level_i] + M[level_i, j] < M[i,j]):
-                    M[i,j] = M[i, level_i] + M[level_i, j]
+    floyd_warshall(M[:nv])
 
 if __name__ == '__main__':
     M = tree_from_file(sys.argv[1])
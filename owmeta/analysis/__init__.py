@@ -0,0 +1,10 @@
+'''
+Analyses of the data in owmeta
+
+The modules in this package compute over arrays, like the
+`~owmeta.network.Adjacency` for a `~owmeta.network.Network`, rather than over
+`DataObjects <owmeta_core.dataobject.DataObject>`. They require NumPy, which is installed
+with the ``analysis`` extra::
+
+    pip install owmeta[analysis]
+'''
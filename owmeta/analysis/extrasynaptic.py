@@ -0,0 +1,344 @@
+'''
+Putative extrasynaptic connections between neurons
+
+Monoamines and neuropeptides can act on cells other than those they make synapses with.
+Following `Bentley et al. 2016 <https://doi.org/10.1371/journal.pcbi.1005283>`_, a
+putative extrasynaptic edge goes from every neuron releasing a transmitter to every
+neuron expressing a receptor for that transmitter.
+
+`CellExpression` gathers what each neuron of a network releases, from
+`Neuron.neurotransmitter <owmeta.neuron.Neuron.neurotransmitter>` and
+`Neuron.neuropeptide <owmeta.neuron.Neuron.neuropeptide>`, and what receptors it
+expresses, from `Neuron.receptor <owmeta.neuron.Neuron.receptor>`, with one pass over
+the statements for each property. Both are held as sparse boolean matrices in
+coordinate form. Given a mapping from transmitters to their receptors, typically read
+from a local file with `read_mapping`, `CellExpression.edges` joins the three matrices
+to get the edges. The `CellExpression` can be reused for any number of mappings::
+
+    >>> from owmeta.analysis.extrasynaptic import CellExpression, read_mapping
+    >>> expression = CellExpression.from_network(Worm().get_neuron_network())
+    >>> mapping = read_mapping('monoamine_receptor_expression.tsv', 'monoamine')
+    >>> edges = expression.edges(mapping)
+    >>> edges.write('monoamine_edges.tsv')
+'''
+from collections import defaultdict, namedtuple
+import csv
+
+import numpy as np
+
+from ..bulk_query import objects_of, property_value, property_values
+from ..cell import Cell
+from ..network import Adjacency, Network
+from ..neuron import Neuron
+
+
+Edge = namedtuple('Edge', ('pre_cell', 'post_cell', 'transmitter', 'receptor'))
+'''
+An extrasynaptic edge: names of the releasing cell, the receiving cell, the transmitter,
+and the receptor it acts on
+'''
+
+
+def read_mapping(path, transmitter_column, receptor_column='receptor',
+                 excluded_column='excluded', delimiter='\t'):
+    '''
+    Read a mapping from transmitters to their receptors from a delimited file with a
+    header row, like the tables from Bentley et al. 2016
+
+    Parameters
+    ----------
+    path : str
+        The file path
+    transmitter_column : str
+        Name of the column with the transmitter names
+    receptor_column : str, optional
+        Name of the column with the receptor names
+    excluded_column : str, optional
+        Name of a column which, if present and non-zero in a row, excludes the row
+    delimiter : str, optional
+        The field delimiter. Defaults to tab
+
+    Returns
+    -------
+    dict of str to set of str
+        Mapping from transmitter name to the names of its receptors
+    '''
+    mapping = defaultdict(set)
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f, delimiter=delimiter):
+            excluded = row.get(excluded_column)
+            if excluded and int(excluded):
+                continue
+            mapping[row[transmitter_column].strip()].add(row[receptor_column].strip())
+    return dict(mapping)
+
+
+class _Terms(object):
+    '''
+    Assigns consecutive codes to names
+    '''
+
+    __slots__ = ('names', 'codes', 'ignore_case')
+
+    def __init__(self, ignore_case):
+        self.names = []
+        self.codes = dict()
+        self.ignore_case = ignore_case
+
+    def key(self, name):
+        return name.casefold() if self.ignore_case else name
+
+    def add(self, name):
+        key = self.key(name)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def get(self, name):
+        return self.codes.get(self.key(name))
+
+
+class CellExpression(object):
+    '''
+    The transmitters released and receptors expressed by a set of cells
+
+    Parameters
+    ----------
+    released : dict of str to iterable of str
+        Mapping from cell name to the names of the transmitters it releases
+    expressed : dict of str to iterable of str
+        Mapping from cell name to the names of the receptors it expresses
+    ignore_case : bool, optional
+        If `True`, the default, transmitter and receptor names that differ only in case
+        are treated as the same. The first spelling seen is the one kept
+
+    Attributes
+    ----------
+    cells : list of str
+        Cell names, sorted
+    transmitters : list of str
+        Names of the released transmitters
+    receptors : list of str
+        Names of the expressed receptors
+    released : tuple of numpy.ndarray
+        Sparse boolean matrix of cells by transmitters as a pair of arrays of cell and
+        transmitter codes, one entry per released transmitter
+    expressed : tuple of numpy.ndarray
+        Sparse boolean matrix of receptors by cells as a pair of arrays of receptor and
+        cell codes, one entry per expressed receptor
+    '''
+
+    __slots__ = ('cells', 'transmitters', 'receptors', 'released', 'expressed',
+                 '_transmitter_terms', '_receptor_terms')
+
+    def __init__(self, released, expressed, ignore_case=True):
+        self.cells = sorted(set(released) | set(expressed))
+        cell_codes = {c: i for i, c in enumerate(self.cells)}
+        self._transmitter_terms = _Terms(ignore_case)
+        self._receptor_terms = _Terms(ignore_case)
+        self.released = _coo((cell_codes[c], self._transmitter_terms.add(t))
+                             for c in self.cells for t in sorted(released.get(c, ())))
+        self.expressed = _coo((self._receptor_terms.add(r), cell_codes[c])
+                              for c in self.cells for r in sorted(expressed.get(c, ())))
+        self.transmitters = self._transmitter_terms.names
+        self.receptors = self._receptor_terms.names
+
+    @classmethod
+    def from_network(cls, network, ignore_case=True):
+        '''
+        Gather the transmitters and receptors of the neurons in a network
+
+        The property values for all of the neurons are retrieved in bulk rather than by
+        loading each `~owmeta.neuron.Neuron`.
+
+        Parameters
+        ----------
+        network : owmeta.network.Network
+            The network
+        ignore_case : bool, optional
+            See `CellExpression`
+
+        Returns
+        -------
+        CellExpression
+        '''
+        graph = network.rdf
+        neurons = objects_of(graph, network.identifier if network.defined else None,
+                             Network.neuron)
+        names = property_value(graph, Cell.name, neurons)
+        transmitters = property_values(graph, Neuron.neurotransmitter, neurons)
+        peptides = property_values(graph, Neuron.neuropeptide, neurons)
+        receptors = property_values(graph, Neuron.receptor, neurons)
+        released = defaultdict(set)
+        expressed = defaultdict(set)
+        for n in neurons:
+            name = names.get(n)
+            if name is None:
+                continue
+            name = str(name)
+            released[name].update(str(t) for t in transmitters.get(n, ()))
+            released[name].update(str(t) for t in peptides.get(n, ()))
+            expressed[name].update(str(r) for r in receptors.get(n, ()))
+        return cls(released, expressed, ignore_case)
+
+    def edges(self, mapping):
+        '''
+        Compute the putative extrasynaptic edges for a mapping from transmitters to
+        receptors
+
+        Parameters
+        ----------
+        mapping : dict of str to iterable of str
+            Mapping from transmitter name to the names of its receptors, like one
+            returned by `read_mapping`. Transmitters nothing releases and receptors
+            nothing expresses are ignored
+
+        Returns
+        -------
+        ExtrasynapticEdges
+        '''
+        pairs = set()
+        for transmitter, receptors in mapping.items():
+            t = self._transmitter_terms.get(transmitter)
+            if t is None:
+                continue
+            for receptor in receptors:
+                r = self._receptor_terms.get(receptor)
+                if r is not None:
+                    pairs.add((t, r))
+        acts_on = _coo(pairs)
+
+        # Cells -> transmitters -> receptors -> cells, keeping the transmitter and
+        # receptor for each path
+        pre, transmitter = self.released
+        i, j = _join(transmitter, acts_on[0])
+        pre, transmitter, receptor = pre[i], transmitter[i], acts_on[1][j]
+        i, j = _join(receptor, self.expressed[0])
+        pre, transmitter, receptor = pre[i], transmitter[i], receptor[i]
+        post = self.expressed[1][j]
+
+        order = np.lexsort((receptor, transmitter, post, pre))
+        return ExtrasynapticEdges(self.cells, self.transmitters, self.receptors,
+                                  pre[order], post[order],
+                                  transmitter[order], receptor[order])
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(cells={len(self.cells)},'
+                f' transmitters={len(self.transmitters)},'
+                f' receptors={len(self.receptors)})')
+
+
+class ExtrasynapticEdges(object):
+    '''
+    A table of extrasynaptic edges
+
+    The edges are held as columns of codes into the lists of names, sorted by
+    pre-synaptic cell, post-synaptic cell, transmitter, and receptor
+
+    Attributes
+    ----------
+    cells : list of str
+        Cell names
+    transmitters : list of str
+        Transmitter names
+    receptors : list of str
+        Receptor names
+    pre : numpy.ndarray
+        Codes of the releasing cells
+    post : numpy.ndarray
+        Codes of the receiving cells
+    transmitter : numpy.ndarray
+        Codes of the transmitters
+    receptor : numpy.ndarray
+        Codes of the receptors
+    '''
+
+    __slots__ = ('cells', 'transmitters', 'receptors',
+                 'pre', 'post', 'transmitter', 'receptor')
+
+    def __init__(self, cells, transmitters, receptors, pre, post, transmitter, receptor):
+        self.cells = cells
+        self.transmitters = transmitters
+        self.receptors = receptors
+        self.pre = pre
+        self.post = post
+        self.transmitter = transmitter
+        self.receptor = receptor
+
+    def __len__(self):
+        return len(self.pre)
+
+    def __iter__(self):
+        cells = self.cells
+        transmitters = self.transmitters
+        receptors = self.receptors
+        for pre, post, t, r in zip(self.pre.tolist(), self.post.tolist(),
+                                   self.transmitter.tolist(), self.receptor.tolist()):
+            yield Edge(cells[pre], cells[post], transmitters[t], receptors[r])
+
+    def adjacency(self):
+        '''
+        Returns the edges as an adjacency matrix over the cells
+
+        Returns
+        -------
+        owmeta.network.Adjacency
+            The weight of an edge is the number of transmitter-receptor pairs between
+            the two cells
+        '''
+        size = len(self.cells)
+        keys, counts = np.unique(self.pre.astype(np.int64) * size + self.post,
+                                 return_counts=True)
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // size, minlength=size), out=indptr[1:])
+        return Adjacency(list(self.cells),
+                         {n: i for i, n in enumerate(self.cells)},
+                         indptr.tolist(),
+                         (keys % size).tolist(),
+                         counts.tolist())
+
+    def write(self, path, delimiter='\t'):
+        '''
+        Write the edges to a delimited file with a header row
+
+        Parameters
+        ----------
+        path : str
+            The file path
+        delimiter : str, optional
+            The field delimiter. Defaults to tab
+        '''
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(Edge._fields)
+            writer.writerows(self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(edges={len(self)})'
+
+
+def _coo(entries):
+    '''
+    Returns a pair of code arrays for the (row, column) entries of a boolean matrix,
+    without duplicates
+    '''
+    arr = np.array(sorted(set(entries)), dtype=np.int64).reshape(-1, 2)
+    return arr[:, 0], arr[:, 1]
+
+
+def _join(left, right):
+    '''
+    Returns index arrays ``i`` and ``j`` for all of the pairs with
+    ``left[i] == right[j]``
+    '''
+    order = np.argsort(right, kind='stable')
+    right = right[order]
+    start = np.searchsorted(right, left, 'left')
+    counts = np.searchsorted(right, left, 'right') - start
+    i = np.repeat(np.arange(len(left)), counts)
+    # Position of each result within the run of matches for its left entry
+    offsets = np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)
+    j = order[np.repeat(start, counts) + offsets]
+    return i, j
@@ -0,0 +1,355 @@
+'''
+Shortest paths between cells in a network
+
+Edge weights come from the sum of `Connection.number <owmeta.connection.Connection.number>`
+over the connections between a pair of cells, as recorded in
+`Network.adjacency <owmeta.network.Network.adjacency>`, and are transformed into lengths
+by a weighting. With the default weighting, ``'inverse'``, stronger connections make
+shorter paths.
+
+`floyd_warshall` computes all pairs of distances with one vectorized update per
+intermediate cell, and `dijkstra` computes distances from a batch of sources over the
+sparse form of the matrix, which is cheaper when only a few sources are wanted.
+`shortest_paths` does either for a network, optionally storing the result in a cache
+directory so it's only computed again when the network's connections change.
+
+Example::
+
+    >>> from owmeta.analysis.paths import shortest_paths
+    >>> net = Worm().get_neuron_network()
+    >>> paths = shortest_paths(net, syntype='send', cache_dir='.owm/cache')
+    >>> paths.distance('AVAL', 'PVCL')
+    0.25
+'''
+import hashlib
+import heapq
+import logging
+from os import makedirs, replace
+from os.path import exists, join as p
+import tempfile
+
+import numpy as np
+
+
+L = logging.getLogger(__name__)
+
+WEIGHTINGS = ('inverse', 'hops', 'number')
+'''
+Names of the weightings accepted by the functions in this module:
+
+inverse
+    The length of an edge is one over its weight
+hops
+    Every edge has length one
+number
+    The length of an edge is its weight
+'''
+
+METHODS = ('floyd-warshall', 'dijkstra')
+''' Names of the methods accepted by `shortest_paths` '''
+
+
+class ShortestPaths(object):
+    '''
+    Lengths of the shortest paths between cells
+
+    Attributes
+    ----------
+    names : list of str
+        Cell names. The position of a name is its column in `distances`
+    index : dict
+        Mapping from cell name to column
+    sources : list of str
+        Names of the cells the paths start from. The position of a name is its row in
+        `distances`
+    distances : numpy.ndarray
+        ``distances[i, j]`` is the length of the shortest path from source ``i`` to cell
+        ``j``, or infinity if there's no path
+    '''
+
+    __slots__ = ('names', 'index', 'sources', 'source_index', 'distances')
+
+    def __init__(self, names, distances, sources=None):
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        if sources is None:
+            self.sources = self.names
+            self.source_index = self.index
+        else:
+            self.sources = list(sources)
+            self.source_index = {n: i for i, n in enumerate(self.sources)}
+        self.distances = distances
+
+    def distance(self, pre, post):
+        '''
+        Returns the length of the shortest path from the cell named `pre` to the one
+        named `post`
+        '''
+        return float(self.distances[self.source_index[pre], self.index[post]])
+
+    def save(self, path):
+        '''
+        Write the distances to an ``.npz`` file
+        '''
+        np.savez(path,
+                 names=np.array(self.names, dtype=str),
+                 sources=np.array(self.sources, dtype=str),
+                 distances=self.distances)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Read distances written by `save`
+        '''
+        with np.load(path) as f:
+            return cls([str(n) for n in f['names']],
+                       f['distances'],
+                       [str(n) for n in f['sources']])
+
+    def __repr__(self):
+        return f'{type(self).__name__}(cells={len(self.names)})'
+
+
+def edge_lengths(data, weight='inverse'):
+    '''
+    Returns the lengths of edges with the given weights
+
+    Parameters
+    ----------
+    data : array_like
+        Edge weights, like `Adjacency.data <owmeta.network.Adjacency.data>`
+    weight : str or callable, optional
+        One of `WEIGHTINGS`, or a function from an array of weights to an array of
+        lengths
+
+    Returns
+    -------
+    numpy.ndarray
+    '''
+    data = np.asarray(data, dtype=float)
+    if callable(weight):
+        return np.asarray(weight(data), dtype=float)
+    if weight == 'inverse':
+        with np.errstate(divide='ignore'):
+            return 1.0 / data
+    if weight == 'hops':
+        return np.ones_like(data)
+    if weight == 'number':
+        return data
+    raise ValueError(f'Weighting must be one of {WEIGHTINGS} or a function, not {weight!r}')
+
+
+def distance_matrix(adjacency, weight='inverse', directed=True, cells=None):
+    '''
+    Returns the direct distances between cells as a dense matrix
+
+    Parameters
+    ----------
+    adjacency : owmeta.network.Adjacency
+        The adjacency matrix
+    weight : str or callable, optional
+        How to turn edge weights into lengths. See `edge_lengths`
+    directed : bool, optional
+        If `False`, each edge can be traversed in both directions. Where there are edges
+        both ways between a pair of cells, the shorter is used
+    cells : list of str, optional
+        Names of the cells to include. Defaults to all of the cells in `adjacency`
+
+    Returns
+    -------
+    tuple
+        The list of cell names and the matrix. ``matrix[i, j]`` is the length of the
+        edge from cell ``i`` to cell ``j``, infinity where there's no edge, and zero on
+        the diagonal
+    '''
+    names, indptr, indices, lengths = _csr(adjacency, weight, directed, cells)
+    n = len(names)
+    mat = np.full((n, n), np.inf)
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    # Where there are repeated edges, keep the shortest
+    np.minimum.at(mat, (rows, indices), lengths)
+    np.fill_diagonal(mat, 0)
+    return names, mat
+
+
+def floyd_warshall(dist):
+    '''
+    Computes the lengths of the shortest paths between all pairs of vertices, in place
+
+    Parameters
+    ----------
+    dist : numpy.ndarray
+        Square matrix of direct distances, with infinity where there's no edge, like one
+        returned by `distance_matrix`. Overwritten with the path lengths
+
+    Returns
+    -------
+    numpy.ndarray
+        `dist`
+    '''
+    n = dist.shape[0]
+    if dist.shape != (n, n):
+        raise ValueError(f'Distance matrix must be square, not {dist.shape}')
+    for k in range(n):
+        np.minimum(dist, dist[:, k, np.newaxis] + dist[np.newaxis, k, :], out=dist)
+    return dist
+
+
+def dijkstra(adjacency, sources=None, weight='inverse', directed=True, cells=None):
+    '''
+    Computes the lengths of the shortest paths from each of a batch of cells
+
+    Parameters
+    ----------
+    adjacency : owmeta.network.Adjacency
+        The adjacency matrix
+    sources : list of str, optional
+        Names of the cells to start from. Defaults to all of the cells
+    weight : str or callable, optional
+        How to turn edge weights into lengths. See `edge_lengths`. Lengths must not be
+        negative
+    directed : bool, optional
+        If `False`, each edge can be traversed in both directions
+    cells : list of str, optional
+        Names of the cells to include. Defaults to all of the cells in `adjacency`
+
+    Returns
+    -------
+    ShortestPaths
+    '''
+    names, indptr, indices, lengths = _csr(adjacency, weight, directed, cells)
+    if np.any(lengths < 0):
+        raise ValueError('Edge lengths must not be negative')
+    index = {n: i for i, n in enumerate(names)}
+    source_idx = range(len(names)) if sources is None else [index[s] for s in sources]
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    lengths = lengths.tolist()
+    res = np.full((len(source_idx), len(names)), np.inf)
+    for row, src in enumerate(source_idx):
+        dist = res[row]
+        dist[src] = 0
+        done = set()
+        heap = [(0.0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + lengths[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+    return ShortestPaths(names, res, sources)
+
+
+def shortest_paths(network, syntype=None, weight='inverse', directed=True,
+                   neurons_only=False, method='floyd-warshall', cache_dir=None):
+    '''
+    Computes the lengths of the shortest paths between all pairs of cells in a network
+
+    Parameters
+    ----------
+    network : owmeta.network.Network
+        The network
+    syntype : str, optional
+        If given, only synapses with this `Connection.syntype
+        <owmeta.connection.Connection.syntype>` are used
+    weight : str or callable, optional
+        How to turn edge weights into lengths. See `edge_lengths`
+    directed : bool, optional
+        If `False`, each edge can be traversed in both directions
+    neurons_only : bool, optional
+        If `True`, only paths through the neurons of the network are considered.
+        Otherwise, muscles and other cells taking part in synapses are included
+    method : str, optional
+        One of `METHODS`
+    cache_dir : str, optional
+        Directory in which to store the result. If a result was stored for the same
+        arguments and the same adjacency matrix, it's loaded rather than computed again.
+        Results for `weight` functions aren't stored
+
+    Returns
+    -------
+    ShortestPaths
+    '''
+    if method not in METHODS:
+        raise ValueError(f'Method must be one of {METHODS}, not {method!r}')
+    adjacency = network.adjacency(syntype)
+    cells = sorted(network.neuron_names()) if neurons_only else None
+
+    cache_file = None
+    if cache_dir is not None and not callable(weight):
+        key = _cache_key(adjacency, weight, directed, cells)
+        cache_file = p(cache_dir, f'shortest_paths-{key}.npz')
+        if exists(cache_file):
+            try:
+                return ShortestPaths.load(cache_file)
+            except Exception:
+                L.warning("Unable to read cached shortest paths from %s", cache_file,
+                          exc_info=True)
+
+    if method == 'dijkstra':
+        res = dijkstra(adjacency, weight=weight, directed=directed, cells=cells)
+    else:
+        names, dist = distance_matrix(adjacency, weight, directed, cells)
+        res = ShortestPaths(names, floyd_warshall(dist))
+
+    if cache_file is not None:
+        makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.npz', delete=False) as f:
+            res.save(f)
+        replace(f.name, cache_file)
+    return res
+
+
+def _csr(adjacency, weight, directed, cells):
+    '''
+    Returns the names, row pointers, column indices, and edge lengths for the adjacency
+    restricted to `cells` and, if not `directed`, with the reverse edges added
+    '''
+    names = list(adjacency.names)
+    indptr = np.asarray(adjacency.indptr, dtype=np.int64)
+    rows = np.repeat(np.arange(len(names)), np.diff(indptr))
+    cols = np.asarray(adjacency.indices, dtype=np.int64)
+    lengths = edge_lengths(adjacency.data, weight)
+    if lengths.shape != cols.shape:
+        raise ValueError('Weighting must return one length per edge')
+
+    if cells is not None:
+        keep = np.full(len(names), -1, dtype=np.int64)
+        new_names = []
+        for name in cells:
+            i = adjacency.index.get(name)
+            if i is not None and keep[i] < 0:
+                keep[i] = len(new_names)
+                new_names.append(name)
+        rows = keep[rows]
+        cols = keep[cols]
+        included = (rows >= 0) & (cols >= 0)
+        rows, cols, lengths = rows[included], cols[included], lengths[included]
+        names = new_names
+
+    if not directed:
+        rows, cols = np.concatenate((rows, cols)), np.concatenate((cols, rows))
+        lengths = np.concatenate((lengths, lengths))
+
+    order = np.lexsort((cols, rows))
+    rows, cols, lengths = rows[order], cols[order], lengths[order]
+    indptr = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(names)), out=indptr[1:])
+    return names, indptr, cols, lengths
+
+
+def _cache_key(adjacency, weight, directed, cells):
+    '''
+    Returns a digest of the adjacency matrix and the arguments the paths are computed with
+    '''
+    h = hashlib.sha256()
+    h.update(repr((weight, directed, cells)).encode('utf-8'))
+    h.update(repr(adjacency.names).encode('utf-8'))
+    for column in (adjacency.indptr, adjacency.indices, adjacency.data):
+        h.update(np.asarray(column, dtype=np.int64).tobytes())
+    return h.hexdigest()
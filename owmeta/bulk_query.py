@@ -0,0 +1,217 @@
+'''
+Bulk retrieval and staging of property values
+
+Loading `DataObjects <owmeta_core.dataobject.DataObject>` one at a time and reading
+their properties makes a query per object per property. The functions here instead scan
+the statements for a property once and gather the values for all subjects at the same
+time. Likewise, `stage_triples` stages statements in a context without creating an object
+for each subject.
+'''
+from collections import defaultdict
+
+from owmeta_core.dataobject_property import ContextualizedPropertyValue, DatatypeProperty
+from owmeta_core.statement import Statement
+from rdflib.term import Literal
+
+
+def property_link(prop):
+    '''
+    Returns the predicate URI for a property
+
+    Parameters
+    ----------
+    prop : owmeta_core.dataobject.PropertyProperty or rdflib.term.URIRef
+        The property, typically accessed from a class like ``Neuron.receptor``, or the
+        predicate URI itself
+    '''
+    return getattr(prop, 'link', prop)
+
+
+def python_value(term):
+    '''
+    Converts a literal to the corresponding Python value and leaves other terms as they
+    are
+    '''
+    if isinstance(term, Literal):
+        return term.toPython()
+    return term
+
+
+def property_values(graph, prop, subjects=None, to_python=True):
+    '''
+    Gets all values of a property in one pass over the graph
+
+    Parameters
+    ----------
+    graph : rdflib.graph.Graph
+        The graph to query
+    prop : owmeta_core.dataobject.PropertyProperty or rdflib.term.URIRef
+        The property to get values for
+    subjects : set, optional
+        If given, only values for these subjects are returned
+    to_python : bool, optional
+        If `True` (the default), literal values are converted to Python values
+
+    Returns
+    -------
+    dict
+        Mapping from subject to a `set` of values
+    '''
+    res = defaultdict(set)
+    for s, _, o in graph.triples((None, property_link(prop), None)):
+        if subjects is not None and s not in subjects:
+            continue
+        res[s].add(python_value(o) if to_python else o)
+    return res
+
+
+def property_value(graph, prop, subjects=None, to_python=True):
+    '''
+    Like `property_values`, but for single-valued properties
+
+    When there is more than one value for a subject, an arbitrary one is returned
+
+    Returns
+    -------
+    dict
+        Mapping from subject to value
+    '''
+    res = dict()
+    for s, _, o in graph.triples((None, property_link(prop), None)):
+        if subjects is not None and s not in subjects:
+            continue
+        res[s] = python_value(o) if to_python else o
+    return res
+
+
+def objects_of(graph, subject, prop):
+    '''
+    Gets the set of objects of a property for one subject, or, if `subject` is `None`,
+    for all subjects
+    '''
+    return set(o for _, _, o in graph.triples((subject, property_link(prop), None)))
+
+
+class PrefetchMixin(object):
+    '''
+    Mixin for a `~owmeta_core.dataobject_property.DatatypeProperty` which returns the
+    values retrieved by `prefetch` for its owner rather than querying for them
+    '''
+
+    def get(self):
+        values = _prefetched(self.owner, self.linkName, self.context)
+        if values is None:
+            return super(PrefetchMixin, self).get()
+        deserialize = self.resolver.deserializer
+        res = [deserialize(v) for v in values]
+        for x in self.defined_values:
+            v = deserialize(x.idl)
+            if v not in res:
+                res.append(v)
+        return iter(res)
+
+
+def _prefetched(owner, link_name, context):
+    try:
+        ctxid, values = owner._prefetched_values
+    except AttributeError:
+        return None
+    if ctxid != getattr(context, 'identifier', None):
+        return None
+    return values.get(link_name)
+
+
+def prefetch(graph, objects, properties):
+    '''
+    Retrieves the values of datatype properties for many objects at once
+
+    The values are attached to the objects so that calling one of the `properties` on
+    any of them returns the retrieved values without making a query. Only properties
+    declared with `PrefetchMixin` can be prefetched.
+
+    Parameters
+    ----------
+    graph : rdflib.graph.Graph
+        The graph to query
+    objects : list of owmeta_core.dataobject.DataObject
+        The objects to retrieve values for. Typically, the result of a
+        `~owmeta_core.dataobject.DataObject.load`
+    properties : list of owmeta_core.dataobject.PropertyProperty
+        The properties to retrieve values for, accessed from a class like
+        ``Neuron.receptor``
+
+    Returns
+    -------
+    list
+        `objects`
+    '''
+    props = []
+    for prop in properties:
+        prop_cls = getattr(prop, 'property', None)
+        if not (isinstance(prop_cls, type) and
+                issubclass(prop_cls, DatatypeProperty) and
+                issubclass(prop_cls, PrefetchMixin)):
+            raise ValueError('{!r} is not a datatype property that can be prefetched'.format(prop))
+        props.append(prop)
+
+    by_ident = defaultdict(list)
+    for o in objects:
+        by_ident[o.identifier].append(o)
+
+    fetched = defaultdict(dict)
+    for prop in props:
+        values = property_values(graph, prop, by_ident, to_python=False)
+        for ident in by_ident:
+            fetched[ident][prop.linkName] = values.get(ident, ())
+
+    for ident, objs in by_ident.items():
+        for o in objs:
+            attach_prefetched(o, fetched[ident])
+    return objects
+
+
+def attach_prefetched(obj, values):
+    '''
+    Attaches already retrieved property values to an object, as `prefetch` does
+
+    Parameters
+    ----------
+    obj : owmeta_core.dataobject.DataObject
+        The object
+    values : dict
+        Mapping from the `linkName` of a property declared with `PrefetchMixin` to the
+        RDF terms of its values
+    '''
+    ctxid = getattr(obj.context, 'identifier', None)
+    previous = getattr(obj, '_prefetched_values', None)
+    if previous is not None and previous[0] == ctxid:
+        previous[1].update(values)
+    else:
+        obj._prefetched_values = (ctxid, dict(values))
+
+
+def stage_triples(context, triples):
+    '''
+    Stages statements in a context as if they were made through objects contextualized
+    by it, but without creating the objects
+
+    Parameters
+    ----------
+    context : owmeta_core.context.Context
+        The context to stage the statements in
+    triples : iterable of tuple
+        Subject, property, and object for each statement. The subject and object are
+        `rdflib terms <rdflib.term.Identifier>`, and the property is accessed from a
+        class, like ``Cell.parentOf`` or, for ``rdf:type``, ``Cell.rdf_type_property``
+
+    Returns
+    -------
+    int
+        The number of statements staged
+    '''
+    count = 0
+    for s, p, o in triples:
+        context.add_statement(Statement(ContextualizedPropertyValue(s), p,
+                                        ContextualizedPropertyValue(o), context))
+        count += 1
+    return count
@@ -2,6 +2,7 @@ from __future__ import print_function
 
 from owmeta_core.dataobject import DatatypeProperty, ObjectProperty, This
 
+from .bulk_query import PrefetchMixin, prefetch as prefetch_values
 from .channel import Channel
 from .biology import BiologyType
 from .cell_common import CELL_RDF_TYPE
@@ -31,25 +32,25 @@ class Cell(BiologyType):
 
     rdf_type = CELL_RDF_TYPE
 
-    divisionVolume = DatatypeProperty()
+    divisionVolume = DatatypeProperty(mixins=(PrefetchMixin,))
     ''' The volume of the cell at division '''
 
-    name = DatatypeProperty()
+    name = DatatypeProperty(mixins=(PrefetchMixin,))
     ''' The 'adult' name of the cell typically used by biologists when discussing C. elegans '''
 
-    wormbaseID = DatatypeProperty()
+    wormbaseID = DatatypeProperty(mixins=(PrefetchMixin,))
 
-    description = DatatypeProperty()
+    description = DatatypeProperty(mixins=(PrefetchMixin,))
     ''' A description of the cell '''
 
     channel = ObjectProperty(value_type=Channel,
                              multiple=True,
                              inverse_of=(Channel, 'appearsIn'))
 
-    lineageName = DatatypeProperty()
+    lineageName = DatatypeProperty(mixins=(PrefetchMixin,))
     ''' The lineageName of the cell '''
 
-    synonym = DatatypeProperty(multiple=True)
+    synonym = DatatypeProperty(multiple=True, mixins=(PrefetchMixin,))
 
     daughterOf = ObjectProperty(value_type=This,
                                 inverse_of=(This, 'parentOf'))
@@ -65,6 +66,31 @@ class Cell(BiologyType):
         # convenience
         super(Cell, self).__init__(name=name, lineageName=lineageName, **kwargs)
 
+    def load(self, graph=None, prefetch=()):
+        '''
+        Loads cells matching this one
+
+        Parameters
+        ----------
+        graph : rdflib.graph.ConjunctiveGraph
+            the RDF graph to load from. optional
+        prefetch : tuple of str
+            Names of datatype properties, like ``'name'`` or ``'receptor'``, whose values
+            should be retrieved for all of the loaded cells with one query per property.
+            Calling these properties on the loaded cells doesn't query the graph again.
+            optional
+
+        Example::
+
+            neurons = ctx.stored(Neuron).query().load(prefetch=('name', 'receptor'))
+            receptors = {n.name(): n.receptor() for n in neurons} # no more queries
+        '''
+        res = super(Cell, self).load(graph)
+        if not prefetch:
+            return res
+        props = [getattr(type(self), p) for p in prefetch]
+        return iter(prefetch_values(self.rdf if graph is None else graph, list(res), props))
+
     def blast(self):
         """
         Return the blast name.
@@ -0,0 +1,266 @@
+'''
+Resolution of cell names to cells
+
+Our sources name cells in several ways: with extra zeros, like ``VD01``, with ``BWM`` in
+body wall muscle names, or with names that differ from the WormBase cell list, like
+``ANAL`` for ``MU_ANAL``. `canonical_cell_name <owmeta.utils.canonical_cell_name>` turns
+these into the names used in owmeta, and cells may have further
+`~owmeta.cell.Cell.synonym` values.
+
+`CellNameIndex` maps all of these names to cell identifiers, so a batch of names can be
+resolved without a query per name::
+
+    >>> from owmeta.cell_names import cell_name_index
+    >>> index = cell_name_index(ctx.stored, cache_dir='.owm/cache')
+    >>> index.resolve(['AVAL', 'VD01', 'ANAL'])
+    {'AVAL': rdflib.term.URIRef('http://data.openworm.org/sci/bio/Neuron#AVAL'), ...}
+
+The index for a context is cached in memory until the context changes. For a context
+kept in a ZODB database, like the one in an ``owm`` project, it can also be saved in a
+directory so it's reused between runs.
+'''
+import hashlib
+import logging
+from os import close, makedirs, replace
+from os.path import exists, join as p
+import pickle
+import tempfile
+
+from .bulk_query import property_value, property_values
+from .cell import Cell
+from .context_cache import ContextCache, stored_revision
+from .utils import canonical_cell_name
+
+
+L = logging.getLogger(__name__)
+
+CELL_NAME_CACHE = ContextCache()
+'''
+Cache for the indices returned by `cell_name_index`
+'''
+
+FORMAT_VERSION = 1
+''' Version of the layout written by `CellNameIndex.save` '''
+
+
+class CellNameIndex(object):
+    '''
+    An index from the names of cells to their identifiers
+
+    A name is looked up, in order, as:
+
+    1. the `~owmeta.cell.Cell.name` of a cell
+    2. the canonical form of the name of a cell
+    3. a `~owmeta.cell.Cell.synonym` of a cell
+    4. the canonical form of a synonym of a cell
+
+    where the canonical form is given by `~owmeta.utils.canonical_cell_name`, which is
+    also applied to the name being looked up for 2 and 4. The first of these that matches
+    any cells decides the result. If it matches more than one cell, the name is
+    ambiguous and doesn't resolve.
+
+    Attributes
+    ----------
+    levels : tuple of dict
+        For each of the kinds of names above, a mapping from name to a `frozenset` of
+        cell identifiers
+    '''
+
+    __slots__ = ('levels',)
+
+    def __init__(self, levels):
+        self.levels = levels
+
+    @classmethod
+    def from_graph(cls, graph):
+        '''
+        Build an index from the name and synonym statements in a graph
+
+        Parameters
+        ----------
+        graph : rdflib.graph.Graph
+            The graph
+
+        Returns
+        -------
+        CellNameIndex
+        '''
+        names = property_value(graph, Cell.name)
+        synonyms = property_values(graph, Cell.synonym)
+        levels = (dict(), dict(), dict(), dict())
+
+        def add(level, name, ident):
+            levels[level].setdefault(name, set()).add(ident)
+
+        for ident, name in names.items():
+            name = str(name)
+            add(0, name, ident)
+            add(1, canonical_cell_name(name), ident)
+        for ident, values in synonyms.items():
+            for synonym in values:
+                synonym = str(synonym)
+                add(2, synonym, ident)
+                add(3, canonical_cell_name(synonym), ident)
+        return cls(tuple({k: frozenset(v) for k, v in level.items()} for level in levels))
+
+    def candidates(self, name):
+        '''
+        Get the identifiers of the cells a name could refer to
+
+        Parameters
+        ----------
+        name : str
+            The name
+
+        Returns
+        -------
+        frozenset
+            The identifiers from the first kind of name that matches. More than one
+            means the name is ambiguous
+        '''
+        canonical = None
+        for i, level in enumerate(self.levels):
+            if i % 2 == 0:
+                key = name
+            else:
+                if canonical is None:
+                    canonical = canonical_cell_name(name)
+                key = canonical
+            res = level.get(key)
+            if res:
+                return res
+        return frozenset()
+
+    def identifier(self, name):
+        '''
+        Get the identifier of the cell with a name
+
+        Parameters
+        ----------
+        name : str
+            The name
+
+        Returns
+        -------
+        rdflib.term.URIRef
+            The identifier, or `None` if the name doesn't resolve
+        '''
+        res = self.candidates(name)
+        if len(res) == 1:
+            ident, = res
+            return ident
+        return None
+
+    def resolve(self, names):
+        '''
+        Get the identifiers of the cells with several names
+
+        Parameters
+        ----------
+        names : iterable of str
+            The names
+
+        Returns
+        -------
+        dict
+            Mapping from each of the names that resolve to the cell identifier
+        '''
+        res = dict()
+        for name in names:
+            ident = self.identifier(name)
+            if ident is not None:
+                res[name] = ident
+        return res
+
+    def save(self, path, fingerprint=None):
+        '''
+        Write the index to a file
+
+        Parameters
+        ----------
+        path : str
+            The file path
+        fingerprint : object, optional
+            Identifies the state of the data the index was built from. Returned by
+            `load`
+        '''
+        with open(path, 'wb') as f:
+            pickle.dump((FORMAT_VERSION, fingerprint, self.levels), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Read an index written by `save`
+
+        Returns
+        -------
+        tuple
+            The index and the fingerprint passed to `save`
+        '''
+        with open(path, 'rb') as f:
+            version, fingerprint, levels = pickle.load(f)
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported cell name index version {version} in {path}')
+        return cls(levels), fingerprint
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def __repr__(self):
+        return '{}(names={}, synonyms={})'.format(type(self).__name__,
+                                                  len(self.levels[0]),
+                                                  len(self.levels[2]))
+
+
+def cell_name_index(context, cache_dir=None):
+    '''
+    Get the `CellNameIndex` for the cells in a context
+
+    The index is built with a bulk query each for names and synonyms the first time it's
+    needed, and is cached until the context changes.
+
+    Parameters
+    ----------
+    context : owmeta_core.context.Context
+        The context. Typically, a stored context like ``ctx.stored``
+    cache_dir : str, optional
+        Directory in which to save the index. If an index was saved there for the same
+        context, and the store hasn't changed since, it's loaded rather than built again.
+        Only used for stores with a `~owmeta.context_cache.stored_revision`
+
+    Returns
+    -------
+    CellNameIndex
+    '''
+    return CELL_NAME_CACHE.get(context, ('cell_name_index', cache_dir),
+                               lambda: _make_index(context, cache_dir))
+
+
+def _make_index(context, cache_dir):
+    ident = getattr(context, 'identifier', None)
+    revision = None
+    if cache_dir is not None and ident is not None:
+        revision = stored_revision(context)
+    if revision is None:
+        return CellNameIndex.from_graph(context.rdf_graph())
+
+    fingerprint = (str(ident), revision)
+    key = hashlib.sha256(str(ident).encode('utf-8')).hexdigest()
+    cache_file = p(cache_dir, f'cell_names-{key}.pickle')
+    if exists(cache_file):
+        try:
+            index, saved_fingerprint = CellNameIndex.load(cache_file)
+            if saved_fingerprint == fingerprint:
+                return index
+        except Exception:
+            L.warning("Unable to read cached cell name index from %s", cache_file,
+                      exc_info=True)
+
+    index = CellNameIndex.from_graph(context.rdf_graph())
+    makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.pickle')
+    close(fd)
+    index.save(tmp, fingerprint)
+    replace(tmp, cache_file)
+    return index
@@ -7,6 +7,11 @@ CLI_HINTS = {
                 'names': ['identifier'],
             },
         },
+        'supported_by': {
+            (METHOD_NAMED_ARG, 'document'): {
+                'names': ['document'],
+            },
+        },
     },
     'owmeta.commands.biology.CellCmd': {
         'show': {
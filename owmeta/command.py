@@ -1,8 +1,9 @@
 from __future__ import print_function, absolute_import
 
 import logging
+from os.path import join as p
 
-from owmeta_core.command_util import GenericUserError
+from owmeta_core.command_util import GenericUserError, GeneratorWithData
 from owmeta_core.dataobject import DataObject
 
 from .commands.biology import CellCmd
@@ -54,6 +55,78 @@ class OWMEvidence(object):
                 evq = l.evidence_context.stored(Evidence).query()
                 self._message_evidence(evq)
 
+    def coverage(self, contexts=False):
+        '''
+        Reports what fraction of the statements about neurons, muscles, connections, and
+        channels are in contexts supported by evidence
+
+        Parameters
+        ----------
+        contexts : bool
+            If set, also list each context, whether it is supported, and how many
+            statements about each type it has, as the contexts are counted
+        '''
+        from owmeta.evidence import EvidenceCoverage
+        ctx = self._parent._default_ctx.stored
+        cov = EvidenceCoverage(ctx.rdf_graph())
+        msg = self._parent.message
+        for c in cov.contexts():
+            if contexts:
+                counts = ', '.join(f'{t.__name__}: {n}' for t, n in c.counts.items())
+                msg(('+' if c.supported else '-'), c.context, counts)
+
+        def fraction(tc):
+            f = tc.fraction
+            return 'N/A' if f is None else f'{f:.1%}'
+
+        return GeneratorWithData(cov.summary(),
+                header=('Type', 'Supported', 'Total', 'Fraction'),
+                columns=(lambda tc: tc.type.__name__,
+                         lambda tc: tc.supported,
+                         lambda tc: tc.total,
+                         fraction),
+                text_format=lambda tc: (f'{tc.type.__name__}: {tc.supported}/{tc.total}'
+                                        f' ({fraction(tc)})'))
+
+    def supported_by(self, document, statements=False, offset=0, limit=None):
+        '''
+        Lists the contexts supported by evidence with the given document, or other
+        reference, and the number of statements in each
+
+        Parameters
+        ----------
+        document : str
+            The document, or other reference, to list the supported contexts for
+        statements : bool
+            If set, list the supported statements rather than the contexts
+        offset : int
+            Number of contexts or statements to skip. optional
+        limit : int
+            Maximum number of contexts or statements to list. optional
+        '''
+        from owmeta.evidence import evidence_index_for_reference
+        ctx = self._parent._default_ctx.stored
+        graph = ctx.rdf_graph()
+        document = self._parent._den3(document)
+        offset = int(offset)
+        limit = None if limit is None else int(limit)
+        # The index is saved in the project's cache directory so it's only built again
+        # once the store changes
+        cache_dir = p(self._parent.owmdir, 'cache', 'evidence')
+        index = evidence_index_for_reference(ctx, document, cache_dir=cache_dir)
+        if statements:
+            return GeneratorWithData(
+                    index.statements_supported_by(graph, document, offset, limit),
+                    header=('Subject', 'Predicate', 'Object', 'Context'),
+                    columns=tuple,
+                    text_format=lambda q: ' '.join(x.n3() for x in q))
+        contexts = index.contexts_supported_by(document)
+        stop = None if limit is None else offset + limit
+        return GeneratorWithData(contexts[offset:stop],
+                header=('Context', 'Statements'),
+                columns=tuple,
+                text_format=lambda c: f'{c[0]} {c[1]}')
+
     def _message_evidence(self, evq):
         from owmeta.website import Website
         from owmeta.document import Document
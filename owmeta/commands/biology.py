@@ -1,7 +1,14 @@
+import logging
+from os.path import join as p
+
 import six
 
 from owmeta_core.command_util import GeneratorWithData
 from ..cell import Cell
+from ..cell_names import cell_name_index
+
+
+L = logging.getLogger(__name__)
 
 
 class CellCmd(object):
@@ -19,7 +26,7 @@ class CellCmd(object):
         Parameters
         ----------
         cell_name_or_id : str
-            Cell name or Cell URI
+            Cell name, synonym, or Cell URI
         context : str
             Context to search in. Optional, defaults to the default context.
         '''
@@ -27,16 +34,27 @@ class CellCmd(object):
         if not context:
             ctx = self._parent._default_ctx
         else:
-            ctx = Context(context)
+            ctx = self._parent._make_ctx(context)
 
         def helper():
-            for cell in ctx.stored(Cell).query(name=cell_name_or_id).load():
+            # Resolve names, including synonyms and names as they appear in our
+            # sources, with the cached index rather than a query per name. The index is
+            # saved in the project's cache directory so it's reused between runs
+            cache_dir = p(self._parent.owmdir, 'cache', 'cell_names')
+            index = cell_name_index(ctx.stored, cache_dir=cache_dir)
+            candidates = index.candidates(cell_name_or_id)
+            if len(candidates) > 1:
+                self._parent.message(f'{cell_name_or_id} is ambiguous. It could name any of:')
+                for ident in sorted(candidates):
+                    self._parent.message('   ', ident)
+                return
+            if candidates:
+                uri, = candidates
+            else:
+                uri = self._parent._den3(cell_name_or_id)
+            for cell in ctx.stored(Cell)(ident=uri).load():
                 yield cell
                 break
-            else: # no break
-                uri = self._parent._den3(cell_name_or_id)
-                for x in ctx.stored(Cell)(ident=uri).load():
-                    yield cell
 
         def fmt_text(cell):
             try:
@@ -4,11 +4,12 @@ from __future__ import unicode_literals
 
 import six
 from owmeta_core.dataobject import DatatypeProperty, ObjectProperty
+from rdflib.term import Identifier, Literal
 
 from .biology import BiologyType
 from .cell import Cell
 
-__all__ = ['Connection']
+__all__ = ['Connection', 'count_connections', 'connection_counts', 'connection_terms']
 
 
 class SynapseType:
@@ -16,6 +17,20 @@ class SynapseType:
     GapJunction = 'gapJunction'
 
 
+def normalize_syntype(syntype):
+    '''
+    Returns the `SynapseType` value for a synapse type name, ignoring case, or `None` if
+    the name is not recognized
+    '''
+    if isinstance(syntype, six.string_types):
+        syntype = syntype.lower()
+        if syntype in ('send', SynapseType.Chemical):
+            return SynapseType.Chemical
+        elif syntype in ('gapjunction', SynapseType.GapJunction):
+            return SynapseType.GapJunction
+    return None
+
+
 class Termination:
     Neuron = 'neuron'
     Muscle = 'muscle'
@@ -68,12 +83,9 @@ class Connection(BiologyType):
             elif termination in ('muscle', Termination.Muscle):
                 self.termination(Termination.Muscle)
 
-        if isinstance(syntype, six.string_types):
-            syntype = syntype.lower()
-            if syntype in ('send', SynapseType.Chemical):
-                self.syntype(SynapseType.Chemical)
-            elif syntype in ('gapjunction', SynapseType.GapJunction):
-                self.syntype(SynapseType.GapJunction)
+        syntype = normalize_syntype(syntype)
+        if syntype is not None:
+            self.syntype(syntype)
 
     def __str__(self):
         nom = []
@@ -87,3 +99,159 @@ class Connection(BiologyType):
             return 'Connection(' + \
                    ', '.join('{}={}'.format(n[0], n[1]) for n in nom) + \
                    ')'
+
+
+_END_PROPERTIES = {
+    'pre': Connection.pre_cell,
+    'post': Connection.post_cell,
+}
+
+_COUNT_QUERY = '''
+SELECT (COUNT(DISTINCT ?conn) AS ?count) WHERE {{
+    ?conn <{end}> ?cell ;
+          <{syntype}> ?syntype .
+}}
+'''
+
+_GROUPED_COUNT_QUERY = '''
+SELECT ?cell ?syntype (COUNT(DISTINCT ?conn) AS ?count) WHERE {{
+    {network}
+    ?conn <{end}> ?cell ;
+          <{syntype}> ?syntype .
+}} GROUP BY ?cell ?syntype
+'''
+
+
+_TERMS_QUERY = '''
+SELECT DISTINCT ?cell ?conn WHERE {{
+    VALUES ?cell {{ {cells} }}
+    {ends}
+    {filters}
+}}
+'''
+
+
+def _end_link(end):
+    try:
+        return _END_PROPERTIES[end].link
+    except KeyError:
+        raise ValueError('Connection end must be one of {}, not {!r}'.format(
+            tuple(_END_PROPERTIES), end))
+
+
+def count_connections(graph, cell, end='pre', syntype=None):
+    '''
+    Counts the connections at one end of which is `cell` with a single aggregate query
+
+    Parameters
+    ----------
+    graph : rdflib.graph.Graph
+        The graph to query. Typically, the `~owmeta_core.dataobject.DataObject.rdf` of
+        a `~owmeta.cell.Cell`
+    cell : rdflib.term.URIRef
+        Identifier of the cell
+    end : str
+        Which end of the connection `cell` is at: 'pre' or 'post'
+    syntype : str, optional
+        If given, only connections with this `Connection.syntype` are counted
+
+    Returns
+    -------
+    int
+        The number of connections
+    '''
+    query = _COUNT_QUERY.format(end=_end_link(end), syntype=Connection.syntype.link)
+    bindings = {'cell': cell}
+    if syntype is not None:
+        bindings['syntype'] = Literal(syntype)
+    for row in graph.query(query, initBindings=bindings):
+        return int(row[0])
+    return 0
+
+
+def connection_counts(graph, end='pre', network=None):
+    '''
+    Counts connections for all cells at once with a grouped aggregate query
+
+    Parameters
+    ----------
+    graph : rdflib.graph.Graph
+        The graph to query
+    end : str
+        Which end of the connections to group by: 'pre' or 'post'
+    network : rdflib.term.URIRef, optional
+        Identifier of a `~owmeta.network.Network`. If given, only the network's
+        `~owmeta.network.Network.synapse` values are counted. Otherwise, every connection
+        in `graph` is counted
+
+    Returns
+    -------
+    dict
+        Mapping from pairs of cell identifier and `Connection.syntype` to the number of
+        connections
+    '''
+    network_pattern = ''
+    if network is not None:
+        from .network import Network
+        network_pattern = f'{network.n3()} <{Network.synapse.link}> ?conn .'
+    query = _GROUPED_COUNT_QUERY.format(network=network_pattern,
+                                        end=_end_link(end),
+                                        syntype=Connection.syntype.link)
+    return {(row[0], row[1].toPython()): int(row[2]) for row in graph.query(query)}
+
+
+def connection_terms(graph, cells, end='either', **filters):
+    '''
+    Gets the identifiers of the connections for many cells with a single query
+
+    Parameters
+    ----------
+    graph : rdflib.graph.Graph
+        The graph to query
+    cells : iterable of rdflib.term.URIRef
+        Identifiers of the cells
+    end : str
+        Which end of the connection the cells should be at: 'pre', 'post', or 'either'.
+        With 'either', a connection from a cell to itself is only returned once
+    **filters
+        Values for other properties of `Connection`, like ``syntype='send'``. Values
+        may be RDF terms, `~owmeta_core.dataobject.DataObject` instances with identifiers,
+        or literal values
+
+    Returns
+    -------
+    dict
+        Mapping from each cell identifier to the `set` of identifiers for its
+        connections
+    '''
+    cells = list(cells)
+    res = {c: set() for c in cells}
+    if not cells:
+        return res
+
+    if end == 'either':
+        ends = '{{ ?conn <{}> ?cell }} UNION {{ ?conn <{}> ?cell }}'.format(
+                Connection.pre_cell.link, Connection.post_cell.link)
+    else:
+        ends = '?conn <{}> ?cell .'.format(_end_link(end))
+
+    patterns = []
+    for name, value in sorted(filters.items()):
+        prop = getattr(Connection, name, None)
+        link = getattr(prop, 'link', None)
+        if link is None:
+            raise ValueError('{!r} is not a property of Connection'.format(name))
+        if isinstance(value, Identifier):
+            term = value
+        elif hasattr(value, 'idl'):
+            term = value.identifier
+        else:
+            term = Literal(value)
+        patterns.append('?conn <{}> {} .'.format(link, term.n3()))
+
+    query = _TERMS_QUERY.format(cells=' '.join(c.n3() for c in cells),
+                                ends=ends,
+                                filters='\n    '.join(patterns))
+    for cell, conn in graph.query(query):
+        res[cell].add(conn)
+    return res
@@ -0,0 +1,421 @@
+'''
+Columnar snapshots of the connections in a `~owmeta.network.Network`
+
+Loading thousands of `~owmeta.connection.Connection` objects takes much more time and
+memory than most analyses of them. A `ConnectionTable` instead holds each property of the
+connections as a NumPy array, with cells, synapse types, terminations, and synapse
+classes stored as small integer codes, so connections can be filtered and grouped with
+array operations. Tables are immutable and can be saved to and loaded from ``.npz``
+files, optionally memory-mapped.
+
+Requires NumPy, which is installed with the ``analysis`` extra.
+'''
+import zipfile
+
+import numpy as np
+
+from .bulk_query import objects_of, property_value
+from .cell import Cell
+from .connection import Connection, SynapseType, Termination
+from .network import Network
+
+
+FORMAT_VERSION = 1
+''' Version of the ``.npz`` layout written by `ConnectionTable.save` '''
+
+SYNTYPES = (None, SynapseType.Chemical, SynapseType.GapJunction)
+''' `Connection.syntype <owmeta.connection.Connection.syntype>` values by code '''
+
+TERMINATIONS = (None, Termination.Neuron, Termination.Muscle)
+''' `Connection.termination <owmeta.connection.Connection.termination>` values by code '''
+
+MISSING = -1
+''' Code for a missing `~ConnectionTable.number` or `~ConnectionTable.synclass` '''
+
+_COLUMNS = ('pre', 'post', 'syntype', 'termination', 'number', 'synclass')
+_ARRAYS = _COLUMNS + ('names', 'synclasses')
+
+
+class ConnectionTable(object):
+    '''
+    An immutable, column-oriented table of connections
+
+    Row ``i`` describes one connection. The arrays are read-only.
+
+    Attributes
+    ----------
+    names : numpy.ndarray
+        Cell names, sorted. A cell's code is the position of its name
+    pre : numpy.ndarray
+        Code of the pre-synaptic cell for each connection, as ``int32``
+    post : numpy.ndarray
+        Code of the post-synaptic cell for each connection, as ``int32``
+    syntype : numpy.ndarray
+        Index into `SYNTYPES` for each connection, as ``int8``
+    termination : numpy.ndarray
+        Index into `TERMINATIONS` for each connection, as ``int8``
+    number : numpy.ndarray
+        `Connection.number <owmeta.connection.Connection.number>` for each connection,
+        as ``int32``, or `MISSING`
+    synclass : numpy.ndarray
+        Index into `synclasses` for each connection, as ``int16``, or `MISSING`
+    synclasses : numpy.ndarray
+        The distinct `Connection.synclass <owmeta.connection.Connection.synclass>`
+        values, sorted
+    '''
+
+    __slots__ = _ARRAYS + ('_index',)
+
+    def __init__(self, names, pre, post, syntype, termination, number, synclass,
+                 synclasses):
+        arrays = dict(names=_str_array(names),
+                      pre=np.asanyarray(pre, dtype=np.int32),
+                      post=np.asanyarray(post, dtype=np.int32),
+                      syntype=np.asanyarray(syntype, dtype=np.int8),
+                      termination=np.asanyarray(termination, dtype=np.int8),
+                      number=np.asanyarray(number, dtype=np.int32),
+                      synclass=np.asanyarray(synclass, dtype=np.int16),
+                      synclasses=_str_array(synclasses))
+        size = len(arrays['pre'])
+        for name in _COLUMNS:
+            if len(arrays[name]) != size:
+                raise ValueError(f'Column {name!r} has {len(arrays[name])} rows, but'
+                                 f' {size} were expected')
+        for name, arr in arrays.items():
+            if arr.flags.writeable:
+                # A read-only view, so the caller's array stays writeable
+                arr = arr.view()
+                arr.flags.writeable = False
+            object.__setattr__(self, name, arr)
+        object.__setattr__(self, '_index', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    @classmethod
+    def from_network(cls, network):
+        '''
+        Build a table from the synapses of a network
+
+        The property values for all of the connections are retrieved in bulk rather than
+        by loading each `~owmeta.connection.Connection`. Every neuron in the network and
+        every cell taking part in a synapse gets a code.
+
+        Parameters
+        ----------
+        network : owmeta.network.Network
+            The network
+
+        Returns
+        -------
+        ConnectionTable
+        '''
+        graph = network.rdf
+        key = network.identifier if network.defined else None
+        conns = objects_of(graph, key, Network.synapse)
+        pre = property_value(graph, Connection.pre_cell, conns)
+        post = property_value(graph, Connection.post_cell, conns)
+        conns = sorted(c for c in conns if c in pre and c in post)
+        syntypes = property_value(graph, Connection.syntype, conns)
+        terminations = property_value(graph, Connection.termination, conns)
+        numbers = property_value(graph, Connection.number, conns)
+        synclasses = property_value(graph, Connection.synclass, conns)
+
+        cells = objects_of(graph, key, Network.neuron)
+        cells.update(pre.values())
+        cells.update(post.values())
+        cell_names = property_value(graph, Cell.name, cells)
+        name_of = {c: str(cell_names.get(c, c)) for c in cells}
+        names = sorted(set(name_of.values()))
+        index = {n: i for i, n in enumerate(names)}
+
+        synclass_names = sorted(set(str(v) for v in synclasses.values()))
+        synclass_index = {n: i for i, n in enumerate(synclass_names)}
+
+        return cls(names=names,
+                   pre=[index[name_of[pre[c]]] for c in conns],
+                   post=[index[name_of[post[c]]] for c in conns],
+                   syntype=[_code(SYNTYPES, syntypes.get(c)) for c in conns],
+                   termination=[_code(TERMINATIONS, terminations.get(c)) for c in conns],
+                   number=[_int_or_missing(numbers.get(c)) for c in conns],
+                   synclass=[synclass_index[str(synclasses[c])] if c in synclasses
+                             else MISSING for c in conns],
+                   synclasses=synclass_names)
+
+    def save(self, path):
+        '''
+        Write the table to an uncompressed ``.npz`` file
+
+        Parameters
+        ----------
+        path : str
+            The file path
+        '''
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        '''
+        Read a table written by `save`
+
+        Parameters
+        ----------
+        path : str
+            The file path
+        mmap : bool, optional
+            If `True`, the arrays are memory-mapped from the file rather than read into
+            memory
+
+        Returns
+        -------
+        ConnectionTable
+        '''
+        return cls.from_arrays(read_npz(path, mmap), path)
+
+    def arrays(self):
+        '''
+        Returns the arrays written by `save`, including the format version
+
+        Returns
+        -------
+        dict
+        '''
+        res = {name: getattr(self, name) for name in _ARRAYS}
+        res['version'] = np.array(FORMAT_VERSION)
+        return res
+
+    @classmethod
+    def from_arrays(cls, arrays, source=None):
+        '''
+        Make a table from arrays like those returned by `arrays`. Other arrays are
+        ignored
+
+        Parameters
+        ----------
+        arrays : dict
+            The arrays
+        source : str, optional
+            Where the arrays came from, for error messages
+        '''
+        version = int(arrays['version'])
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported connection table version {version}'
+                             + ('' if source is None else f' in {source}'))
+        return cls(**{name: arrays[name] for name in _ARRAYS})
+
+    def index(self, name):
+        '''
+        Returns the code for a cell name
+
+        Raises
+        ------
+        KeyError
+            If there's no cell with the name
+        '''
+        if self._index is None:
+            object.__setattr__(self, '_index',
+                               {str(n): i for i, n in enumerate(self.names)})
+        return self._index[name]
+
+    def mask(self, pre=None, post=None, syntype=None, termination=None, synclass=None):
+        '''
+        Returns a boolean array selecting the connections matching all of the given values
+
+        Parameters
+        ----------
+        pre : str, optional
+            Name of the pre-synaptic cell
+        post : str, optional
+            Name of the post-synaptic cell
+        syntype : str, optional
+            A `~owmeta.connection.SynapseType` value
+        termination : str, optional
+            A `~owmeta.connection.Termination` value
+        synclass : str, optional
+            A synapse class
+
+        Returns
+        -------
+        numpy.ndarray
+        '''
+        res = np.ones(len(self), dtype=bool)
+        try:
+            if pre is not None:
+                res &= self.pre == self.index(pre)
+            if post is not None:
+                res &= self.post == self.index(post)
+        except KeyError:
+            res[:] = False
+        # Code 0 is for connections without a value, so it mustn't be used for values
+        # that aren't known
+        if syntype is not None:
+            code = _code(SYNTYPES, syntype, None)
+            if code is not None:
+                res &= self.syntype == code
+            else:
+                res[:] = False
+        if termination is not None:
+            code = _code(TERMINATIONS, termination, None)
+            if code is not None:
+                res &= self.termination == code
+            else:
+                res[:] = False
+        if synclass is not None:
+            codes = np.flatnonzero(self.synclasses == synclass)
+            if len(codes):
+                res &= self.synclass == codes[0]
+            else:
+                res[:] = False
+        return res
+
+    def select(self, mask):
+        '''
+        Returns a table with only the connections selected by `mask`
+
+        Parameters
+        ----------
+        mask : numpy.ndarray
+            A boolean array, like one returned by `mask`, or an array of row indices
+
+        Returns
+        -------
+        ConnectionTable
+        '''
+        return type(self)(names=self.names, synclasses=self.synclasses,
+                          **{name: getattr(self, name)[mask] for name in _COLUMNS})
+
+    def __len__(self):
+        return len(self.pre)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return ConnectionRow(self, i + len(self) if i < 0 else i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ConnectionRow(self, i)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(cells={len(self.names)}, connections={len(self)})'
+
+
+class ConnectionRow(object):
+    '''
+    A view of one row of a `ConnectionTable`
+    '''
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def pre(self):
+        ''' Name of the pre-synaptic cell '''
+        return str(self.table.names[self.table.pre[self.row]])
+
+    @property
+    def post(self):
+        ''' Name of the post-synaptic cell '''
+        return str(self.table.names[self.table.post[self.row]])
+
+    @property
+    def syntype(self):
+        return SYNTYPES[self.table.syntype[self.row]]
+
+    @property
+    def termination(self):
+        return TERMINATIONS[self.table.termination[self.row]]
+
+    @property
+    def number(self):
+        ''' The number of synapses, or `None` if it's unknown '''
+        n = int(self.table.number[self.row])
+        return None if n == MISSING else n
+
+    @property
+    def synclass(self):
+        code = self.table.synclass[self.row]
+        return None if code == MISSING else str(self.table.synclasses[code])
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(pre={self.pre!r}, post={self.post!r},'
+                f' syntype={self.syntype!r}, termination={self.termination!r},'
+                f' number={self.number!r}, synclass={self.synclass!r})')
+
+
+def _code(values, value, default=0):
+    try:
+        return values.index(value)
+    except ValueError:
+        return default
+
+
+def _int_or_missing(value):
+    if value is None:
+        return MISSING
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def _str_array(values):
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'U':
+        return values
+    return np.array([str(v) for v in values], dtype=str)
+
+
+def read_npz(path, mmap=False):
+    '''
+    Read all of the arrays in an ``.npz`` file
+
+    Parameters
+    ----------
+    path : str
+        The file path
+    mmap : bool, optional
+        If `True`, memory-map the arrays rather than reading them into memory. The file
+        must be uncompressed
+
+    Returns
+    -------
+    dict
+        Mapping from array name to array
+    '''
+    if mmap:
+        return _mmap_npz(path)
+    with np.load(path) as f:
+        return {name: f[name] for name in f.files}
+
+
+def _mmap_npz(path):
+    res = dict()
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Can't memory-map compressed member {info.filename}"
+                                 f' of {path}')
+            # Skip the local file header to get to the start of the .npy data
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len('.npy')]
+            if dtype.hasobject:
+                raise ValueError(f"Can't memory-map object array {name} of {path}")
+            if shape == ():
+                res[name] = np.frombuffer(f.read(dtype.itemsize), dtype=dtype)[0]
+            elif 0 in shape:
+                # mmap can't map zero bytes
+                res[name] = np.empty(shape, dtype=dtype)
+            else:
+                res[name] = np.memmap(f, dtype=dtype, mode='r', offset=f.tell(),
+                                      shape=shape, order='F' if fortran_order else 'C')
+    return res
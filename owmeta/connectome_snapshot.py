@@ -0,0 +1,248 @@
+'''
+Precomputed snapshots of a connectome
+
+Answering aggregate questions about a `~owmeta.network.Network`, like the names of its
+neurons or their degrees, from the RDF store means opening the store and querying over
+every connection. For read-only uses of a data bundle, a `ConnectomeSnapshot` written
+when the bundle is built can answer them instead. A snapshot holds the network's
+connections as a `~owmeta.connection_table.ConnectionTable` along with the codes of the
+network's neurons, and is saved as an ``.npz`` file which can be memory-mapped.
+
+`Network` uses a snapshot when the path to one is configured under
+`~owmeta.network.CONNECTOME_SNAPSHOT_CONF_KEY` and the snapshot was taken from the same
+network. Without that setting, a `~owmeta.network.Network` loaded from a bundle uses the
+snapshot in the bundle's files, if there is one::
+
+    >>> from owmeta_core.bundle import Bundle
+    >>> from owmeta.network import Network
+    >>> with Bundle('openworm/owmeta-data') as bnd:
+    ...     net = bnd(Network).query().load_one()
+    ...     len(net.neuron_names())
+    302
+
+The snapshot is assumed to match the stored statements: changes made to the network
+after the snapshot was written aren't reflected in results computed from the snapshot.
+
+Requires NumPy, which is installed with the ``analysis`` extra.
+'''
+import os
+import threading
+
+import numpy as np
+from rdflib.term import URIRef
+
+from .bulk_query import objects_of, property_value
+from .cell import Cell
+from .connection import SynapseType
+from .connection_table import ConnectionTable, SYNTYPES, MISSING, read_npz
+# bundle_snapshot_path is defined with Network, which uses it, but is still importable
+# from here
+from .network import (Adjacency, Network, NeuronDegree, CONNECTOME_SNAPSHOT_FILE_NAME,
+                      bundle_snapshot_path)
+
+
+SNAPSHOT_FILE_NAME = CONNECTOME_SNAPSHOT_FILE_NAME
+'''
+Name of the snapshot file in a project directory and in the ``files`` directory of a
+bundle
+'''
+
+FORMAT_VERSION = 1
+''' Version of the snapshot layout written by `ConnectomeSnapshot.save` '''
+
+
+class ConnectomeSnapshot(object):
+    '''
+    The connections and neurons of a network
+
+    Attributes
+    ----------
+    network : rdflib.term.URIRef or None
+        Identifier of the network the snapshot was taken from
+    neurons : numpy.ndarray
+        Codes, in `table`, of the network's neurons
+    table : owmeta.connection_table.ConnectionTable
+        The network's synapses
+    data_version : str
+        Identifies the data the snapshot was made from, like the version of the bundle
+        or a hash of the inputs that produced the data
+    '''
+
+    __slots__ = ('network', 'neurons', 'table', 'data_version')
+
+    def __init__(self, network, neurons, table, data_version=''):
+        self.network = network
+        self.neurons = np.asanyarray(neurons, dtype=np.int32)
+        self.table = table
+        self.data_version = data_version
+
+    @classmethod
+    def from_network(cls, network, data_version=''):
+        '''
+        Take a snapshot of a network
+
+        Parameters
+        ----------
+        network : owmeta.network.Network
+            The network
+        data_version : str, optional
+            Identifies the data the network comes from
+
+        Returns
+        -------
+        ConnectomeSnapshot
+        '''
+        table = ConnectionTable.from_network(network)
+        key = network.identifier if network.defined else None
+        neurons = objects_of(network.rdf, key, Network.neuron)
+        names = property_value(network.rdf, Cell.name, neurons)
+        codes = sorted(set(table.index(str(names[n])) for n in neurons if n in names))
+        return cls(key, codes, table, data_version)
+
+    def save(self, path):
+        '''
+        Write the snapshot to an uncompressed ``.npz`` file
+
+        The file can also be read with `ConnectionTable.load
+        <owmeta.connection_table.ConnectionTable.load>`
+
+        Parameters
+        ----------
+        path : str
+            The file path
+        '''
+        np.savez(path,
+                 snapshot_version=np.array(FORMAT_VERSION),
+                 network=np.array('' if self.network is None else str(self.network)),
+                 neurons=self.neurons,
+                 data_version=np.array(self.data_version),
+                 **self.table.arrays())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        '''
+        Read a snapshot written by `save`
+
+        Parameters
+        ----------
+        path : str
+            The file path
+        mmap : bool, optional
+            If `True`, the default, the arrays are memory-mapped from the file rather
+            than read into memory
+
+        Returns
+        -------
+        ConnectomeSnapshot
+        '''
+        arrays = read_npz(path, mmap)
+        version = int(arrays['snapshot_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported connectome snapshot version {version} in {path}')
+        network = str(arrays['network'])
+        return cls(URIRef(network) if network else None,
+                   arrays['neurons'],
+                   ConnectionTable.from_arrays(arrays, path),
+                   str(arrays['data_version']))
+
+    def neuron_names(self):
+        '''
+        Returns the names of the network's neurons
+
+        Returns
+        -------
+        set of str
+        '''
+        return set(str(n) for n in self.table.names[self.neurons])
+
+    def degree_table(self):
+        '''
+        Returns the degrees of the network's neurons, as `Network.degree_table
+        <owmeta.network.Network.degree_table>` does
+
+        Returns
+        -------
+        dict of str to owmeta.network.NeuronDegree
+        '''
+        table = self.table
+        size = len(table.names)
+        chemical = table.syntype == SYNTYPES.index(SynapseType.Chemical)
+        gap = table.syntype == SYNTYPES.index(SynapseType.GapJunction)
+        in_degree = np.bincount(table.post[chemical], minlength=size)
+        out_degree = np.bincount(table.pre[chemical], minlength=size)
+        gap_degree = np.bincount(table.pre[gap], minlength=size)
+        return {str(table.names[i]): NeuronDegree(int(in_degree[i]),
+                                                  int(out_degree[i]),
+                                                  int(gap_degree[i]))
+                for i in self.neurons}
+
+    def adjacency(self, syntype=None):
+        '''
+        Returns the adjacency matrix for the synapses, as `Network.adjacency
+        <owmeta.network.Network.adjacency>` does
+
+        Parameters
+        ----------
+        syntype : str, optional
+            If given, only synapses with this synapse type are included
+
+        Returns
+        -------
+        owmeta.network.Adjacency
+        '''
+        table = self.table
+        if syntype is not None:
+            table = table.select(table.mask(syntype=syntype))
+        # Like Network.adjacency, only include the network's neurons and the cells in the
+        # selected synapses. Since the table's names are sorted, so are the remaining ones
+        codes = np.unique(np.concatenate((self.neurons, table.pre, table.post)))
+        pre = np.searchsorted(codes, table.pre).astype(np.int64)
+        post = np.searchsorted(codes, table.post)
+        size = len(codes)
+        weights = np.where(table.number == MISSING, 1, table.number)
+        keys, inverse = np.unique(pre * size + post, return_inverse=True)
+        data = np.bincount(inverse.ravel(), weights=weights, minlength=len(keys))
+        rows = keys // size
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+        names = [str(n) for n in table.names[codes]]
+        return Adjacency(names,
+                         {n: i for i, n in enumerate(names)},
+                         indptr.tolist(),
+                         (keys % size).tolist(),
+                         data.astype(np.int64).tolist())
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(network={self.network!r},'
+                f' neurons={len(self.neurons)}, connections={len(self.table)},'
+                f' data_version={self.data_version!r})')
+
+
+_loaded = dict()
+_loaded_lock = threading.Lock()
+
+
+def load_snapshot(path):
+    '''
+    Load a snapshot, memory-mapped, reusing one loaded before from the same file if the
+    file hasn't changed since
+
+    Parameters
+    ----------
+    path : str
+        The file path
+
+    Returns
+    -------
+    ConnectomeSnapshot
+    '''
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    with _loaded_lock:
+        entry = _loaded.get(path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        snapshot = ConnectomeSnapshot.load(path)
+        _loaded[path] = (key, snapshot)
+        return snapshot
+
@@ -0,0 +1,235 @@
+'''
+Caching of values derived from the statements in a context.
+
+Several aggregate queries (adjacency matrices, degree tables, name indices, ...) are
+expensive to compute, but only need to be recomputed when the statements they were
+computed from change. `ContextCache` holds such values keyed by context identifier and
+drops them when the context changes.
+
+Changes to stored statements are noticed through the `~rdflib.store.TripleAddedEvent` and
+`~rdflib.store.TripleRemovedEvent` events that the in-memory and ZODB stores dispatch for
+each statement added or removed. For stores that don't dispatch these events, call
+`ContextCache.invalidate` after changing them.
+'''
+from itertools import islice
+import logging
+import weakref
+
+from rdflib.namespace import RDF
+from rdflib.store import TripleAddedEvent, TripleRemovedEvent
+from rdflib.term import URIRef
+
+
+L = logging.getLogger(__name__)
+
+
+class _StoreChanges(object):
+    '''
+    Counts the statements added to or removed from a store since the count was started
+    '''
+
+    __slots__ = ('dispatcher', 'count', '__weakref__')
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.count = 0
+        dispatcher.subscribe(TripleAddedEvent, self._changed)
+        dispatcher.subscribe(TripleRemovedEvent, self._changed)
+
+    def _changed(self, event):
+        self.count += 1
+
+
+class _StagedChanges(object):
+    '''
+    Counts changes to the statements staged in a context, other than ``rdf:type``
+    declarations
+    '''
+
+    __slots__ = ('length', 'changes', 'revision', '__weakref__')
+
+    def __init__(self):
+        self.length = 0
+        self.changes = 0
+        self.revision = 0
+
+    def update(self, context):
+        length = len(context)
+        # `Context` counts each statement added or removed. If the count moves by more
+        # than the number of statements, some were removed. The counter isn't public, so
+        # setup.py limits the owmeta-core version and ContextCacheTest checks it's there
+        changes = getattr(context, '_change_counter', None)
+        if length < self.length or (changes is not None and
+                                    changes - self.changes != length - self.length):
+            self.revision += 1
+        elif length > self.length:
+            for stmt in islice(context.contents(), self.length, None):
+                if stmt.to_triple()[1] != RDF.type:
+                    self.revision += 1
+                    break
+        self.length = length
+        self.changes = changes
+        return self.revision
+
+
+_STORE_CHANGES = weakref.WeakKeyDictionary()
+_STAGED_CHANGES = weakref.WeakKeyDictionary()
+
+
+def _store(context):
+    try:
+        return context.rdf.store
+    except Exception:
+        L.debug("Unable to get the store for %s", context, exc_info=True)
+        return None
+
+
+def _store_changes(store):
+    dispatcher = getattr(store, 'dispatcher', None)
+    if dispatcher is None:
+        return None
+    try:
+        res = _STORE_CHANGES.get(store)
+        # A store can replace its dispatcher (the ZODB store, for instance, doesn't keep
+        # it when the store is reloaded from the database), so we count again with the
+        # new one
+        if res is None or res.dispatcher is not dispatcher:
+            res = _STORE_CHANGES[store] = _StoreChanges(dispatcher)
+    except TypeError:
+        L.debug("Unable to track changes to %s", store, exc_info=True)
+        return None
+    return res
+
+
+def context_fingerprint(context):
+    '''
+    Returns a value which changes when statements are staged in `context` or when
+    statements are added to or removed from the store `context` reads from
+
+    Declarations of ``rdf:type``, which are staged for every object created in a context,
+    aren't counted, so creating objects for values taken from a cache doesn't change the
+    fingerprint. The fingerprint only compares equal to fingerprints taken in the same
+    process. See `stored_revision` for a value that can be kept between processes.
+
+    Parameters
+    ----------
+    context : owmeta_core.context.Context
+        The context. May be `None`, in which case the fingerprint is also `None`
+
+    Returns
+    -------
+    object
+        A hashable value
+    '''
+    if context is None:
+        return None
+
+    context = getattr(context, '__wrapped__', context)
+    staged = _STAGED_CHANGES.get(context)
+    if staged is None:
+        staged = _STAGED_CHANGES[context] = _StagedChanges()
+    revision = staged.update(context)
+
+    stored = _store_changes(_store(context))
+    return (staged, revision, stored, None if stored is None else stored.count)
+
+
+def stored_revision(context):
+    '''
+    Returns a value identifying the state of the store `context` reads from, which can be
+    saved along with values computed from the context and compared in a later process
+
+    Only stores kept in a ZODB database have a revision: the identifier of the last
+    committed transaction, together with the number of statements added or removed by
+    this process since it first asked for the revision. Changes that weren't committed
+    before then aren't seen.
+
+    Parameters
+    ----------
+    context : owmeta_core.context.Context
+        The context
+
+    Returns
+    -------
+    tuple
+        The revision, or `None` if the store doesn't have one
+    '''
+    store = _store(getattr(context, '__wrapped__', context))
+    jar = getattr(store, '_p_jar', None)
+    if jar is None:
+        return None
+    changes = _store_changes(store)
+    if changes is None:
+        return None
+    try:
+        tid = jar.db().lastTransaction()
+    except Exception:
+        L.debug("Unable to get the last transaction for %s", store, exc_info=True)
+        return None
+    return (tid.hex(), changes.count)
+
+
+class ContextCache(object):
+    '''
+    A cache of values computed from the statements in a context
+
+    Entries are grouped by the context identifier. Each group records the
+    `context_fingerprint` of the context at the time it was created, and the whole group is
+    discarded once the fingerprint differs, for instance, after statements are saved to
+    the context.
+    '''
+
+    def __init__(self):
+        self._entries = dict()
+
+    def get(self, context, key, make):
+        '''
+        Get the value cached for `key` in `context`, calling `make` to create it if needed
+
+        Parameters
+        ----------
+        context : owmeta_core.context.Context
+            The context the value is derived from
+        key : object
+            Hashable key distinguishing the value from others cached for the context
+        make : callable
+            Called with no arguments to compute the value on a cache miss
+
+        Returns
+        -------
+        object
+            The cached or newly computed value
+        '''
+        ident = None if context is None else context.identifier
+        fingerprint = context_fingerprint(context)
+        group = self._entries.get(ident)
+        if group is None or group[0] != fingerprint:
+            group = (fingerprint, dict())
+            self._entries[ident] = group
+
+        values = group[1]
+        try:
+            return values[key]
+        except KeyError:
+            res = make()
+            values[key] = res
+            return res
+
+    def invalidate(self, context=None):
+        '''
+        Drop cached values
+
+        Parameters
+        ----------
+        context : owmeta_core.context.Context or str, optional
+            The context, or context identifier, whose values should be dropped. If not
+            given, all values are dropped
+        '''
+        if context is None:
+            self._entries.clear()
+            return
+        ident = getattr(context, 'identifier', context)
+        self._entries.pop(URIRef(ident) if ident is not None else None, None)
+
+    def __len__(self):
+        return sum(len(group[1]) for group in self._entries.values())
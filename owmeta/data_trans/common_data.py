@@ -15,3 +15,11 @@ class DSMixin(object):
 class DTMixin(object):
     base_namespace = TRANS_NS
     base_data_namespace = TRANS_DATA_NS
+
+    def cell_name_index(self, data_source):
+        '''
+        Returns the `~owmeta.cell_names.CellNameIndex` for the cells in the data context of
+        a data source, for resolving cell names from other sources to those cells
+        '''
+        from ..cell_names import cell_name_index
+        return cell_name_index(data_source.data_context.stored)
@@ -1,13 +1,16 @@
+from collections import defaultdict
 import csv
 import logging
 
 from owmeta_core.datasource import GenericTranslation
 from owmeta_core.dataobject import ObjectProperty
 from owmeta_core.data_trans.csv_ds import CSVDataTranslator, CSVDataSource
+from rdflib.term import Literal
 
 from .. import CONTEXT
-from ..utils import normalize_cell_name
-from ..connection import Connection
+from ..bulk_query import property_value, stage_triples
+from ..utils import normalize_cell_name, MUSCLE_ALIASES
+from ..connection import Connection, normalize_syntype
 from ..cell import Cell
 from ..document import Document
 from ..evidence import Evidence
@@ -48,6 +51,21 @@ class NeuronConnectomeCSVTranslator(DTMixin, CSVDataTranslator):
     output_type = DataWithEvidenceDataSource
     translation_type = NeuronConnectomeCSVTranslation
 
+    def __init__(self, *args, bulk=False, batch_size=10000, **kwargs):
+        '''
+        Parameters
+        ----------
+        bulk : bool, optional
+            If `True`, the statements for each connection are generated directly rather
+            than by creating a `~owmeta.connection.Connection` for each one. The
+            resulting statements are the same either way. Default is `False`
+        batch_size : int, optional
+            In bulk mode, the number of CSV rows to read before staging their statements
+        '''
+        super(NeuronConnectomeCSVTranslator, self).__init__(*args, **kwargs)
+        self.bulk = bulk
+        self.batch_size = batch_size
+
     def make_translation(self, sources):
         tr = super(NeuronConnectomeCSVTranslator, self).make_translation()
         tr.source(sources[0])
@@ -59,10 +77,6 @@ class NeuronConnectomeCSVTranslator(DTMixin, CSVDataTranslator):
         # muscle cells that are generically defined in source and need to be broken
         # into pair of L and R before being added to owmeta
 
-        # muscle cells that have different names in connectome source and cell list.
-        # Their wormbase cell list names will be used in owmeta
-        changed_muscles = ['ANAL', 'INTR', 'INTL', 'SPH']
-
         # counters for terminal printing
         neuron_connections = 0
         muscle_connections = 0
@@ -80,11 +94,15 @@ class NeuronConnectomeCSVTranslator(DTMixin, CSVDataTranslator):
         # contract of the ConjunctiveGraph with 'default_is_union==True').
         # Otherwise, we should query only for what's in that graph.
         #
-        neuron_objs = list(set(i_n.neurons()))
-        muscle_objs = list(i_w.muscles())
+        neuron_names = {n.identifier: n.name() for n in set(i_n.neurons())}
+        muscle_names = {m.identifier: m.name() for m in i_w.muscles()}
         # get lists of neuron and muscles names
-        neurons = set(neuron.name() for neuron in neuron_objs)
-        muscles = set(muscle.name() for muscle in muscle_objs)
+        neurons = set(neuron_names.values())
+        muscles = set(muscle_names.values())
+        # Names in the CSV which aren't the names of any of the cells, like synonyms,
+        # are resolved to those cells with the name indices for the sources
+        resolve_name = _name_resolver(((self.cell_name_index(neurons_source), neuron_names),
+                                       (self.cell_name_index(muscles_source), muscle_names)))
         o_w = res.data_context(Worm)()
         o_n = res.data_context(Network)(worm=o_w)
         # Evidence object to assert each connection
@@ -112,44 +130,19 @@ class NeuronConnectomeCSVTranslator(DTMixin, CSVDataTranslator):
             with open(data_source.full_path()) as csvfile:
                 edge_reader = csv.reader(csvfile)
                 next(edge_reader)  # skip header row
-                for row in edge_reader:
-                    source, target, weight, syn_type = map(str.strip, row)
-
-                    # set synapse type to something the Connection object
-                    # expects, and normalize the source and target names
-                    if syn_type == 'electrical':
-                        syn_type = 'gapJunction'
-                    elif syn_type == 'chemical':
-                        syn_type = 'send'
-
-                    source_is_bwm = 'BWM' in source.upper()
-                    target_is_bwm = 'BWM' in target.upper()
-
-                    source = normalize_cell_name(source).upper()
-                    target = normalize_cell_name(target).upper()
-
-                    weight = int(weight)
-
-                    # change certain muscle names to names in wormbase
-                    if source in changed_muscles:
-                        source = changed_muscle(source)
-                    if target in changed_muscles:
-                        target = changed_muscle(target)
-
-                    sources = convert_to_cell(ctx, source, muscles, neurons, source_is_bwm)
-                    targets = convert_to_cell(ctx, target, muscles, neurons, target_is_bwm)
-
-                    for s in sources:
-                        for t in targets:
-                            conn = add_synapse(ctx, s, t, weight, syn_type)
-                            o_n.synapse(conn)
-                            kind = conn.termination.onedef()
-                            if kind == 'muscle':
-                                muscle_connections += 1
-                            elif kind == 'neuron':
-                                neuron_connections += 1
-                            else:
-                                other_connections += 1
+                if self.bulk:
+                    edges = self._bulk_edges(edge_reader, ctx, o_n, res.data_context,
+                            muscles, neurons, resolve_name)
+                else:
+                    edges = self._edges(edge_reader, ctx, o_n, muscles, neurons,
+                            resolve_name)
+                for kind in edges:
+                    if kind == 'muscle':
+                        muscle_connections += 1
+                    elif kind == 'neuron':
+                        neuron_connections += 1
+                    else:
+                        other_connections += 1
 
         print('Total neuron to neuron connections added = %i' % neuron_connections)
         print('Total neuron to muscle connections added = %i' % muscle_connections)
@@ -157,6 +150,60 @@ class NeuronConnectomeCSVTranslator(DTMixin, CSVDataTranslator):
         print('uploaded connections')
         return res
 
+    def _edges(self, edge_reader, ctx, network, muscles, neurons, resolve_name):
+        '''
+        Creates a `~owmeta.connection.Connection` for each edge and yields its termination
+        '''
+        for sources, targets, weight, syn_type in _read_edges(edge_reader, ctx, muscles,
+                                                                neurons, convert_to_cell,
+                                                                resolve_name):
+            for s in sources:
+                for t in targets:
+                    conn = add_synapse(ctx, s, t, weight, syn_type)
+                    network.synapse(conn)
+                    yield conn.termination.onedef()
+
+    def _bulk_edges(self, edge_reader, ctx, network, network_context, muscles, neurons,
+                    resolve_name):
+        '''
+        Stages the statements for each edge directly and yields its termination
+
+        Cells are only created once per name and the statements for connections are
+        staged in batches of `batch_size` rows
+        '''
+        cells = dict()
+
+        def cached_convert_to_cell(ctx, name, muscles, neurons, is_bwm):
+            key = (name, is_bwm)
+            res = cells.get(key)
+            if res is None:
+                res = convert_to_cell(ctx, name, muscles, neurons, is_bwm)
+                cells[key] = res
+            return res
+
+        synapse = type(network).synapse
+        conn_triples = []
+        network_triples = []
+        rows = 0
+        for sources, targets, weight, syn_type in _read_edges(edge_reader, ctx, muscles,
+                                                                neurons,
+                                                                cached_convert_to_cell,
+                                                                resolve_name):
+            for s in sources:
+                for t in targets:
+                    ident, termination, triples = synapse_triples(s, t, weight, syn_type)
+                    conn_triples += triples
+                    network_triples.append((network.identifier, synapse, ident))
+                    yield termination
+            rows += 1
+            if rows % self.batch_size == 0:
+                stage_triples(ctx.context, conn_triples)
+                stage_triples(network_context, network_triples)
+                conn_triples = []
+                network_triples = []
+        stage_triples(ctx.context, conn_triples)
+        stage_triples(network_context, network_triples)
+
 
 class NeuronConnectomeSynapseClassTranslation(GenericTranslation):
     class_context = CONTEXT
@@ -206,33 +253,169 @@ class NeuronConnectomeSynapseClassTranslator(DTMixin, CSVDataTranslator):
         e.supports(docctx.rdf_object)
         res.data_context.add_import(docctx)
         res.data_context.add_import(docctx_anynum)
-        with data_source.data_context.stored(Connection, Neuron) as srcctx:
-            with self.make_reader(neurotransmitter_source,
-                                  skipheader=False,
-                                  delimiter=';') as reader:
-                for row in reader:
-                    pre, post, typ, number, nt = row
-                    conn = srcctx.Connection.query(pre_cell=srcctx.Neuron.query(pre),
-                                                   post_cell=srcctx.Neuron.query(post),
-                                                   number=int(number),
-                                                   syntype=typ)
-                    hit = False
-                    for c in conn.load():
-                        docctx(Connection)(ident=c.identifier).synclass(nt)
+        index = ConnectionIndex(data_source.data_context.stored.rdf_graph())
+        with self.make_reader(neurotransmitter_source,
+                              skipheader=False,
+                              delimiter=';') as reader:
+            for row in reader:
+                pre, post, typ, number, nt = row
+                hit = False
+                for c in index.exact(pre, post, typ, int(number)):
+                    docctx(Connection)(ident=c).synclass(nt)
+                    hit = True
+
+                if not hit:
+                    for c in index.any_number(pre, post, typ):
+                        docctx_anynum(Connection)(ident=c).synclass(nt)
                         hit = True
 
                     if not hit:
-                        conn = srcctx.Connection.query(pre_cell=srcctx.Neuron(pre),
-                                                       post_cell=srcctx.Neuron(post),
-                                                       syntype=typ)
-                        hit = False
-                        for c in conn.load():
-                            docctx_anynum(Connection)(ident=c.identifier).synclass(nt)
-                            hit = True
-
-                        if not hit:
-                            L.warning("Didn't find any connections matching: {}".format(conn))
+                        L.warning("Didn't find any connections matching: pre_cell=%s,"
+                                  " post_cell=%s, syntype=%s", pre, post, typ)
+        return res
+
+
+class ConnectionIndex(object):
+    '''
+    In-memory index of the connections between neurons in a graph
+
+    All of the connections are read with one scan for each `Connection` property when the
+    index is created. Connections can then be looked up by the names of the pre- and
+    post-synaptic neurons, the synapse type, and, optionally, the number of synapses.
+    '''
+
+    def __init__(self, graph):
+        '''
+        Parameters
+        ----------
+        graph : rdflib.graph.Graph
+            The graph to read connections from
+        '''
+        self._exact = defaultdict(set)
+        self._any_number = defaultdict(set)
+
+        pre = property_value(graph, Connection.pre_cell)
+        post = property_value(graph, Connection.post_cell)
+        syntypes = property_value(graph, Connection.syntype)
+        numbers = property_value(graph, Connection.number)
+        for conn, pre_cell in pre.items():
+            post_cell = post.get(conn)
+            if post_cell is None:
+                continue
+            syntype = syntypes.get(conn)
+            number = numbers.get(conn)
+            for s in {syntype, None}:
+                self._any_number[(pre_cell, post_cell, s)].add(conn)
+                if number is not None:
+                    self._exact[(pre_cell, post_cell, s, number)].add(conn)
+
+    def exact(self, pre, post, syntype, number):
+        '''
+        Identifiers of connections matching all of the given values
+
+        Parameters
+        ----------
+        pre : str
+            Name of the pre-synaptic neuron
+        post : str
+            Name of the post-synaptic neuron
+        syntype : str
+            Synapse type. Normalized like the argument to `Connection`. If `None`, any
+            synapse type matches
+        number : int
+            Number of synapses
+        '''
+        return self._exact.get((_neuron_ident(pre), _neuron_ident(post),
+                                _index_syntype(syntype), number), ())
+
+    def any_number(self, pre, post, syntype):
+        '''
+        Identifiers of connections matching the given values with any number of synapses
+        '''
+        return self._any_number.get((_neuron_ident(pre), _neuron_ident(post),
+                                     _index_syntype(syntype)), ())
+
+
+def _neuron_ident(name):
+    return Neuron.make_identifier_direct(name)
+
+
+def _index_syntype(syntype):
+    if syntype is None:
+        return None
+    return normalize_syntype(syntype) or syntype
+
+
+def _read_edges(edge_reader, ctx, muscles, neurons, convert_to_cell, resolve_name):
+    '''
+    Reads the rows from a connectome CSV, yielding the source and target cells, the
+    weight, and the synapse type for each
+    '''
+    # muscle cells that have different names in connectome source and cell list.
+    # Their wormbase cell list names will be used in owmeta
+    changed_muscles = ['ANAL', 'INTR', 'INTL', 'SPH']
+
+    for row in edge_reader:
+        source, target, weight, syn_type = map(str.strip, row)
+
+        # set synapse type to something the Connection object
+        # expects, and normalize the source and target names
+        if syn_type == 'electrical':
+            syn_type = 'gapJunction'
+        elif syn_type == 'chemical':
+            syn_type = 'send'
+
+        source_is_bwm = 'BWM' in source.upper()
+        target_is_bwm = 'BWM' in target.upper()
+
+        source = normalize_cell_name(source).upper()
+        target = normalize_cell_name(target).upper()
+
+        weight = int(weight)
+
+        # change certain muscle names to names in wormbase
+        if source in changed_muscles:
+            source = changed_muscle(source)
+        if target in changed_muscles:
+            target = changed_muscle(target)
+
+        if source not in neurons and source not in muscles:
+            source = resolve_name(source)
+        if target not in neurons and target not in muscles:
+            target = resolve_name(target)
+
+        sources = convert_to_cell(ctx, source, muscles, neurons, source_is_bwm)
+        targets = convert_to_cell(ctx, target, muscles, neurons, target_is_bwm)
+        yield sources, targets, weight, syn_type
+
+
+def _name_resolver(indices):
+    '''
+    Returns a function mapping a cell name to the name of the cell it resolves to
+
+    Parameters
+    ----------
+    indices : iterable of tuple
+        Pairs of a `~owmeta.cell_names.CellNameIndex` and a mapping from the identifiers
+        of cells to their names. Names are resolved with the first index that resolves
+        them to one of the cells in its mapping. Names that aren't resolved are returned
+        unchanged
+    '''
+    indices = tuple(indices)
+    resolved = dict()
+
+    def resolve_name(name):
+        res = resolved.get(name)
+        if res is None:
+            res = name
+            for index, names in indices:
+                cell_name = names.get(index.identifier(name))
+                if cell_name is not None:
+                    res = cell_name
+                    break
+            resolved[name] = res
         return res
+    return resolve_name
 
 
 def convert_to_cell(ctx, name, muscles, neurons, is_bwm):
@@ -262,24 +445,81 @@ def convert_to_cell(ctx, name, muscles, neurons, is_bwm):
 
 
 def add_synapse(ctx, source, target, weight, syn_type):
+    syntype = normalize_syntype(syn_type)
     c = ctx.Connection(pre_cell=source, post_cell=target,
-                       number=weight, syntype=syn_type)
+                       number=weight, syntype=syntype,
+                       ident=connection_identifier(source, target, syntype))
 
+    termination = termination_for(source, target)
+    if termination is not None:
+        c.termination(termination)
+
+    return c
+
+
+def termination_for(source, target):
+    '''
+    Returns the `~owmeta.connection.Connection.termination` for a connection between two
+    cells or `None` if it is neither 'neuron' nor 'muscle'
+    '''
     if isinstance(source, Neuron) and isinstance(target, Neuron):
-        c.termination('neuron')
+        return 'neuron'
     elif isinstance(source, Neuron) and isinstance(target, Muscle) or \
             isinstance(source, Muscle) and isinstance(target, Neuron):
-        c.termination('muscle')
+        return 'muscle'
+    return None
 
-    return c
+
+def connection_identifier(source, target, syntype):
+    '''
+    Returns the identifier `~owmeta.connection.Connection` makes from its key properties
+    for a connection between two cells
+
+    Parameters
+    ----------
+    source : owmeta.cell.Cell
+        The pre-synaptic cell
+    target : owmeta.cell.Cell
+        The post-synaptic cell
+    syntype : str
+        The synapse type, as returned by `~owmeta.connection.normalize_syntype`. If
+        `None`, the identifier is made from the cells alone
+    '''
+    key = source.identifier.n3() + target.identifier.n3()
+    if syntype is not None:
+        key += Literal(syntype).n3()
+    return Connection.make_identifier(key)
 
 
-MUSCLES = {
-    'ANAL': 'MU_ANAL',
-    'INTR': 'MU_INT_R',
-    'INTL': 'MU_INT_L',
-    'SPH': 'MU_SPH'
-}
+def synapse_triples(source, target, weight, syn_type):
+    '''
+    Generates the statements `add_synapse` would make for a connection without creating
+    a `~owmeta.connection.Connection`
+
+    The synapse type is normalized with `~owmeta.connection.normalize_syntype`, and left
+    out if it isn't recognized
+
+    Returns
+    -------
+    tuple
+        The connection identifier, the termination, and the list of triples, in the form
+        taken by `~owmeta.bulk_query.stage_triples`
+    '''
+    syntype = normalize_syntype(syn_type)
+    ident = connection_identifier(source, target, syntype)
+    triples = [(ident, Connection.rdf_type_property, Connection.rdf_type),
+               (ident, Connection.pre_cell, source.identifier),
+               (ident, Connection.post_cell, target.identifier),
+               (ident, Connection.number, Literal(weight))]
+    if syntype is not None:
+        triples.append((ident, Connection.syntype, Literal(syntype)))
+    termination = termination_for(source, target)
+    if termination is not None:
+        triples.append((ident, Connection.termination, Literal(termination)))
+    return ident, termination, triples
+
+
+MUSCLES = MUSCLE_ALIASES
 
 TO_EXPAND_MUSCLES = ['PM1D', 'PM2D', 'PM3D', 'PM4D', 'PM5D']
 
@@ -11,6 +11,7 @@ from ..network import Network
 from ..worm import Worm
 from ..website import Website
 from ..evidence import Evidence
+from ..utils import canonical_cell_name
 
 from .data_with_evidence_ds import DataWithEvidenceDataSource
 from .common_data import DTMixin, DSMixin
@@ -69,16 +70,7 @@ class WormAtlasCellListDataTranslator(DTMixin, CSVDataTranslator):
                 lineageName = j[1]
                 desc = j[2]
 
-                # XXX: These renaming choices are arbitrary; may be inappropriate
-                if name == "DB1/3":
-                    name = "DB1"
-                elif name == "DB3/1":
-                    name = "DB3"
-                elif name == "AVFL/R":
-                    if lineageName[0] == "W":
-                        name = "AVFL"
-                    elif lineageName[0] == "P":
-                        name = "AVFR"
+                name = canonical_cell_name(name, lineageName)
 
                 if name in cell_name_counters:
                     basename = name
@@ -90,10 +82,21 @@ class WormAtlasCellListDataTranslator(DTMixin, CSVDataTranslator):
 
                 data[name] = {"lineageName": lineageName, "desc": desc}
 
+        # The cell list may name a neuron differently from the neurons source, like with
+        # a synonym, so its names are also resolved to neurons with the name index
+        index = self.cell_name_index(neurons_source)
+        data_by_ident = dict()
+        for name, cell_data in data.items():
+            ident = index.identifier(name)
+            if ident is not None:
+                data_by_ident.setdefault(ident, cell_data)
+
         for n in net.neurons():
             # Get the name of the neuron in its original context
             name = n.name.one()
-            cell_data = data[str(name)]
+            cell_data = data.get(str(name))
+            if cell_data is None:
+                cell_data = data_by_ident[n.identifier]
             # Make statements in the result context
             nn = doc_ctx(n)
             nn.lineageName(cell_data['lineageName'])
@@ -1,6 +1,9 @@
 from six.moves.urllib.parse import urlparse, urlencode
+import codecs
 import re
 import logging
+import threading
+import time
 
 from owmeta_core.graph_object import IdentifierMissingException
 from owmeta_core.context import Context
@@ -12,6 +15,7 @@ from requests.packages.urllib3.util.retry import Retry
 
 from . import SCI_CTX
 from . import bibtex as BIB
+from .http_cache import CacheEntry, CacheMiss, cache_key, get_default_cache
 
 
 logger = logging.getLogger(__name__)
@@ -182,27 +186,10 @@ class Document(BaseDocument):
         if len(wbid) == 1:
             wbid = wbid[0].identifier.toPython()
 
-            # get the author
             try:
-                root = self.conf.get('wormbase_api_root_url', 'http://rest.wormbase.org')
-                url = f'{root}/rest/widget/paper/{wbid}/overview?content-type=application%2Fjson'
-                j = _json_request(url, **kwargs)
-                if 'fields' in j:
-                    f = j['fields']
-                    if 'authors' in f:
-                        dat = f['authors']['data']
-                        if dat is not None:
-                            if replace_existing and self.author.has_defined_value:
-                                self.author.clear()
-                            for x in dat:
-                                self.author.set(x['label'])
-
-                    for fname in ('pmid', 'year', 'title', 'doi'):
-                        if fname in f and f[fname]['data'] is not None:
-                            attr = getattr(self, fname)
-                            if replace_existing and attr.has_defined_value:
-                                attr.clear()
-                            attr.set(f[fname]['data'])
+                root = self.conf.get('wormbase_api_root_url', WORMBASE_API_ROOT_URL)
+                j = _json_request(_wormbase_paper_url(root, wbid), **kwargs)
+                self._update_from_wormbase_paper(j, replace_existing)
             except Exception:
                 logger.warning("Couldn't retrieve Wormbase data", exc_info=True)
         elif len(wbid) == 0:
@@ -212,23 +199,34 @@ class Document(BaseDocument):
             raise WormbaseRetrievalException("There is more than one Wormbase ID attached to this Document."
                                              " Please try with just one Wormbase ID")
 
+    def _update_from_wormbase_paper(self, j, replace_existing=False):
+        if 'fields' in j:
+            f = j['fields']
+            if 'authors' in f:
+                dat = f['authors']['data']
+                if dat is not None:
+                    if replace_existing and self.author.has_defined_value:
+                        self.author.clear()
+                    for x in dat:
+                        self.author.set(x['label'])
+
+            for fname in ('pmid', 'year', 'title', 'doi'):
+                if fname in f and f[fname]['data'] is not None:
+                    attr = getattr(self, fname)
+                    if replace_existing and attr.has_defined_value:
+                        attr.clear()
+                    attr.set(f[fname]['data'])
+
     def _crossref_doi_extract(self):
         # Extract data from crossref
-        def crRequest(doi):
-            data = {'q': doi}
-            data_encoded = urlencode(data)
-            return _json_request(
-                'http://search.labs.crossref.org/dois?%s' %
-                data_encoded)
-
-        doi = self.doi()
-        if doi[:4] == 'http':
-            doi = _doi_uri_to_doi(doi)
         try:
-            r = crRequest(doi)
+            r = _json_request(_crossref_url(self.doi()))
         except Exception:
             logger.warning("Couldn't retrieve Crossref info", exc_info=True)
             return
+        self._update_from_crossref(r)
+
+    def _update_from_crossref(self, r):
         # XXX: I don't think coins is meant to be used, but it has structured
         # data...
         if len(r) > 0:
@@ -248,7 +246,7 @@ class Document(BaseDocument):
                 if 'year' in r:
                     self.year(r['year'])
 
-    def update_from_pubmed(self, read_size=2**16, **kwargs):
+    def update_from_pubmed(self, read_size=2**16, url=None, **kwargs):
         '''
         Update the document attributes from NCBI Entrez API using the pubmed attribute
 
@@ -257,56 +255,23 @@ class Document(BaseDocument):
         chunk_size : int
             The number of bytes to pass to `requests.Response.iter_content`. This *may*
             reduce runtime memory requirements for the request.
+        url : str, optional
+            The esummary service URL. Defaults to `PUBMED_ESUMMARY_URL`
         **kwargs
             Passed on as arguments to `requests.Session.get`
         '''
-
-        def pmRequest(pmid):
-            import xml.etree.ElementTree as ET  # Python 2.5 and up
-
-            url = ('https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi?'
-                    f'db=pubmed&id={pmid}')
-            key = self.get('pubmed.api_key', None)
-            if key:
-                url += f'&api_key={key}'
-            else:
-                logger.warning("PubMed API key not defined. API calls will be limited.")
-
-            if 'do_retries' not in kwargs:
-                kwargs['do_retries'] = True
-
-            kwargs['stream'] = True
-
-            s = _url_request(url, **kwargs)
-            if hasattr(s, 'charset'):
-                parser = ET.XMLParser(encoding=s.charset)
-            else:
-                parser = ET.XMLParser(encoding='UTF-8')
-
-            with s:
-                for chunk in s.iter_content(read_size):
-                    parser.feed(chunk)
-                return parser.close()
-
         pmid = self.pmid.defined_values
         if len(pmid) == 1:
             pmid = pmid[0].identifier.toPython()
+            if 'do_retries' not in kwargs:
+                kwargs['do_retries'] = True
             try:
-                tree = pmRequest(pmid)
+                for docsum in _pubmed_docsums([pmid], self.get('pubmed.api_key', None),
+                                              read_size=read_size, url=url, **kwargs):
+                    _update_from_docsum(self, _docsum_fields(docsum)[1])
             except Exception:
                 logger.warning("Couldn't retrieve Pubmed info", exc_info=True)
                 return
-            for x in tree.findall('./DocSum/Item[@Name="AuthorList"]/Item'):
-                self.author(x.text)
-
-            for x in tree.findall('./DocSum/Item[@Name="Title"]'):
-                self.title(x.text)
-
-            for x in tree.findall('./DocSum/Item[@Name="DOI"]'):
-                self.doi(x.text)
-
-            for x in tree.findall('./DocSum/Item[@Name="PubDate"]'):
-                self.year(x.text)
 
         elif len(pmid) == 0:
             raise PubmedRetrievalException('No Pubmed ID is attached to this document. Cannot retrieve Pubmed data')
@@ -315,6 +280,143 @@ class Document(BaseDocument):
                                            ' Please try with just one Pubmed ID')
 
 
+def update_documents_from_pubmed(docs, batch_size=200, read_size=2**16, api_key=None,
+                                 url=None, **kwargs):
+    '''
+    Update the attributes of many documents from the NCBI Entrez API
+
+    Like `Document.update_from_pubmed`, but the Pubmed IDs are requested `batch_size` at
+    a time, with each response parsed as it is received. Documents without exactly one
+    Pubmed ID are skipped.
+
+    Parameters
+    ----------
+    docs : iterable of Document
+        The documents to update
+    batch_size : int, optional
+        The maximum number of Pubmed IDs to request at once
+    read_size : int, optional
+        The number of bytes to pass to `requests.Response.iter_content`
+    api_key : str, optional
+        The Entrez API key. Defaults to the ``pubmed.api_key`` configured for the first
+        document
+    url : str, optional
+        The esummary service URL. Defaults to `PUBMED_ESUMMARY_URL`
+    **kwargs
+        Passed on as arguments to `requests.Session.get`. One session is shared by all of
+        the requests unless ``requests_session`` is given
+
+    Returns
+    -------
+    list of Document
+        The documents for which a summary was found
+    '''
+    by_pmid = dict()
+    for doc in docs:
+        pmid = doc.pmid.defined_values
+        if len(pmid) != 1:
+            logger.warning("Skipping %s: it must have exactly one Pubmed ID to be updated", doc)
+            continue
+        by_pmid.setdefault(str(pmid[0].identifier.toPython()), []).append(doc)
+
+    if not by_pmid:
+        return []
+
+    if api_key is None:
+        api_key = next(iter(by_pmid.values()))[0].get('pubmed.api_key', None)
+    if 'do_retries' not in kwargs:
+        kwargs['do_retries'] = True
+
+    updated = []
+    pmids = list(by_pmid)
+    for i in range(0, len(pmids), batch_size):
+        batch = pmids[i:i + batch_size]
+        try:
+            for docsum in _pubmed_docsums(batch, api_key, read_size=read_size, url=url,
+                                          **kwargs):
+                pmid, fields = _docsum_fields(docsum)
+                for doc in by_pmid.get(pmid, ()):
+                    _update_from_docsum(doc, fields)
+                    updated.append(doc)
+        except Exception:
+            logger.warning("Couldn't retrieve Pubmed info for %s", batch, exc_info=True)
+    return updated
+
+
+PUBMED_ESUMMARY_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi'
+'''
+URL for the Entrez esummary service
+'''
+
+
+def _pubmed_docsums(pmids, api_key=None, read_size=2**16, url=None, **kwargs):
+    '''
+    Requests summaries for Pubmed IDs, yielding each ``DocSum`` element as it is parsed
+    '''
+    kwargs['stream'] = True
+    s = _url_request(_pubmed_esummary_url(pmids, api_key, url), **kwargs)
+    with s:
+        yield from _parse_docsums(s, read_size)
+
+
+def _pubmed_esummary_url(pmids, api_key=None, url=None):
+    url = (url or PUBMED_ESUMMARY_URL) + '?' + urlencode(
+            dict(db='pubmed', id=','.join(str(x) for x in pmids)), safe=',')
+    if api_key:
+        url += f'&api_key={api_key}'
+    else:
+        logger.warning("PubMed API key not defined. API calls will be limited.")
+    return url
+
+
+def _parse_docsums(resp, read_size=2**16):
+    import xml.etree.ElementTree as ET
+
+    parser = ET.XMLPullParser(events=('end',))
+    if hasattr(resp, 'charset'):
+        # The parser is given text so the charset from the response takes precedence
+        # over any declared in the document
+        decode = codecs.getincrementaldecoder(resp.charset)().decode
+    else:
+        def decode(chunk, final=False):
+            return chunk
+
+    for chunk in resp.iter_content(read_size):
+        parser.feed(decode(chunk))
+        yield from _completed_docsums(parser)
+    parser.feed(decode(b'', final=True))
+    parser.close()
+    yield from _completed_docsums(parser)
+
+
+def _completed_docsums(parser):
+    for _, elem in parser.read_events():
+        if elem.tag == 'DocSum':
+            yield elem
+            elem.clear()
+
+
+_DOCSUM_ITEMS = (('author', './Item[@Name="AuthorList"]/Item'),
+                 ('title', './Item[@Name="Title"]'),
+                 ('doi', './Item[@Name="DOI"]'),
+                 ('year', './Item[@Name="PubDate"]'))
+
+
+def _docsum_fields(docsum):
+    '''
+    Returns the Pubmed ID in a ``DocSum`` element and a list of ``(property name, value)``
+    for the `Document` properties it has values for
+    '''
+    return docsum.findtext('./Id'), [(name, x.text)
+                                     for name, path in _DOCSUM_ITEMS
+                                     for x in docsum.findall(path)]
+
+
+def _update_from_docsum(doc, fields):
+    for name, value in fields:
+        getattr(doc, name)(value)
+
+
 class SourcedFrom(DP.ObjectProperty):
     '''
     Indicates which document provided the source for an object
@@ -327,6 +429,28 @@ class SourcedFrom(DP.ObjectProperty):
     lazy = True
 
 
+WORMBASE_API_ROOT_URL = 'http://rest.wormbase.org'
+'''
+Default root URL for the WormBase REST API. May be overridden with the
+``wormbase_api_root_url`` configuration value
+'''
+
+CROSSREF_SEARCH_URL = 'http://search.labs.crossref.org/dois'
+'''
+URL for the Crossref DOI search service
+'''
+
+
+def _wormbase_paper_url(root, wbid):
+    return f'{root}/rest/widget/paper/{wbid}/overview?content-type=application%2Fjson'
+
+
+def _crossref_url(doi, url=None):
+    if doi[:4] == 'http':
+        doi = _doi_uri_to_doi(doi)
+    return (url or CROSSREF_SEARCH_URL) + '?' + urlencode({'q': doi})
+
+
 def _wormbase_uri_to_wbid(uri):
     return str(urlparse(uri).path.split("/")[2])
 
@@ -346,38 +470,113 @@ def _doi_uri_to_doi(uri):
     return doi
 
 
-def _url_request(url, requests_session=None, do_retries=False, **kwargs):
+_sessions = dict()
+_sessions_lock = threading.Lock()
+
+
+def _shared_session(do_retries):
+    '''
+    Returns a session, shared by all requests with the same `do_retries`, so that
+    connections are pooled
+    '''
+    with _sessions_lock:
+        sess = _sessions.get(do_retries)
+        if sess is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=16,
+                                  max_retries=Retry() if do_retries else 0)
+            sess.mount('http://', adapter)
+            sess.mount('https://', adapter)
+            _sessions[do_retries] = sess
+        return sess
+
+
+def _url_request(url, requests_session=None, do_retries=False, cache=None, **kwargs):
+    '''
+    Makes a GET request, consulting `cache` or, if `cache` isn't given, the
+    `default cache <owmeta.http_cache.set_default_cache>`
+
+    The response to a streamed request is only stored once its content has all been read
+    with ``iter_content``
+    '''
+    if cache is None:
+        cache = get_default_cache()
+
+    entry = None
+    key = None
+    if cache is not None:
+        key = cache_key(url)
+        entry = cache.get(key)
+        if entry is not None and (cache.offline or cache.is_fresh(entry)):
+            return _set_charset(entry.to_response())
+        if cache.offline:
+            raise CacheMiss(key)
 
     if requests_session is None:
-        sess = requests.Session()
+        sess = _shared_session(do_retries)
     else:
         sess = requests_session
-
-    if do_retries:
-        retries = Retry()
-        adapter = HTTPAdapter(max_retries=retries)
-        sess.mount('http://', adapter)
-        sess.mount('https://', adapter)
+        if do_retries:
+            retries = Retry()
+            adapter = HTTPAdapter(max_retries=retries)
+            sess.mount('http://', adapter)
+            sess.mount('https://', adapter)
 
     if 'timeout' not in kwargs:
         kwargs['timeout'] = 1
 
+    if entry is not None:
+        headers = dict(kwargs.get('headers') or ())
+        headers.update(entry.validators())
+        kwargs['headers'] = headers
+
     try:
         resp = sess.get(url, **kwargs)
+        if resp.status_code == 304 and entry is not None:
+            resp.close()
+            cache.touch(key)
+            return _set_charset(entry.to_response())
         if resp.status_code != 200:
             raise Exception(f'Service returned status code {resp.status_code}')
-        content_type = resp.headers.get('content-type')
-        if content_type:
-            md = re.search("charset *= *([^ ]+)", content_type)
-            if md:
-                resp.charset = md.group(1)
-
-        return resp
+        if cache is not None:
+            if kwargs.get('stream'):
+                _store_when_read(resp, cache, key)
+            else:
+                cache.put(CacheEntry(key, resp.status_code, dict(resp.headers),
+                                     resp.content, time.time()))
+        return _set_charset(resp)
     except Exception:
         logger.error("Error in request for %s", url, exc_info=True)
         raise
 
 
+def _store_when_read(resp, cache, key):
+    '''
+    Arranges for a streamed response to be stored in `cache` once its content has been
+    read, so the caller still gets the content as it arrives
+    '''
+    iter_content = resp.iter_content
+
+    def storing_iter_content(chunk_size=1, decode_unicode=False):
+        chunks = []
+        for chunk in iter_content(chunk_size, decode_unicode):
+            chunks.append(chunk)
+            yield chunk
+        if not decode_unicode:
+            cache.put(CacheEntry(key, resp.status_code, dict(resp.headers),
+                                 b''.join(chunks), time.time()))
+    resp.iter_content = storing_iter_content
+
+
+def _set_charset(resp):
+    content_type = resp.headers.get('content-type')
+    if content_type:
+        md = re.search("charset *= *([^ ]+)", content_type)
+        if md:
+            resp.charset = md.group(1)
+    return resp
+
+
 def _json_request(url, **kwargs):
     if 'headers' in kwargs:
         headers = kwargs['headers']
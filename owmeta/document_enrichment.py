@@ -0,0 +1,303 @@
+'''
+Concurrent retrieval of metadata for many `Documents <owmeta.document.Document>`
+
+`Document.update_from_wormbase <owmeta.document.Document.update_from_wormbase>`,
+`Document.update_from_pubmed <owmeta.document.Document.update_from_pubmed>` and the
+Crossref DOI lookup each make a blocking request, so updating a bibliography one document
+at a time takes the sum of all of the request latencies. `DocumentEnricher` instead makes
+the requests concurrently, limiting the number of simultaneous requests to each host,
+retrying failed requests with exponential backoff, and giving up on any requests still
+outstanding after a total deadline.
+
+The requests are made from a thread pool, but the retrieved values are always added to
+the documents from the thread running the event loop.
+'''
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .document import (WORMBASE_API_ROOT_URL,
+                       _crossref_url,
+                       _docsum_fields,
+                       _parse_docsums,
+                       _pubmed_esummary_url,
+                       _update_from_docsum,
+                       _url_request,
+                       _wormbase_paper_url)
+
+
+L = logging.getLogger(__name__)
+
+SOURCES = ('wormbase', 'pubmed', 'crossref')
+''' Names of the metadata sources a `DocumentEnricher` can use '''
+
+EnrichmentResult = namedtuple('EnrichmentResult', ('updated', 'failed', 'unfinished'))
+'''
+The outcome of `DocumentEnricher.enrich`
+
+Attributes
+----------
+updated : list
+    ``(document, source)`` pairs for each successful retrieval
+failed : list
+    ``(document, source, exception)`` for each retrieval which failed on every attempt
+unfinished : list
+    ``(document, source)`` pairs for retrievals still outstanding at the deadline
+'''
+
+
+class DocumentEnricher(object):
+    '''
+    Retrieves metadata for many documents concurrently
+
+    For each document, WormBase is queried first, if the document has a WormBase ID,
+    since WormBase may supply the Pubmed ID or DOI. Pubmed and Crossref are then queried
+    concurrently.
+    '''
+
+    def __init__(self, per_host_limit=4, retries=3, backoff=0.5, deadline=None,
+                 timeout=10, max_workers=None, wormbase_root_url=None, pubmed_url=None,
+                 crossref_url=None, api_key=None):
+        '''
+        Parameters
+        ----------
+        per_host_limit : int, optional
+            The maximum number of requests to make to any one host at the same time
+        retries : int, optional
+            The number of times to retry a failed request
+        backoff : float, optional
+            Seconds to wait before the first retry. The wait doubles with each retry
+        deadline : float, optional
+            Seconds after which any outstanding requests are abandoned. By default, there
+            is no deadline
+        timeout : float, optional
+            Seconds to wait for each response
+        max_workers : int, optional
+            The number of threads making requests. Defaults to the
+            `~concurrent.futures.ThreadPoolExecutor` default
+        wormbase_root_url : str, optional
+            Root URL for the WormBase REST API. Defaults to the ``wormbase_api_root_url``
+            configured for each document or `~owmeta.document.WORMBASE_API_ROOT_URL`
+        pubmed_url : str, optional
+            The esummary service URL. Defaults to
+            `~owmeta.document.PUBMED_ESUMMARY_URL`
+        crossref_url : str, optional
+            The Crossref DOI search URL. Defaults to
+            `~owmeta.document.CROSSREF_SEARCH_URL`
+        api_key : str, optional
+            The Entrez API key. Defaults to the ``pubmed.api_key`` configured for each
+            document
+        '''
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.wormbase_root_url = wormbase_root_url
+        self.pubmed_url = pubmed_url
+        self.crossref_url = crossref_url
+        self.api_key = api_key
+
+    def enrich(self, docs, sources=SOURCES):
+        '''
+        Retrieve metadata for the given documents and add it to them
+
+        This runs its own event loop, so it can't be called from a coroutine. Use
+        `enrich_async` there instead.
+
+        Parameters
+        ----------
+        docs : iterable of owmeta.document.Document
+            The documents to update. Each document is only updated once, even if it's
+            given more than once
+        sources : iterable of str, optional
+            The metadata sources to use. A subset of `SOURCES`
+
+        Returns
+        -------
+        EnrichmentResult
+        '''
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.enrich_async(docs, sources))
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def enrich_async(self, docs, sources=SOURCES):
+        '''
+        Like `enrich`, but run in the caller's event loop
+        '''
+        unknown = set(sources) - set(SOURCES)
+        if unknown:
+            raise ValueError(f'Unknown metadata sources: {sorted(unknown)}')
+
+        # Called from a coroutine, this gets the running loop
+        run = _EnrichmentRun(self, asyncio.get_event_loop(), set(sources))
+        # Requests are tracked per document, so each document is only enriched once
+        docs = list({id(doc): doc for doc in docs}.values())
+        tasks = [asyncio.ensure_future(run.enrich_document(doc)) for doc in docs]
+        try:
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=self.deadline)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            run.close()
+        return EnrichmentResult(run.updated, run.failed, list(run.outstanding.values()))
+
+
+def enrich_documents(docs, sources=SOURCES, **kwargs):
+    '''
+    Retrieve metadata for the given documents concurrently
+
+    Parameters
+    ----------
+    docs : iterable of owmeta.document.Document
+        The documents to update
+    sources : iterable of str, optional
+        The metadata sources to use. A subset of `SOURCES`
+    **kwargs
+        Passed on to `DocumentEnricher`
+
+    Returns
+    -------
+    EnrichmentResult
+    '''
+    return DocumentEnricher(**kwargs).enrich(docs, sources)
+
+
+class _EnrichmentRun(object):
+    '''
+    State for one call to `DocumentEnricher.enrich_async`
+    '''
+
+    def __init__(self, enricher, loop, sources):
+        self.enricher = enricher
+        self.loop = loop
+        self.sources = sources
+        self.executor = ThreadPoolExecutor(max_workers=enricher.max_workers)
+        self.requests = []
+        self.semaphores = dict()
+        self.sessions = dict()
+        self.updated = []
+        self.failed = []
+        self.outstanding = dict()
+
+    def close(self):
+        # Requests that haven't started yet won't be waited for
+        for request in self.requests:
+            request.cancel()
+        self.executor.shutdown(wait=False)
+        for session in self.sessions.values():
+            session.close()
+
+    async def enrich_document(self, doc):
+        if 'wormbase' in self.sources:
+            wbid = _single_value(doc.wbid)
+            if wbid is not None:
+                root = (self.enricher.wormbase_root_url or
+                        doc.conf.get('wormbase_api_root_url', WORMBASE_API_ROOT_URL))
+                await self.retrieve(doc, 'wormbase', _wormbase_paper_url(root, wbid),
+                                    self.fetch_json, doc._update_from_wormbase_paper)
+
+        retrievals = []
+        if 'pubmed' in self.sources:
+            pmid = _single_value(doc.pmid)
+            if pmid is not None:
+                api_key = self.enricher.api_key or doc.get('pubmed.api_key', None)
+                url = _pubmed_esummary_url([pmid], api_key, self.enricher.pubmed_url)
+                retrievals.append(self.retrieve(doc, 'pubmed', url, self.fetch_docsums,
+                                                _docsums_updater(doc, str(pmid))))
+        if 'crossref' in self.sources:
+            doi = _single_value(doc.doi)
+            if doi is not None:
+                url = _crossref_url(str(doi), self.enricher.crossref_url)
+                retrievals.append(self.retrieve(doc, 'crossref', url, self.fetch_json,
+                                                doc._update_from_crossref))
+        await asyncio.gather(*retrievals)
+
+    async def retrieve(self, doc, source, url, fetch, update):
+        '''
+        Fetch `url`, retrying as configured, and pass the result to `update`
+        '''
+        key = (id(doc), source)
+        self.outstanding[key] = (doc, source)
+        host = urlparse(url).netloc
+        semaphore = self.semaphores.get(host)
+        if semaphore is None:
+            semaphore = self.semaphores[host] = asyncio.Semaphore(self.enricher.per_host_limit)
+
+        error = None
+        for attempt in range(self.enricher.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.enricher.backoff * 2 ** (attempt - 1))
+            async with semaphore:
+                try:
+                    data = await self.fetch(fetch, url, self.session(host))
+                except Exception as e:
+                    L.debug("Attempt %d to retrieve %s failed", attempt + 1, url,
+                            exc_info=True)
+                    error = e
+                    continue
+            del self.outstanding[key]
+            try:
+                update(data)
+            except Exception as e:
+                L.warning("Couldn't use %s data for %s", source, doc, exc_info=True)
+                self.failed.append((doc, source, e))
+            else:
+                self.updated.append((doc, source))
+            return
+
+        del self.outstanding[key]
+        L.warning("Couldn't retrieve %s data for %s", source, doc, exc_info=error)
+        self.failed.append((doc, source, error))
+
+    async def fetch(self, fetch, url, session):
+        request = self.executor.submit(fetch, url, session)
+        # Kept so `close` can cancel it. Cancelling a finished request does nothing
+        self.requests.append(request)
+        return await asyncio.wrap_future(request, loop=self.loop)
+
+    def session(self, host):
+        session = self.sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=self.enricher.per_host_limit)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.sessions[host] = session
+        return session
+
+    def fetch_json(self, url, session):
+        return _url_request(url, requests_session=session, timeout=self.enricher.timeout,
+                            headers={'Accept': 'application/json'}).json()
+
+    def fetch_docsums(self, url, session):
+        resp = _url_request(url, requests_session=session, timeout=self.enricher.timeout,
+                            stream=True)
+        with resp:
+            return [_docsum_fields(docsum) for docsum in _parse_docsums(resp)]
+
+
+def _single_value(prop):
+    values = prop.defined_values
+    if len(values) != 1:
+        return None
+    return values[0].identifier.toPython()
+
+
+def _docsums_updater(doc, pmid):
+    def update(docsums):
+        for docsum_pmid, fields in docsums:
+            if docsum_pmid == pmid:
+                _update_from_docsum(doc, fields)
+    return update
@@ -1,13 +1,25 @@
+from collections import defaultdict, namedtuple
+import hashlib
+from itertools import islice
 import logging
+from os import close, makedirs, replace
+from os.path import exists, join as p
+import pickle
+import tempfile
 
 from owmeta_core.dataobject import DataObject, ObjectProperty
 from owmeta_core.context_dataobject import ContextDataObject
 from owmeta_core.context import Context
+from rdflib.namespace import RDF
 
 from . import SCI_CTX
+from .context_cache import stored_revision
 
 logger = logging.getLogger(__name__)
 
+FORMAT_VERSION = 1
+''' Version of the layout written by `EvidenceIndex.save` '''
+
 
 class EvidenceError(Exception):
     pass
@@ -97,7 +109,7 @@ class Evidence(DataObject):
         return self.make_identifier(s)
 
 
-def evidence_for(qctx, ctx, evctx=None):
+def evidence_for(qctx, ctx, evctx=None, index=None):
     """
     Returns an iterable of Evidence
 
@@ -114,9 +126,15 @@ def evidence_for(qctx, ctx, evctx=None):
     evctx : Context
         if the Evidence.supports statements should be looked for somewhere other
         than `ctx`, that can be specified in evctx. optional
+    index : EvidenceIndex
+        An index built from the graphs for `ctx` and `evctx`. If given, the contexts
+        and Evidence are looked up in the index rather than queried for. optional
     """
     if not evctx:
         evctx = ctx
+    if index is not None:
+        return [evctx(Evidence)(ident=e)
+                for e in sorted(index.evidence_for(qctx.contents_triples()))]
     ctxs = query_context(ctx.rdf_graph(), qctx)
     ev_objs = []
     for c in ctxs:
@@ -127,13 +145,19 @@ def evidence_for(qctx, ctx, evctx=None):
     return ev_objs
 
 
-def query_context(graph, qctx):
+def query_context(graph, qctx, index=None):
     '''
     graph : rdflib.graph.Graph
         Graph where we can find the contexts for statements in `qctx`
     qctx : owmeta.context.Context
         Container for statements
+    index : EvidenceIndex
+        An index built from `graph`. If given, the contexts are looked up in the index
+        rather than queried for. optional
     '''
+    if index is not None:
+        return frozenset(graph.get_context(c)
+                         for c in index.contexts_for(qctx.contents_triples()))
     trips = qctx.contents_triples()
     lctx = None
     for t in trips:
@@ -148,3 +172,535 @@ def query_context(graph, qctx):
             if len(lctx) == 0:
                 return lctx
     return frozenset() if lctx is None else lctx
+
+
+class EvidenceIndex(object):
+    '''
+    Index from statements to the contexts that contain them, from contexts to the
+    `Evidence` that supports or refutes them, and from references to the contexts their
+    `Evidence` supports
+
+    Building the index takes one pass over the statements in a graph and one scan each
+    for `Evidence.supports`, `Evidence.refutes`, and `Evidence.reference` statements.
+    After that, finding the evidence for any number of statements takes a dictionary
+    lookup per statement, and finding what a reference supports takes a lookup per
+    `Evidence` object. The index isn't updated when the graph changes: use `is_current`
+    to check whether it should be rebuilt.
+    '''
+
+    def __init__(self):
+        self.statement_contexts = dict()
+        ''' Map from a triple to the `frozenset` of identifiers of contexts containing it '''
+
+        self.supporting = defaultdict(set)
+        ''' Map from context identifier to identifiers of Evidence supporting it '''
+
+        self.refuting = defaultdict(set)
+        ''' Map from context identifier to identifiers of Evidence refuting it '''
+
+        self.context_sizes = dict()
+        ''' Number of statements in each context when the index was built '''
+
+        self.supported_contexts = defaultdict(set)
+        ''' Map from Evidence identifier to identifiers of the contexts it supports '''
+
+        self.referencing = defaultdict(set)
+        ''' Map from reference identifier to identifiers of Evidence with that reference '''
+
+    @classmethod
+    def build(cls, graph, evidence_graph=None, statements=True):
+        '''
+        Build an index
+
+        Parameters
+        ----------
+        graph : rdflib.graph.ConjunctiveGraph
+            Graph with the statements to index. Typically, from
+            `Context.rdf_graph <owmeta_core.context.Context.rdf_graph>`
+        evidence_graph : rdflib.graph.Graph, optional
+            Graph with the `Evidence` statements. Defaults to `graph`
+        statements : bool, optional
+            If `False`, only the number of statements in each context is recorded. The
+            index can then answer which statements a reference supports, but not which
+            contexts contain a given statement
+
+        Returns
+        -------
+        EvidenceIndex
+        '''
+        res = cls()
+        if statements:
+            res.add_statements(graph)
+        else:
+            res.add_context_sizes(graph)
+        res.add_evidence(graph if evidence_graph is None else evidence_graph)
+        return res
+
+    @classmethod
+    def for_reference(cls, graph, reference, evidence_graph=None):
+        '''
+        Build an index for finding what `Evidence` with the given reference supports
+
+        Only the statements in the contexts the `Evidence` supports are counted, so,
+        unlike `build`, this doesn't take a pass over all of the statements in `graph`.
+        The index can answer `contexts_supported_by` and `statements_supported_by` for
+        `reference`
+
+        Parameters
+        ----------
+        graph : rdflib.graph.ConjunctiveGraph
+            Graph with the supported statements
+        reference : rdflib.term.URIRef
+            Identifier of the reference
+        evidence_graph : rdflib.graph.Graph, optional
+            Graph with the `Evidence` statements. Defaults to `graph`
+
+        Returns
+        -------
+        EvidenceIndex
+        '''
+        res = cls()
+        res.add_evidence(graph if evidence_graph is None else evidence_graph)
+        res.add_context_sizes(graph, res.supported_by(reference))
+        return res
+
+    def add_statements(self, graph):
+        '''
+        Add the statements in a graph to the index
+        '''
+        contexts = defaultdict(set)
+        for s, p, o, c in graph.quads((None, None, None)):
+            c = getattr(c, 'identifier', c)
+            contexts[(s, p, o)].add(c)
+            self.context_sizes[c] = self.context_sizes.get(c, 0) + 1
+
+        # Many statements are in the same contexts, so we share the sets between them
+        shared = dict()
+        for triple, ctxs in contexts.items():
+            previous = self.statement_contexts.get(triple)
+            if previous is not None:
+                ctxs |= previous
+            ctxs = frozenset(ctxs)
+            self.statement_contexts[triple] = shared.setdefault(ctxs, ctxs)
+
+    def add_context_sizes(self, graph, contexts=None):
+        '''
+        Add the number of statements in each context of a graph to the index
+
+        Parameters
+        ----------
+        graph : rdflib.graph.ConjunctiveGraph
+            The graph
+        contexts : iterable of rdflib.term.URIRef, optional
+            Identifiers of the contexts to count. By default, all of the contexts in
+            `graph` are counted with one pass over its statements
+        '''
+        self.context_sizes.update(_context_sizes(graph, contexts))
+
+    def add_evidence(self, graph):
+        '''
+        Add the `Evidence` statements in a graph to the index
+        '''
+        for ev, _, ctx in graph.triples((None, Evidence.supports.link, None)):
+            self.supporting[ctx].add(ev)
+            self.supported_contexts[ev].add(ctx)
+        for ev, _, ctx in graph.triples((None, Evidence.refutes.link, None)):
+            self.refuting[ctx].add(ev)
+        for ev, _, ref in graph.triples((None, Evidence.reference.link, None)):
+            self.referencing[ref].add(ev)
+
+    def contexts_for(self, triples):
+        '''
+        Returns the identifiers of the contexts containing all of the given triples
+
+        Parameters
+        ----------
+        triples : iterable of tuple
+            The triples
+
+        Returns
+        -------
+        frozenset
+        '''
+        res = None
+        for t in triples:
+            ctxs = self.statement_contexts.get(t, frozenset())
+            res = ctxs if res is None else res & ctxs
+            if not res:
+                return frozenset()
+        return frozenset() if res is None else res
+
+    def evidence_for(self, triples, refuting=False):
+        '''
+        Returns the identifiers of Evidence for contexts containing all of the given
+        triples
+
+        Parameters
+        ----------
+        triples : iterable of tuple
+            The triples
+        refuting : bool, optional
+            If `True`, return refuting rather than supporting Evidence
+
+        Returns
+        -------
+        set
+        '''
+        evidence = self.refuting if refuting else self.supporting
+        res = set()
+        for c in self.contexts_for(triples):
+            res |= evidence.get(c, set())
+        return res
+
+    def is_current(self, graph):
+        '''
+        Returns `True` if the number of statements in each context of `graph` is the
+        same as when the index was built. This doesn't check the `Evidence` statements
+
+        Counting the statements takes a pass over `graph`, but is cheaper than building
+        a new index
+        '''
+        return _context_sizes(graph) == self.context_sizes
+
+    def contexts_supported_by(self, reference):
+        '''
+        Returns the contexts supported by `Evidence` with the given reference
+
+        Parameters
+        ----------
+        reference : rdflib.term.URIRef
+            Identifier of the reference, typically a `~owmeta.document.Document`
+
+        Returns
+        -------
+        list of tuple
+            ``(context, number_of_statements)`` pairs, ordered by context identifier
+        '''
+        return [(c, self.context_sizes.get(c, 0))
+                for c in sorted(self.supported_by(reference))]
+
+    def supported_by(self, reference):
+        '''
+        Returns the identifiers of the contexts supported by `Evidence` with the given
+        reference
+
+        Parameters
+        ----------
+        reference : rdflib.term.URIRef
+            Identifier of the reference
+
+        Returns
+        -------
+        set
+        '''
+        res = set()
+        for ev in self.referencing.get(reference, ()):
+            res |= self.supported_contexts.get(ev, set())
+        return res
+
+    def statements_supported_by(self, graph, reference, offset=0, limit=None):
+        '''
+        Yields the statements in contexts supported by `Evidence` with the given reference
+
+        Statements are read from `graph` lazily, a context at a time, in the order of
+        `contexts_supported_by`. Contexts entirely before `offset` are skipped using the
+        indexed statement counts, without reading them. A statement in more than one of
+        the contexts is yielded once for each
+
+        Parameters
+        ----------
+        graph : rdflib.graph.ConjunctiveGraph
+            Graph with the statements. Should be the one the index was built from
+        reference : rdflib.term.URIRef
+            Identifier of the reference
+        offset : int, optional
+            Number of statements to skip
+        limit : int, optional
+            Maximum number of statements to yield. By default, there is no limit
+
+        Yields
+        ------
+        tuple
+            ``(subject, predicate, object, context)``
+        '''
+        remaining = limit
+        for ctx, size in self.contexts_supported_by(reference):
+            if remaining is not None and remaining <= 0:
+                return
+            if offset >= size:
+                offset -= size
+                continue
+            stop = None if remaining is None else offset + remaining
+            quads = islice(graph.quads((None, None, None, ctx)), offset, stop)
+            offset = 0
+            for s, p, o, _ in quads:
+                yield (s, p, o, ctx)
+                if remaining is not None:
+                    remaining -= 1
+
+    def save(self, path, fingerprint=None):
+        '''
+        Write the index to a file
+
+        Parameters
+        ----------
+        path : str
+            The file path
+        fingerprint : object, optional
+            Identifies the state of the data the index was built from. Returned by
+            `load`
+        '''
+        with open(path, 'wb') as f:
+            pickle.dump((FORMAT_VERSION,
+                         fingerprint,
+                         self.statement_contexts,
+                         dict(self.supporting),
+                         dict(self.refuting),
+                         self.context_sizes,
+                         dict(self.supported_contexts),
+                         dict(self.referencing)), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Read an index written by `save`
+
+        Returns
+        -------
+        tuple
+            The index and the fingerprint passed to `save`
+
+        Raises
+        ------
+        ValueError
+            If the file was written in a different format, like by an earlier version of
+            `save`. The index should be built again
+        '''
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        version = data[0] if isinstance(data, tuple) and len(data) == 8 else None
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported evidence index version {version} in {path}')
+        res = cls()
+        (_,
+         fingerprint,
+         res.statement_contexts,
+         supporting,
+         refuting,
+         res.context_sizes,
+         supported_contexts,
+         referencing) = data
+        res.supporting.update(supporting)
+        res.refuting.update(refuting)
+        res.supported_contexts.update(supported_contexts)
+        res.referencing.update(referencing)
+        return res, fingerprint
+
+
+def evidence_index_for_reference(context, reference, cache_dir=None):
+    '''
+    Get an `EvidenceIndex` for finding what `Evidence` with the given reference supports,
+    as from `EvidenceIndex.for_reference`
+
+    Parameters
+    ----------
+    context : owmeta_core.context.Context
+        Context with the supported statements and the `Evidence`. Typically, a stored
+        context like ``ctx.stored``
+    reference : rdflib.term.URIRef
+        Identifier of the reference
+    cache_dir : str, optional
+        Directory in which to save the index. If an index was saved there for the same
+        context and reference, and the store hasn't changed since, it's loaded rather
+        than built again. Only used for stores with a
+        `~owmeta.context_cache.stored_revision`
+
+    Returns
+    -------
+    EvidenceIndex
+    '''
+    ident = getattr(context, 'identifier', None)
+    revision = None
+    if cache_dir is not None and ident is not None:
+        revision = stored_revision(context)
+    if revision is None:
+        return EvidenceIndex.for_reference(context.rdf_graph(), reference)
+
+    fingerprint = (str(ident), str(reference), revision)
+    key = hashlib.sha256(f'{ident} {reference}'.encode('utf-8')).hexdigest()
+    cache_file = p(cache_dir, f'evidence-{key}.pickle')
+    if exists(cache_file):
+        try:
+            index, saved_fingerprint = EvidenceIndex.load(cache_file)
+            if saved_fingerprint == fingerprint:
+                return index
+        except Exception:
+            logger.warning("Unable to read cached evidence index from %s", cache_file,
+                           exc_info=True)
+
+    index = EvidenceIndex.for_reference(context.rdf_graph(), reference)
+    makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.pickle')
+    close(fd)
+    index.save(tmp, fingerprint)
+    replace(tmp, cache_file)
+    return index
+
+
+ContextCoverage = namedtuple('ContextCoverage', ('context', 'supported', 'counts'))
+'''
+Evidence coverage for one context
+
+Attributes
+----------
+context : rdflib.term.URIRef
+    The context identifier
+supported : bool
+    Whether any `Evidence` supports the context
+counts : dict
+    Map from each type given to `EvidenceCoverage` to the number of statements in the
+    context about objects of that type. Types with no statements are left out
+'''
+
+
+class TypeCoverage(namedtuple('TypeCoverage', ('type', 'supported', 'total'))):
+    '''
+    Evidence coverage for the statements about one type
+
+    Attributes
+    ----------
+    type : type
+        The `~owmeta_core.dataobject.DataObject` subclass
+    supported : int
+        The number of statements in contexts supported by `Evidence`
+    total : int
+        The number of statements
+    '''
+
+    __slots__ = ()
+
+    @property
+    def fraction(self):
+        ''' Fraction of the statements that are supported, or `None` if there are none '''
+        if self.total == 0:
+            return None
+        return self.supported / self.total
+
+
+class EvidenceCoverage(object):
+    '''
+    Reports which contexts have `Evidence.supports` statements and what fraction of
+    the statements about each of several types are in those contexts
+
+    A statement is about a type if its subject has that type or a sub-type of it.
+    Iterating over `contexts` makes one pass over the statements in the graph,
+    yielding a `ContextCoverage` as each context is counted, so results can be shown
+    while the rest are counted. `summary` completes the pass if it hasn't been done
+    already.
+    '''
+
+    def __init__(self, graph, types=None, evidence_graph=None):
+        '''
+        Parameters
+        ----------
+        graph : rdflib.graph.ConjunctiveGraph
+            Graph with the statements to check. Typically, from
+            `Context.rdf_graph <owmeta_core.context.Context.rdf_graph>`
+        types : sequence of type, optional
+            `~owmeta_core.dataobject.DataObject` subclasses to report on. Defaults to
+            those returned by `default_coverage_types`
+        evidence_graph : rdflib.graph.Graph, optional
+            Graph with the `Evidence` statements. Defaults to `graph`
+        '''
+        self.graph = graph
+        self.evidence_graph = graph if evidence_graph is None else evidence_graph
+        self.types = tuple(default_coverage_types() if types is None else types)
+        self._supported = dict()
+        self._total = dict()
+        self._done = False
+
+    def contexts(self):
+        '''
+        Count the statements in each context
+
+        Yields
+        ------
+        ContextCoverage
+        '''
+        supported_contexts = set(o for _, _, o in
+                                 self.evidence_graph.triples((None, Evidence.supports.link, None)))
+        type_map = defaultdict(list)
+        for t in self.types:
+            for rdf_type in _rdf_types(t):
+                type_map[rdf_type].append(t)
+        subject_types = dict()
+        for s, _, o in self.graph.triples((None, RDF.type, None)):
+            types = type_map.get(o)
+            if types:
+                subject_types.setdefault(s, set()).update(types)
+
+        supported = dict.fromkeys(self.types, 0)
+        total = dict.fromkeys(self.types, 0)
+        for ctx in self.graph.contexts():
+            ctxid = getattr(ctx, 'identifier', ctx)
+            counts = defaultdict(int)
+            for s, _, _, _ in self.graph.quads((None, None, None, ctxid)):
+                for t in subject_types.get(s, ()):
+                    counts[t] += 1
+            is_supported = ctxid in supported_contexts
+            for t, n in counts.items():
+                total[t] += n
+                if is_supported:
+                    supported[t] += n
+            yield ContextCoverage(ctxid, is_supported, dict(counts))
+        self._supported = supported
+        self._total = total
+        self._done = True
+
+    def summary(self):
+        '''
+        Returns the coverage for each type
+
+        Returns
+        -------
+        list of TypeCoverage
+        '''
+        if not self._done:
+            for _ in self.contexts():
+                pass
+        return [TypeCoverage(t, self._supported[t], self._total[t]) for t in self.types]
+
+
+def default_coverage_types():
+    '''
+    Returns the types `EvidenceCoverage` reports on by default: `~owmeta.neuron.Neuron`,
+    `~owmeta.muscle.Muscle`, `~owmeta.connection.Connection`, and
+    `~owmeta.channel.Channel`
+    '''
+    from .neuron import Neuron
+    from .muscle import Muscle
+    from .connection import Connection
+    from .channel import Channel
+    return (Neuron, Muscle, Connection, Channel)
+
+
+def _context_sizes(graph, contexts=None):
+    sizes = dict()
+    if contexts is not None:
+        for c in contexts:
+            sizes[c] = sum(1 for _ in graph.quads((None, None, None, c)))
+        return sizes
+    for _, _, _, c in graph.quads((None, None, None)):
+        c = getattr(c, 'identifier', c)
+        sizes[c] = sizes.get(c, 0) + 1
+    return sizes
+
+
+def _rdf_types(cls):
+    res = set()
+    rdf_type = getattr(cls, 'rdf_type', None)
+    if rdf_type is not None:
+        res.add(rdf_type)
+    for sub in cls.__subclasses__():
+        res |= _rdf_types(sub)
+    return res
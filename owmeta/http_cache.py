@@ -0,0 +1,239 @@
+'''
+On-disk caching of HTTP responses
+
+Metadata for `Documents <owmeta.document.Document>` is retrieved from WormBase, Pubmed,
+and Crossref. When a cache is given to, or set as the default for, the request functions
+in `owmeta.document`, responses are stored by URL and reused:
+
+- while an entry is younger than the cache's time-to-live, it is returned without making
+  a request
+- once it is older, the request is made conditional on the stored ``ETag`` and
+  ``Last-Modified`` headers, and the stored entry is reused if the server says it hasn't
+  changed
+- in offline mode, stored entries are returned regardless of age and no requests are
+  made at all
+
+Entries are stored under the URL without any `CREDENTIAL_PARAMETERS`, as given by
+`cache_key`, so API keys aren't written to the cache.
+
+`SQLiteHTTPCache` is the provided implementation. Other storage can be used by
+implementing the `HTTPCache` interface.
+'''
+from contextlib import closing
+import json
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+''' Default time-to-live for cache entries, in seconds '''
+
+CREDENTIAL_PARAMETERS = frozenset(('api_key', 'apikey', 'access_token', 'token'))
+''' Names of query parameters left out of the URLs entries are stored under '''
+
+
+def cache_key(url):
+    '''
+    Returns the URL a response for `url` is stored under: `url` without any
+    `CREDENTIAL_PARAMETERS` in its query
+
+    Parameters
+    ----------
+    url : str
+        The requested URL
+    '''
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    kept = [(k, v) for k, v in query if k.lower() not in CREDENTIAL_PARAMETERS]
+    if len(kept) == len(query):
+        return url
+    return urlunsplit(parts._replace(query=urlencode(kept, safe=',')))
+
+
+class CacheMiss(Exception):
+    '''
+    Raised when a cache in offline mode has no entry for a URL
+    '''
+
+    def __init__(self, url):
+        super(CacheMiss, self).__init__(f'No cached response for {url} and the cache is offline')
+        self.url = url
+
+
+class CacheEntry(object):
+    '''
+    A stored response
+    '''
+
+    def __init__(self, url, status_code, headers, content, stored_at):
+        self.url = url
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.content = content
+        self.stored_at = stored_at
+
+    def age(self, now=None):
+        return (time.time() if now is None else now) - self.stored_at
+
+    def validators(self):
+        '''
+        Returns headers to make a request conditional on the entry being out of date
+        '''
+        res = dict()
+        etag = self.headers.get('ETag')
+        if etag:
+            res['If-None-Match'] = etag
+        last_modified = self.headers.get('Last-Modified')
+        if last_modified:
+            res['If-Modified-Since'] = last_modified
+        return res
+
+    def to_response(self):
+        '''
+        Returns the entry as a `requests.Response`
+        '''
+        resp = requests.Response()
+        resp.url = self.url
+        resp.status_code = self.status_code
+        resp.headers = requests.structures.CaseInsensitiveDict(self.headers)
+        resp._content = self.content
+        resp._content_consumed = True
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        resp.from_cache = True
+        return resp
+
+
+class HTTPCache(object):
+    '''
+    Interface for HTTP response caches
+
+    Attributes
+    ----------
+    ttl : float or None
+        Seconds an entry is used without revalidating it. If `None`, entries never expire
+    offline : bool
+        If `True`, only cached entries are used and no requests are made
+    '''
+
+    def __init__(self, ttl=DEFAULT_TTL, offline=False):
+        self.ttl = ttl
+        self.offline = offline
+
+    def get(self, url):
+        '''
+        Returns the `CacheEntry` for `url` or `None` if there isn't one
+        '''
+        raise NotImplementedError()
+
+    def put(self, entry):
+        '''
+        Stores a `CacheEntry`, replacing any for the same URL
+        '''
+        raise NotImplementedError()
+
+    def touch(self, url, now=None):
+        '''
+        Resets the age of the entry for `url`, typically after successfully revalidating it
+        '''
+        entry = self.get(url)
+        if entry is not None:
+            entry.stored_at = time.time() if now is None else now
+            self.put(entry)
+
+    def clear(self):
+        '''
+        Removes all entries
+        '''
+        raise NotImplementedError()
+
+    def is_fresh(self, entry, now=None):
+        return self.ttl is None or entry.age(now) < self.ttl
+
+
+class SQLiteHTTPCache(HTTPCache):
+    '''
+    HTTP response cache stored in an SQLite database
+
+    A connection is opened for each operation, so an instance may be shared between
+    threads and processes
+    '''
+
+    def __init__(self, path, **kwargs):
+        '''
+        Parameters
+        ----------
+        path : str
+            Path to the database file. Created if it doesn't exist
+        **kwargs
+            Passed on to `HTTPCache`
+        '''
+        super(SQLiteHTTPCache, self).__init__(**kwargs)
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         ' url TEXT PRIMARY KEY,'
+                         ' status_code INTEGER,'
+                         ' headers TEXT,'
+                         ' content BLOB,'
+                         ' stored_at REAL)')
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30, isolation_level=None))
+
+    def get(self, url):
+        with self._connect() as conn:
+            row = conn.execute('SELECT status_code, headers, content, stored_at'
+                               ' FROM responses WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        status_code, headers, content, stored_at = row
+        return CacheEntry(url, status_code, json.loads(headers), content, stored_at)
+
+    def put(self, entry):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO responses'
+                         ' (url, status_code, headers, content, stored_at)'
+                         ' VALUES (?, ?, ?, ?, ?)',
+                         (entry.url, entry.status_code, json.dumps(dict(entry.headers)),
+                          entry.content, entry.stored_at))
+
+    def touch(self, url, now=None):
+        with self._connect() as conn:
+            conn.execute('UPDATE responses SET stored_at = ? WHERE url = ?',
+                         (time.time() if now is None else now, url))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM responses')
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+_default_cache = None
+
+
+def set_default_cache(cache):
+    '''
+    Sets the cache used for document metadata requests which aren't given one explicitly
+
+    Parameters
+    ----------
+    cache : HTTPCache or None
+        The cache. `None` disables caching by default
+    '''
+    global _default_cache
+    _default_cache = cache
+
+
+def get_default_cache():
+    '''
+    Returns the cache set with `set_default_cache`
+    '''
+    return _default_cache
@@ -0,0 +1,804 @@
+'''
+Cell lineage
+
+A `~owmeta.cell.Cell.lineageName` like ``'AB plapaaaap'`` names a blast cell, ``AB``,
+followed by one letter for each division leading to the cell: ``a`` for the anterior
+daughter, ``p`` for the posterior one, and so on. `LineageTrie` arranges the lineage names
+of all of the cells in a context into a tree with a node per division, so that questions
+about descent are answered by walking a few nodes rather than by loading cells and
+splitting strings::
+
+    >>> from owmeta.lineage import lineage_trie
+    >>> trie = lineage_trie(ctx.stored)
+    >>> sorted(trie.descendants('AB pla'))
+    ['ADAL', 'ADEL', ...]
+    >>> trie.lca('ADAL', 'ADAR')
+    'AB p'
+    >>> trie.distance('ADAL', 'ADAR')
+    18
+
+Where the lineage is recorded with `~owmeta.cell.Cell.parentOf` and
+`~owmeta.cell.Cell.daughterOf` statements instead, `LineageTree` loads them into arrays of
+parent pointers. `lineage_triples` goes the other way, generating those statements from a
+`LineageTrie`.
+
+The embryonic founder cells, ``AB``, ``MS``, ``E``, ``C``, ``D``, and the germline
+precursors, descend from ``P0`` as recorded in `FOUNDERS`. Other blast cells, like the
+post-embryonic ``V5`` or ``QL``, are at the top of their own lineages. That includes the
+ventral cord blasts in `VENTRAL_CORD_BLASTS`, ``P1`` to ``P12``, whose descendants are
+written like ``'P3.aap'``. The first four share their names with germline precursors, but
+those aren't named with divisions, so ``'P3'`` is the germline precursor, while
+``'P3.aap'`` descends from the ventral cord blast, written ``'P3.'`` on its own.
+'''
+from itertools import islice
+import logging
+import re
+
+from rdflib.namespace import RDF
+from rdflib.term import Literal
+
+from .bulk_query import property_value, stage_triples
+from .cell import Cell
+from .context_cache import ContextCache
+
+
+FOUNDERS = {
+    'AB': 'P0',
+    'P1': 'P0',
+    'EMS': 'P1',
+    'P2': 'P1',
+    'MS': 'EMS',
+    'E': 'EMS',
+    'C': 'P2',
+    'P3': 'P2',
+    'D': 'P3',
+    'P4': 'P3',
+    'Z2': 'P4',
+    'Z3': 'P4',
+}
+'''
+Mapping from each of the founder cells of the embryo to the cell it divides from
+'''
+
+VENTRAL_CORD_BLASTS = frozenset('P{}'.format(i) for i in range(1, 13))
+'''
+Names of the post-embryonic ventral cord blast cells
+'''
+
+L = logging.getLogger(__name__)
+
+LINEAGE_CACHE = ContextCache()
+'''
+Cache for the values returned by `lineage_trie` and `lineage_tree`
+'''
+
+_SEPARATOR = re.compile(r'[. ]')
+
+_BLAST_PREFIX = re.compile('|'.join(sorted(set(FOUNDERS) | {'P0'} | VENTRAL_CORD_BLASTS,
+                                           key=len, reverse=True)))
+
+
+def parse_lineage_name(lineage_name):
+    '''
+    Split a lineage name into the blast cell and the divisions from it
+
+    The blast cell name is separated from the divisions by a space or a period. If there
+    is no separator, the name is split after a leading founder cell or ventral cord blast
+    name, if any.
+
+    Example::
+
+        >>> parse_lineage_name('AB plapaaaap')
+        ('AB', 'plapaaaap')
+        >>> parse_lineage_name('MSpappa')
+        ('MS', 'pappa')
+        >>> parse_lineage_name('P11aap')
+        ('P11', 'aap')
+
+    Parameters
+    ----------
+    lineage_name : str
+        The lineage name
+
+    Returns
+    -------
+    tuple
+        The blast cell name and a string with one letter per division
+    '''
+    lineage_name = lineage_name.strip()
+    parts = _SEPARATOR.split(lineage_name, 1)
+    if len(parts) == 2:
+        return parts[0], _SEPARATOR.sub('', parts[1])
+    md = _BLAST_PREFIX.match(lineage_name)
+    if md is not None and md.end() < len(lineage_name) and \
+            lineage_name[md.end():].isalpha() and lineage_name[md.end():].islower():
+        return md.group(0), lineage_name[md.end():]
+    return lineage_name, ''
+
+
+class LineageNode(object):
+    '''
+    A node in a `LineageTrie`
+
+    Attributes
+    ----------
+    parent : LineageNode
+        The node for the cell this one divided from. `None` for the top of a lineage
+    step : str
+        The division letter leading to this node, or the blast cell name for a blast cell
+    blast : bool
+        Whether the node is for a blast cell
+    depth : int
+        Number of nodes above this one
+    children : dict
+        Mapping from `step` to child node
+    cells : list of tuple
+        Pairs of identifier and `~owmeta.cell.Cell.name` for the cells with this lineage
+    '''
+
+    __slots__ = ('parent', 'step', 'blast', 'depth', 'children', 'cells')
+
+    def __init__(self, parent, step, blast=False):
+        self.parent = parent
+        self.step = step
+        self.blast = blast
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.children = dict()
+        self.cells = []
+
+    @property
+    def lineage_name(self):
+        '''
+        The lineage name for this node, like ``'AB pla'``, or, for the descendants of a
+        ventral cord blast, like ``'P3.aap'``
+        '''
+        steps = []
+        node = self
+        while not node.blast:
+            steps.append(node.step)
+            node = node.parent
+        if node.parent is None and node.step in VENTRAL_CORD_BLASTS:
+            if steps or node.step in FOUNDERS:
+                return node.step + '.' + ''.join(reversed(steps))
+            return node.step
+        if not steps:
+            return node.step
+        return node.step + ' ' + ''.join(reversed(steps))
+
+    def walk(self):
+        '''
+        Yields this node and all of the nodes below it, parents before children
+        '''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values())
+
+    def __repr__(self):
+        return '{}({!r}, cells={})'.format(type(self).__name__, self.lineage_name,
+                                           len(self.cells))
+
+
+class LineageTrie(object):
+    '''
+    A tree of lineage names, with a node for each division
+
+    Names passed to the query methods may be either cell names, like ``'ADAL'``, or
+    lineage names, like ``'AB pla'``. A lineage name doesn't need to belong to a cell, but
+    must be the ancestor of one.
+
+    Attributes
+    ----------
+    roots : dict
+        Mapping from blast cell name to the node at the top of its lineage
+    by_name : dict
+        Mapping from cell name to node
+    '''
+
+    __slots__ = ('roots', 'by_name', '_blasts')
+
+    def __init__(self):
+        self.roots = dict()
+        self.by_name = dict()
+        self._blasts = dict()
+
+    @classmethod
+    def from_graph(cls, graph):
+        '''
+        Build a trie from the `~owmeta.cell.Cell.lineageName` statements in a graph
+
+        Parameters
+        ----------
+        graph : rdflib.graph.Graph
+            The graph
+
+        Returns
+        -------
+        LineageTrie
+        '''
+        lineage_names = property_value(graph, Cell.lineageName)
+        names = property_value(graph, Cell.name, lineage_names)
+        res = cls()
+        for ident, lineage_name in lineage_names.items():
+            name = names.get(ident)
+            res.add(str(lineage_name), ident, None if name is None else str(name))
+        return res
+
+    def add(self, lineage_name, identifier=None, name=None):
+        '''
+        Add a cell to the trie
+
+        Parameters
+        ----------
+        lineage_name : str
+            The cell's lineage name
+        identifier : rdflib.term.URIRef, optional
+            The cell's identifier
+        name : str, optional
+            The cell's name
+
+        Returns
+        -------
+        LineageNode
+            The node for the cell
+        '''
+        node = self._node(lineage_name, create=True)
+        node.cells.append((identifier, name))
+        if name is not None:
+            self.by_name[name] = node
+        return node
+
+    def node(self, name):
+        '''
+        Get the node for a cell name or lineage name
+
+        Parameters
+        ----------
+        name : str
+            The name
+
+        Returns
+        -------
+        LineageNode
+            The node, or `None` if the name isn't in the trie
+        '''
+        node = self.by_name.get(name)
+        if node is None:
+            node = self._node(name, create=False)
+        return node
+
+    def descendants(self, name, include_self=True):
+        '''
+        Get the names of the cells descended from a cell or lineage
+
+        Parameters
+        ----------
+        name : str
+            The cell name or lineage name
+        include_self : bool, optional
+            If `True`, the default, cells with the given lineage are included
+
+        Returns
+        -------
+        set of str
+        '''
+        node = self._require(name)
+        res = set()
+        for n in node.walk():
+            if n is node and not include_self:
+                continue
+            res.update(cell_name for _, cell_name in n.cells if cell_name is not None)
+        return res
+
+    def ancestors(self, name):
+        '''
+        Get the lineage names of the ancestors of a cell or lineage, nearest first
+
+        Parameters
+        ----------
+        name : str
+            The cell name or lineage name
+
+        Returns
+        -------
+        list of str
+        '''
+        node = self._require(name).parent
+        res = []
+        while node is not None:
+            res.append(node.lineage_name)
+            node = node.parent
+        return res
+
+    def lca(self, a, b):
+        '''
+        Get the lowest common ancestor of two cells or lineages
+
+        Parameters
+        ----------
+        a : str
+            A cell name or lineage name
+        b : str
+            Another cell name or lineage name
+
+        Returns
+        -------
+        str
+            The lineage name of the common ancestor, or `None` if the two are in separate
+            lineages
+        '''
+        node = self._lca(self._require(a), self._require(b))
+        return None if node is None else node.lineage_name
+
+    def distance(self, a, b):
+        '''
+        Get the number of divisions separating two cells or lineages through their
+        lowest common ancestor
+
+        Parameters
+        ----------
+        a : str
+            A cell name or lineage name
+        b : str
+            Another cell name or lineage name
+
+        Returns
+        -------
+        int
+            The distance, or `None` if the two are in separate lineages
+        '''
+        na = self._require(a)
+        nb = self._require(b)
+        common = self._lca(na, nb)
+        if common is None:
+            return None
+        return na.depth + nb.depth - 2 * common.depth
+
+    def parent_links(self):
+        '''
+        Yields the pairs of cells where one divided directly into the other
+
+        Yields
+        ------
+        tuple
+            Identifiers of the parent cell and the daughter cell
+        '''
+        for root in self.roots.values():
+            for node in root.walk():
+                if node.parent is None or not node.cells:
+                    continue
+                for parent, _ in node.parent.cells:
+                    if parent is None:
+                        continue
+                    for daughter, _ in node.cells:
+                        if daughter is not None:
+                            yield parent, daughter
+
+    def link_cells(self, context):
+        '''
+        Stage `~owmeta.cell.Cell.parentOf` and `~owmeta.cell.Cell.daughterOf` statements
+        for all of the `parent_links` in a context
+
+        The statements are staged directly rather than through `~owmeta.cell.Cell`
+        objects. Cells are only linked to the cells they divided from directly, so cells
+        whose parents aren't in the trie aren't linked.
+
+        Parameters
+        ----------
+        context : owmeta_core.context.Context
+            The context to stage the statements in
+
+        Returns
+        -------
+        int
+            The number of parent-daughter pairs linked
+        '''
+        def triples():
+            for parent, daughter in self.parent_links():
+                yield (parent, Cell.parentOf, daughter)
+                yield (daughter, Cell.daughterOf, parent)
+        # Two statements per pair
+        return stage_triples(context, triples()) // 2
+
+    def __len__(self):
+        return sum(len(n.cells) for root in self.roots.values() for n in root.walk())
+
+    def __repr__(self):
+        return '{}(lineages={}, cell_names={})'.format(type(self).__name__,
+                                                       len(self.roots), len(self.by_name))
+
+    def _require(self, name):
+        node = self.node(name)
+        if node is None:
+            raise KeyError(name)
+        return node
+
+    def _lca(self, a, b):
+        while a.depth > b.depth:
+            a = a.parent
+        while b.depth > a.depth:
+            b = b.parent
+        while a is not b:
+            if a.parent is None:
+                return None
+            a = a.parent
+            b = b.parent
+        return a
+
+    def _blast(self, blast, create, ventral_cord=False):
+        # The ventral cord blasts are always at the top of their lineages, and the
+        # germline precursors sharing their names never are, so they can't be confused
+        # in `roots`
+        blasts = self.roots if ventral_cord else self._blasts
+        node = blasts.get(blast)
+        if node is not None or not create:
+            return node
+        parent_name = None if ventral_cord else FOUNDERS.get(blast)
+        if parent_name is None:
+            node = self.roots[blast] = LineageNode(None, blast, True)
+        else:
+            parent = self._blast(parent_name, create)
+            node = parent.children[blast] = LineageNode(parent, blast, True)
+        if not ventral_cord:
+            self._blasts[blast] = node
+        return node
+
+    def _node(self, lineage_name, create):
+        blast, divisions = parse_lineage_name(lineage_name)
+        ventral_cord = blast in VENTRAL_CORD_BLASTS and (
+                blast not in FOUNDERS or divisions or '.' in lineage_name)
+        node = self._blast(blast, create, ventral_cord)
+        for step in divisions:
+            if node is None:
+                break
+            child = node.children.get(step)
+            if child is None and create:
+                child = node.children[step] = LineageNode(node, step)
+            node = child
+        return node
+
+
+def lineage_trie(context):
+    '''
+    Get the `LineageTrie` for the cells in a context
+
+    The trie is built with a bulk query for lineage names the first time it's needed,
+    and is cached until the context changes.
+
+    Parameters
+    ----------
+    context : owmeta_core.context.Context
+        The context. Typically, a stored context like ``ctx.stored``
+
+    Returns
+    -------
+    LineageTrie
+    '''
+    return LINEAGE_CACHE.get(context, 'lineage_trie',
+                             lambda: LineageTrie.from_graph(context.rdf_graph()))
+
+
+class LineageTree(object):
+    '''
+    The `~owmeta.cell.Cell.parentOf` relation between cells as arrays
+
+    Cells are numbered in the order of a depth-first traversal from the cells without a
+    parent, so the cells descended from cell ``i`` are the ones numbered ``i`` up to
+    ``end[i]``. Methods taking a cell take its identifier.
+
+    Parameters
+    ----------
+    links : iterable of tuple
+        Pairs of parent and daughter identifiers. Where a cell has more than one parent,
+        the first is kept. Links which would make a cycle are dropped
+
+    Attributes
+    ----------
+    identifiers : list of rdflib.term.URIRef
+        Cell identifiers in traversal order
+    index : dict
+        Mapping from cell identifier to its number
+    parent : list of int
+        Number of the parent of each cell, or -1 for a cell without one
+    depth : list of int
+        Number of ancestors of each cell
+    end : list of int
+        One past the number of the last descendant of each cell
+    '''
+
+    __slots__ = ('identifiers', 'index', 'parent', 'depth', 'end', '_up')
+
+    def __init__(self, links):
+        daughters = dict()
+        parent_of = dict()
+        for parent, daughter in links:
+            if parent == daughter:
+                continue
+            previous = parent_of.setdefault(daughter, parent)
+            if previous != parent:
+                L.warning('%s has more than one parent. Using %s', daughter, previous)
+                continue
+            daughters.setdefault(parent, []).append(daughter)
+            daughters.setdefault(daughter, [])
+
+        self.identifiers = []
+        self.parent = []
+        self.depth = []
+        self.end = []
+        self.index = dict()
+        roots = sorted(c for c in daughters if c not in parent_of)
+        self._traverse(roots, daughters)
+        if len(self.identifiers) < len(daughters):
+            # The rest are in cycles. Break each cycle at an arbitrary cell
+            remaining = sorted(c for c in daughters if c not in self.index)
+            L.warning('Lineage has cycles. Dropping some parents for %d cells',
+                      len(remaining))
+            for c in remaining:
+                if c not in self.index:
+                    self._traverse([c], daughters)
+        self._up = None
+
+    @classmethod
+    def from_graph(cls, graph):
+        '''
+        Build a tree from the `~owmeta.cell.Cell.parentOf` and
+        `~owmeta.cell.Cell.daughterOf` statements in a graph
+
+        Parameters
+        ----------
+        graph : rdflib.graph.Graph
+            The graph
+
+        Returns
+        -------
+        LineageTree
+        '''
+        links = set((s, o) for s, _, o in graph.triples((None, Cell.parentOf.link, None)))
+        links.update((o, s) for s, _, o in graph.triples((None, Cell.daughterOf.link, None)))
+        return cls(sorted(links))
+
+    def _traverse(self, roots, daughters):
+        for root in roots:
+            stack = [(root, -1)]
+            while stack:
+                cell, parent = stack.pop()
+                if cell is None:
+                    self.end[parent] = len(self.identifiers)
+                    continue
+                if cell in self.index:
+                    continue
+                i = len(self.identifiers)
+                self.index[cell] = i
+                self.identifiers.append(cell)
+                self.parent.append(parent)
+                self.depth.append(0 if parent < 0 else self.depth[parent] + 1)
+                self.end.append(i + 1)
+                # Marks the end of the cell's descendants once they've been traversed
+                stack.append((None, i))
+                stack.extend((d, i) for d in reversed(daughters[cell]))
+
+    def __contains__(self, cell):
+        return cell in self.index
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def parent_of(self, cell):
+        '''
+        Get the parent of a cell in constant time
+
+        Returns
+        -------
+        rdflib.term.URIRef
+            The parent's identifier, or `None` if the cell has no parent
+        '''
+        p = self.parent[self.index[cell]]
+        return None if p < 0 else self.identifiers[p]
+
+    def depth_of(self, cell):
+        '''
+        Get the number of ancestors of a cell in constant time
+
+        Returns
+        -------
+        int
+        '''
+        return self.depth[self.index[cell]]
+
+    def ancestors(self, cell):
+        '''
+        Get the ancestors of a cell, nearest first
+
+        Returns
+        -------
+        list of rdflib.term.URIRef
+        '''
+        res = []
+        p = self.parent[self.index[cell]]
+        while p >= 0:
+            res.append(self.identifiers[p])
+            p = self.parent[p]
+        return res
+
+    def is_ancestor(self, ancestor, cell):
+        '''
+        Tell whether one cell is an ancestor of, or the same as, another in constant time
+
+        Returns
+        -------
+        bool
+        '''
+        i = self.index[ancestor]
+        return i <= self.index[cell] < self.end[i]
+
+    def subtree(self, cell, include_self=True):
+        '''
+        Get the descendants of a cell, parents before daughters
+
+        Returns
+        -------
+        list of rdflib.term.URIRef
+        '''
+        i = self.index[cell]
+        return self.identifiers[i if include_self else i + 1:self.end[i]]
+
+    def lca(self, a, b):
+        '''
+        Get the lowest common ancestor of two cells in logarithmic time
+
+        Returns
+        -------
+        rdflib.term.URIRef
+            The common ancestor, which may be one of the cells, or `None` if the cells
+            aren't in the same tree
+        '''
+        i = self.index[a]
+        j = self.index[b]
+        if self.is_ancestor(a, b):
+            return a
+        if self.is_ancestor(b, a):
+            return b
+        up = self._jumps()
+        # Lift `i` to just below the common ancestor
+        for level in reversed(up):
+            k = level[i]
+            if k >= 0 and not (k <= j < self.end[k]):
+                i = k
+        p = self.parent[i]
+        return None if p < 0 else self.identifiers[p]
+
+    def _jumps(self):
+        if self._up is None:
+            up = [self.parent]
+            while True:
+                prev = up[-1]
+                nxt = [-1 if k < 0 else prev[k] for k in prev]
+                if all(k < 0 for k in nxt):
+                    break
+                up.append(nxt)
+            self._up = up
+        return self._up
+
+    def __repr__(self):
+        return '{}(cells={})'.format(type(self).__name__, len(self))
+
+
+def lineage_tree(context):
+    '''
+    Get the `LineageTree` for the cells in a context
+
+    The tree is built from the `~owmeta.cell.Cell.parentOf` and
+    `~owmeta.cell.Cell.daughterOf` statements the first time it's needed, and is cached
+    until the context changes.
+
+    Parameters
+    ----------
+    context : owmeta_core.context.Context
+        The context. Typically, a stored context like ``ctx.stored``
+
+    Returns
+    -------
+    LineageTree
+    '''
+    return LINEAGE_CACHE.get(context, 'lineage_tree',
+                             lambda: LineageTree.from_graph(context.rdf_graph()))
+
+
+def lineage_triples(trie, batch_size=10000, intermediate=True):
+    '''
+    Generates the `~owmeta.cell.Cell.parentOf` and `~owmeta.cell.Cell.daughterOf`
+    statements for the lineage in a trie, in batches
+
+    Parameters
+    ----------
+    trie : LineageTrie
+        The trie
+    batch_size : int, optional
+        Maximum number of triples in a batch
+    intermediate : bool, optional
+        If `True`, the default, every node of the trie gets a cell, so the whole lineage
+        is linked, including the blast cells from `FOUNDERS`. A node without a cell gets
+        a `~owmeta.cell.Cell` named for its lineage name without spaces, like ``ABpla``,
+        and statements for its type, name and lineage name are generated along with the
+        links. Otherwise, only cells in the trie whose parents are in the trie are linked
+
+    Yields
+    ------
+    list of tuple
+        A batch of triples
+    '''
+    triples = _lineage_triples(trie, intermediate)
+    while True:
+        batch = list(islice(triples, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_lineage(trie, graph, batch_size=10000, intermediate=True):
+    '''
+    Add the statements from `lineage_triples` to a graph, one batch at a time
+
+    Parameters
+    ----------
+    trie : LineageTrie
+        The trie
+    graph : rdflib.graph.Graph
+        The graph to add to, like the graph for a context in the configured store
+    batch_size : int, optional
+        Number of triples to add at a time
+    intermediate : bool, optional
+        See `lineage_triples`
+
+    Returns
+    -------
+    int
+        The number of triples added
+    '''
+    count = 0
+    for batch in lineage_triples(trie, batch_size, intermediate):
+        graph.addN((s, p, o, graph) for s, p, o in batch)
+        count += len(batch)
+    return count
+
+
+def _lineage_triples(trie, intermediate):
+    parent_of = Cell.parentOf.link
+    daughter_of = Cell.daughterOf.link
+    if not intermediate:
+        for parent, daughter in trie.parent_links():
+            yield (parent, parent_of, daughter)
+            yield (daughter, daughter_of, parent)
+        return
+
+    cells = dict()
+
+    def cells_of(node):
+        res = cells.get(node)
+        if res is not None:
+            return res, ()
+        res = [ident for ident, _ in node.cells if ident is not None]
+        minted = ()
+        if not res:
+            lineage_name = node.lineage_name
+            ident = Cell.make_identifier_direct(lineage_name.replace(' ', ''))
+            res = [ident]
+            minted = [(ident, RDF.type, Cell.rdf_type),
+                      (ident, Cell.name.link, Literal(lineage_name.replace(' ', ''))),
+                      (ident, Cell.lineageName.link, Literal(lineage_name))]
+        cells[node] = res
+        return res, minted
+
+    for root in trie.roots.values():
+        for node in root.walk():
+            daughters, minted = cells_of(node)
+            yield from minted
+            if node.parent is None:
+                continue
+            # Parents are walked before their daughters, so they're already known
+            parents, _ = cells_of(node.parent)
+            for parent in parents:
+                for daughter in daughters:
+                    yield (parent, parent_of, daughter)
+                    yield (daughter, daughter_of, parent)
@@ -1,5 +1,6 @@
 from owmeta_core.dataobject import DatatypeProperty, ObjectProperty, Alias
 
+from .bulk_query import PrefetchMixin
 from .cell import Cell
 from .neuron import Neuron
 
@@ -26,7 +27,7 @@ class Muscle(Cell):
     neurons = Alias(innervatedBy)
     ''' Alias to `innervatedBy` '''
 
-    receptors = DatatypeProperty(multiple=True)
+    receptors = DatatypeProperty(multiple=True, mixins=(PrefetchMixin,))
     ''' Receptor types expressed by this type of muscle '''
 
     receptor = Alias(receptors)
@@ -1,14 +1,276 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+from collections import namedtuple
+from os.path import exists, join as p
+
 from owmeta_core.dataobject import ObjectProperty, Alias
 
-from .connection import Connection
+from .bulk_query import attach_prefetched, objects_of, property_value, property_values
+from .cell import Cell
+from .connection import Connection, SynapseType, connection_counts
+from .context_cache import ContextCache
 from .neuron import Neuron
 from .biology import BiologyType
 from .worm_common import WORM_RDF_TYPE
 
 
+NETWORK_CACHE = ContextCache()
+'''
+Cache for aggregate values computed by `Network` methods
+'''
+
+CONNECTOME_SNAPSHOT_CONF_KEY = 'owmeta.connectome_snapshot'
+'''
+Configuration key for the path to a `~owmeta.connectome_snapshot.ConnectomeSnapshot`.
+If set, `Network` methods computing aggregate values use the snapshot rather than
+querying, provided it was taken from the same network. If not set, a `Network` from a
+bundle uses the snapshot in the bundle, if it has one (see `bundle_snapshot_path`)
+'''
+
+CONNECTOME_SNAPSHOT_FILE_NAME = 'connectome_snapshot.npz'
+'''
+Name of the snapshot file in a project directory and in the ``files`` directory of a
+bundle
+'''
+
+
+NeuronDegree = namedtuple('NeuronDegree', ('in_degree', 'out_degree', 'gap_degree'))
+'''
+Degrees of a neuron returned by `Network.degree_table`: the number of incoming chemical
+synapses, of outgoing chemical synapses, and of gap junctions
+'''
+
+
+class Adjacency(object):
+    '''
+    An adjacency matrix for the synapses in a `Network` in compressed sparse row (CSR) form
+
+    The arrays have the same meaning as the ``(data, indices, indptr)`` arguments to
+    `scipy.sparse.csr_matrix`: the weights of the edges out of the cell with index ``i``
+    are ``data[indptr[i]:indptr[i + 1]]`` and the indices of the corresponding
+    post-synaptic cells are ``indices[indptr[i]:indptr[i + 1]]``.
+
+    Attributes
+    ----------
+    names : list of str
+        Cell names, sorted. The position of a name is its index in the matrix
+    index : dict
+        Mapping from cell name to index
+    indptr : list of int
+        Row pointers
+    indices : list of int
+        Column indices
+    data : list of int
+        Edge weights: the sum of `Connection.number` over the connections between the
+        pair of cells
+    '''
+
+    __slots__ = ('names', 'index', 'indptr', 'indices', 'data')
+
+    def __init__(self, names, index, indptr, indices, data):
+        self.names = names
+        self.index = index
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @property
+    def shape(self):
+        return (len(self.names), len(self.names))
+
+    def edges(self):
+        '''
+        Yields the edges in the matrix
+
+        Yields
+        ------
+        tuple
+            A triple of pre-synaptic cell name, post-synaptic cell name, and weight
+        '''
+        for i, pre in enumerate(self.names):
+            for k in range(self.indptr[i], self.indptr[i + 1]):
+                yield (pre, self.names[self.indices[k]], self.data[k])
+
+    def to_scipy(self):
+        '''
+        Returns the matrix as a `scipy.sparse.csr_matrix`. Requires SciPy
+        '''
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return '{}(shape={}, nnz={})'.format(type(self).__name__, self.shape, len(self.data))
+
+
+class NeuronPropertyIndex(object):
+    """
+    An inverted index from the values of `Neuron` properties to the names of the neurons
+    having them
+
+    Returned by `Network.property_index`. Each lookup takes the name of one of the
+    `PROPERTIES`, like ``'receptor'``. Lookups of values no neuron has return empty sets.
+
+    Attributes
+    ----------
+    index : dict
+        Mapping from property name to a mapping from value to a `frozenset` of neuron
+        names
+    """
+
+    PROPERTIES = ('receptor', 'neurotransmitter', 'neuropeptide', 'innexin', 'type')
+    ''' Names of the indexed `Neuron` properties '''
+
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def get(self, prop, value):
+        """
+        Get the names of the neurons with a value for a property
+
+        :param prop: Name of the property
+        :param value: The value
+        :returns: The neuron names
+        :rtype: frozenset of str
+        """
+        return self._values(prop).get(value, frozenset())
+
+    def get_many(self, prop, values):
+        """
+        Get the names of the neurons with each of several values for a property
+
+        :param prop: Name of the property
+        :param values: The values
+        :returns: Mapping from each of the values to the neuron names
+        :rtype: dict of str to frozenset of str
+        """
+        index = self._values(prop)
+        return {v: index.get(v, frozenset()) for v in values}
+
+    def any_of(self, prop, values):
+        """
+        Get the names of the neurons with at least one of several values for a property
+
+        :param prop: Name of the property
+        :param values: The values
+        :rtype: set of str
+        """
+        index = self._values(prop)
+        res = set()
+        for v in values:
+            res.update(index.get(v, ()))
+        return res
+
+    def all_of(self, prop, values):
+        """
+        Get the names of the neurons with all of several values for a property
+
+        :param prop: Name of the property
+        :param values: The values. If empty, the result is empty
+        :rtype: set of str
+        """
+        index = self._values(prop)
+        res = None
+        for v in values:
+            names = index.get(v, frozenset())
+            res = set(names) if res is None else res & names
+            if not res:
+                break
+        return res or set()
+
+    def values(self, prop):
+        """
+        Get the values of a property that at least one neuron has
+
+        :param prop: Name of the property
+        :rtype: set
+        """
+        return set(self._values(prop))
+
+    def _values(self, prop):
+        try:
+            return self.index[prop]
+        except KeyError:
+            raise ValueError('{!r} is not an indexed property. Expected one of {}'.format(
+                prop, self.PROPERTIES))
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__,
+                               ', '.join('{}={}'.format(p, len(v))
+                                         for p, v in self.index.items()))
+
+
+class NeuronNameIndex(object):
+    """
+    An index from the names and synonyms of the neurons in a `Network` to their
+    identifiers
+
+    Returned by `Network.name_index`. Names take precedence over synonyms, and a synonym
+    shared by several neurons doesn't resolve to any of them.
+
+    Attributes
+    ----------
+    names : dict
+        Mapping from neuron name to identifier
+    synonyms : dict
+        Mapping from synonym to a `frozenset` of the identifiers of the neurons with that
+        synonym
+    values : dict
+        Mapping from identifier to the RDF terms of the neuron's `~owmeta.cell.Cell.name`
+        and `~owmeta.cell.Cell.synonym` values, keyed by property `linkName`
+    """
+
+    __slots__ = ('names', 'synonyms', 'values')
+
+    def __init__(self, names, synonyms, values):
+        self.names = names
+        self.synonyms = synonyms
+        self.values = values
+
+    def identifier(self, name):
+        """
+        Get the identifier of the neuron with a name or synonym
+
+        :param name: The name or synonym
+        :returns: The identifier, or `None` if no neuron, or more than one, has the name
+        :rtype: rdflib.term.URIRef
+        """
+        ident = self.names.get(name)
+        if ident is None:
+            idents = self.synonyms.get(name)
+            if idents is not None and len(idents) == 1:
+                ident, = idents
+        return ident
+
+    def identifiers(self, names):
+        """
+        Get the identifiers of the neurons with several names or synonyms
+
+        :param names: The names or synonyms
+        :returns: Mapping from each of the names that resolve to a neuron to its
+                  identifier
+        :rtype: dict
+        """
+        res = dict()
+        for name in names:
+            ident = self.identifier(name)
+            if ident is not None:
+                res[name] = ident
+        return res
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return '{}(names={}, synonyms={})'.format(type(self).__name__,
+                                                  len(self.names), len(self.synonyms))
+
+
 class Network(BiologyType):
 
     """ A network of neurons """
@@ -50,15 +312,22 @@ class Network(BiologyType):
             >>> set(net.neuron_names())
             set(['VB4', 'PDEL', 'HSNL', 'SIBDR', ... 'RIAL', 'MCR', 'LUAL'])
 
+        If a connectome snapshot is configured for this network, the names come from the
+        snapshot.
         """
-        neuron_expr = self.neuron.expr
-        neuron_expr.name()
-        return set(x.toPython() for x in neuron_expr.name)
+        snapshot = self._snapshot()
+        if snapshot is not None:
+            return snapshot.neuron_names()
+        return set(self.name_index().names)
 
     def aneuron(self, name):
         """
         Get a neuron by name.
 
+        The name is looked up in `name_index`, so, for a neuron in this network, no query
+        is made and the neuron's name and synonyms are available without one. Otherwise,
+        a `Neuron` with the given name is returned.
+
         Example::
 
             # Grabs the representation of the neuronal network
@@ -71,11 +340,71 @@ class Network(BiologyType):
             set([u'interneuron'])
 
 
-        :param name: Name of a c. elegans neuron
+        :param name: Name, or synonym, of a c. elegans neuron
         :returns: Neuron corresponding to the name given
         :rtype: owmeta.neuron.Neuron
         """
-        return Neuron.contextualize(self.context)(name=name, conf=self.conf)
+        index = self.name_index()
+        return self._indexed_neuron(index, index.identifier(name), name)
+
+    def aneurons(self, names):
+        """
+        Get several neurons by name.
+
+        Like `aneuron`, but the `name_index` is only retrieved once.
+
+        Example::
+
+            >>> net = Worm().get_neuron_network()
+            >>> [n.name() for n in net.aneurons(['AVAL', 'AVAR'])]
+            ['AVAL', 'AVAR']
+
+        :param names: Names, or synonyms, of c. elegans neurons
+        :returns: Neurons corresponding to the names given, in the same order
+        :rtype: list of owmeta.neuron.Neuron
+        """
+        index = self.name_index()
+        return [self._indexed_neuron(index, index.identifier(name), name)
+                for name in names]
+
+    def name_index(self):
+        """
+        Get an index from the names and synonyms of the neurons in this network to their
+        identifiers.
+
+        The index is built with one bulk query each for names and synonyms the first
+        time it's needed, and is cached for the context of this network.
+
+        :returns: The index
+        :rtype: owmeta.network.NeuronNameIndex
+        """
+        return NETWORK_CACHE.get(self.context,
+                                 ('name_index', self._cache_key()),
+                                 self._make_name_index)
+
+    def neurons_by_type(self):
+        """
+        Get the neurons in this network grouped by their `~owmeta.neuron.Neuron.type`
+
+        The types of all neurons are retrieved with one bulk query, and the grouping is
+        cached for the context of this network. The network isn't modified. A neuron with
+        several types is in each of their groups and neurons without a type aren't in any.
+
+        Example::
+
+            >>> net = Worm().get_neuron_network()
+            >>> by_type = net.neurons_by_type()
+            >>> sorted(by_type)
+            ['interneuron', 'motor', 'sensory']
+
+        :returns: Mapping from type to the neurons of that type
+        :rtype: dict of str to list of owmeta.neuron.Neuron
+        """
+        neuron = Neuron.contextualize(self.context)
+        # The neurons are declared as such in the graph already, so we don't stage the
+        # declarations again
+        return {t: [neuron(ident=ident, no_type_decl=True) for ident in idents]
+                for t, idents in self._neuron_idents_by_type().items()}
 
     def sensory(self):
         """
@@ -84,14 +413,7 @@ class Network(BiologyType):
         :returns: A iterable of all sensory neurons
         :rtype: iter(Neuron)
         """
-
-        n = Neuron.contextualize(self.context)()
-        n.type('sensory')
-
-        self.neuron.set(n)
-        res = list(n.load())
-        self.neuron.unset(n)
-        return res
+        return self.neurons_by_type().get('sensory', [])
 
     def interneurons(self):
         """
@@ -100,14 +422,7 @@ class Network(BiologyType):
         :returns: A iterable of all interneurons
         :rtype: iter(Neuron)
         """
-
-        n = Neuron.contextualize(self.context)()
-        n.type('interneuron')
-
-        self.neuron.set(n)
-        res = list(n.load())
-        self.neuron.unset(n)
-        return res
+        return self.neurons_by_type().get('interneuron', [])
 
     def motor(self):
         """
@@ -116,17 +431,265 @@ class Network(BiologyType):
         :returns: A iterable of all motor neurons
         :rtype: iter(Neuron)
         """
+        return self.neurons_by_type().get('motor', [])
+
+    def adjacency(self, syntype=None):
+        """
+        Get an adjacency matrix for the synapses in this network.
+
+        The statements for all synapses are retrieved in bulk rather than by loading each
+        `~owmeta.connection.Connection`. The result is cached for the context of this
+        network and discarded when the context changes.
+
+        Example::
+
+            >>> net = Worm().get_neuron_network()
+            >>> adj = net.adjacency(syntype='send')
+            >>> adj.to_scipy()[adj.index['AVAL'], adj.index['AVBR']]
+            7
+
+        If a connectome snapshot is configured for this network, the matrix is computed
+        from the snapshot.
+
+        :param syntype: If given, only synapses with this `~owmeta.connection.Connection.syntype` are included
+        :returns: The adjacency matrix. Every neuron in the network and every cell taking part in a synapse
+                  gets an index
+        :rtype: owmeta.network.Adjacency
+        """
+        snapshot = self._snapshot()
+        if snapshot is not None:
+            return snapshot.adjacency(syntype)
+        return NETWORK_CACHE.get(self.context,
+                                 ('adjacency', self._cache_key(), syntype),
+                                 lambda: self._make_adjacency(syntype))
+
+    def degree_table(self):
+        """
+        Get the degrees of all neurons in this network.
+
+        The counts come from grouped aggregate queries over the connections in `synapse`
+        rather than from per-neuron queries. Like `Neuron.GJ_degree`, gap junctions are
+        counted where the neuron is the pre-synaptic cell. The result is cached for the
+        context of this network.
+
+        Example::
+
+            >>> net = Worm().get_neuron_network()
+            >>> net.degree_table()['AVAL']
+            NeuronDegree(in_degree=..., out_degree=..., gap_degree=44)
+
+        If a connectome snapshot is configured for this network, the degrees are computed
+        from the synapses in the snapshot, which are the same connections.
+
+        :returns: Mapping from neuron name to its degrees
+        :rtype: dict of str to owmeta.network.NeuronDegree
+        """
+        snapshot = self._snapshot()
+        if snapshot is not None:
+            return snapshot.degree_table()
+        return NETWORK_CACHE.get(self.context,
+                                 ('degree_table', self._cache_key()),
+                                 self._make_degree_table)
+
+    def connection_table(self):
+        """
+        Get a columnar table of the synapses in this network.
+
+        Like `adjacency`, the statements for all synapses are retrieved in bulk and the
+        result is cached for the context of this network. If a connectome snapshot is
+        configured for this network, the snapshot's table is returned. Requires NumPy.
 
-        n = Neuron.contextualize(self.context)()
-        n.type('motor')
+        Example::
+
+            >>> net = Worm().get_neuron_network()
+            >>> table = net.connection_table()
+            >>> chemical = table.select(table.mask(pre='AVAL', syntype='send'))
+            >>> sorted(set(r.post for r in chemical))
+            ['AVAR', 'AVBL', ...]
+
+        :returns: The connections table
+        :rtype: owmeta.connection_table.ConnectionTable
+        """
+        snapshot = self._snapshot()
+        if snapshot is not None:
+            return snapshot.table
+        from .connection_table import ConnectionTable
+        return NETWORK_CACHE.get(self.context,
+                                 ('connection_table', self._cache_key()),
+                                 lambda: ConnectionTable.from_network(self))
+
+    def property_index(self):
+        """
+        Get an index from the values of `Neuron` properties to the neurons in this
+        network having them.
 
-        self.neuron.set(n)
-        res = list(n.load())
-        self.neuron.unset(n)
+        The index covers the properties in `NeuronPropertyIndex.PROPERTIES` and is built
+        with one bulk query per property the first time it's needed. It's cached for the
+        context of this network.
+
+        Example::
+
+            >>> net = Worm().get_neuron_network()
+            >>> index = net.property_index()
+            >>> 'AVAL' in index.get('receptor', 'GLR-1')
+            True
+            >>> serotonergic = index.get('neurotransmitter', 'Serotonin')
+
+        :returns: The index
+        :rtype: owmeta.network.NeuronPropertyIndex
+        """
+        return NETWORK_CACHE.get(self.context,
+                                 ('property_index', self._cache_key()),
+                                 self._make_property_index)
+
+    def _make_degree_table(self):
+        graph = self.rdf
+        neurons = self._neuron_terms()
+        names = property_value(graph, Cell.name, neurons)
+        pre = connection_counts(graph, 'pre', network=self._cache_key())
+        post = connection_counts(graph, 'post', network=self._cache_key())
+        res = dict()
+        for n in neurons:
+            if n not in names:
+                continue
+            res[str(names[n])] = NeuronDegree(
+                    in_degree=post.get((n, SynapseType.Chemical), 0),
+                    out_degree=pre.get((n, SynapseType.Chemical), 0),
+                    gap_degree=pre.get((n, SynapseType.GapJunction), 0))
         return res
 
+    def _neuron_idents_by_type(self):
+        return NETWORK_CACHE.get(self.context,
+                                 ('neurons_by_type', self._cache_key()),
+                                 self._make_neurons_by_type)
+
+    def _indexed_neuron(self, index, ident, name):
+        neuron = Neuron.contextualize(self.context)
+        if ident is None:
+            return neuron(name=name, conf=self.conf)
+        res = neuron(ident=ident, conf=self.conf, no_type_decl=True)
+        attach_prefetched(res, index.values[ident])
+        return res
+
+    def _make_name_index(self):
+        graph = self.rdf
+        neurons = self._neuron_terms()
+        names = property_value(graph, Cell.name, neurons, to_python=False)
+        synonyms = property_values(graph, Cell.synonym, neurons, to_python=False)
+        by_synonym = dict()
+        for n, terms in synonyms.items():
+            for t in terms:
+                by_synonym.setdefault(str(t), set()).add(n)
+        values = dict()
+        for n in neurons:
+            values[n] = {Cell.name.linkName: (names[n],) if n in names else (),
+                         Cell.synonym.linkName: tuple(synonyms.get(n, ()))}
+        return NeuronNameIndex({str(name): n for n, name in names.items()},
+                               {syn: frozenset(ns) for syn, ns in by_synonym.items()},
+                               values)
+
+    def _make_neurons_by_type(self):
+        types = property_values(self.rdf, Neuron.type, self._neuron_terms())
+        res = dict()
+        for n, values in types.items():
+            for t in values:
+                res.setdefault(str(t), []).append(n)
+        return {t: tuple(sorted(idents)) for t, idents in res.items()}
+
+    def _make_property_index(self):
+        graph = self.rdf
+        neurons = self._neuron_terms()
+        names = property_value(graph, Cell.name, neurons)
+        index = dict()
+        for prop in NeuronPropertyIndex.PROPERTIES:
+            by_value = dict()
+            for n, values in property_values(graph, getattr(Neuron, prop), neurons).items():
+                if n not in names:
+                    continue
+                name = str(names[n])
+                for v in values:
+                    by_value.setdefault(v, set()).add(name)
+            index[prop] = {v: frozenset(ns) for v, ns in by_value.items()}
+        return NeuronPropertyIndex(index)
+
+    def _cache_key(self):
+        return self.identifier if self.defined else None
+
+    def _snapshot(self):
+        path = self.conf.get(CONNECTOME_SNAPSHOT_CONF_KEY, None)
+        if not path:
+            # Objects from a bundle are in a context whose mapper knows the bundle
+            bundle = getattr(getattr(self.context, 'mapper', None), 'bundle', None)
+            if bundle is None:
+                return None
+            path = bundle_snapshot_path(bundle)
+        if not path:
+            return None
+        from .connectome_snapshot import load_snapshot
+        snapshot = load_snapshot(path)
+        if snapshot.network != self._cache_key():
+            return None
+        return snapshot
+
+    def _synapse_terms(self):
+        return objects_of(self.rdf, self._cache_key(), Network.synapse)
+
+    def _neuron_terms(self):
+        return objects_of(self.rdf, self._cache_key(), Network.neuron)
+
+    def _make_adjacency(self, syntype):
+        graph = self.rdf
+        conns = self._synapse_terms()
+        if syntype is not None:
+            syntypes = property_value(graph, Connection.syntype, conns)
+            conns = set(c for c in conns if syntypes.get(c) == syntype)
+        pre = property_value(graph, Connection.pre_cell, conns)
+        post = property_value(graph, Connection.post_cell, conns)
+        numbers = property_value(graph, Connection.number, conns)
+
+        cells = self._neuron_terms()
+        cells.update(pre.values())
+        cells.update(post.values())
+        cell_names = property_value(graph, Cell.name, cells)
+        name_of = {c: str(cell_names.get(c, c)) for c in cells}
+
+        names = sorted(set(name_of.values()))
+        index = {n: i for i, n in enumerate(names)}
+
+        weights = dict()
+        for c in conns:
+            if c not in pre or c not in post:
+                continue
+            number = numbers.get(c)
+            key = (index[name_of[pre[c]]], index[name_of[post[c]]])
+            weights[key] = weights.get(key, 0) + (1 if number is None else int(number))
+
+        indptr = [0] * (len(names) + 1)
+        indices = []
+        data = []
+        for (i, j), w in sorted(weights.items()):
+            indptr[i + 1] += 1
+            indices.append(j)
+            data.append(w)
+        for i in range(len(names)):
+            indptr[i + 1] += indptr[i]
+
+        return Adjacency(names, index, indptr, indices, data)
+
     def identifier_augment(self):
         return self.make_identifier(self.worm.defined_values[0].identifier.n3())
 
     def defined_augment(self):
         return self.worm.has_defined_value()
+
+
+def bundle_snapshot_path(bundle):
+    """
+    Returns the path to the connectome snapshot in a bundle, or `None` if the bundle
+    doesn't have one
+
+    :param bundle: The bundle
+    :type bundle: owmeta_core.bundle.Bundle
+    """
+    path = p(bundle.resolve(), 'files', CONNECTOME_SNAPSHOT_FILE_NAME)
+    return path if exists(path) else None
@@ -4,8 +4,9 @@ from wrapt import ObjectProxy
 from owmeta_core.custom_dataobject_property import CustomProperty
 from owmeta_core.dataobject import DatatypeProperty, Alias
 
+from .bulk_query import PrefetchMixin
 from .cell import Cell
-from .connection import Connection
+from .connection import Connection, SynapseType, count_connections, connection_terms
 
 
 class NeuronProxy(ObjectProxy):
@@ -74,19 +75,19 @@ class Neuron(Cell):
 
     class_context = Cell.class_context
 
-    type = DatatypeProperty(multiple=True)
+    type = DatatypeProperty(multiple=True, mixins=(PrefetchMixin,))
     ''' The neuron type (i.e., sensory, interneuron, motor) '''
 
-    receptor = DatatypeProperty(multiple=True)
+    receptor = DatatypeProperty(multiple=True, mixins=(PrefetchMixin,))
     ''' The receptor types associated with this neuron '''
 
-    innexin = DatatypeProperty(multiple=True)
+    innexin = DatatypeProperty(multiple=True, mixins=(PrefetchMixin,))
     ''' Innexin types associated with this neuron '''
 
-    neurotransmitter = DatatypeProperty(multiple=True)
+    neurotransmitter = DatatypeProperty(multiple=True, mixins=(PrefetchMixin,))
     ''' Neurotransmitters associated with this neuron '''
 
-    neuropeptide = DatatypeProperty(multiple=True)
+    neuropeptide = DatatypeProperty(multiple=True, mixins=(PrefetchMixin,))
     ''' Name of the gene corresponding to the neuropeptide produced by this neuron '''
 
     receptors = Alias(receptor)
@@ -114,26 +115,25 @@ class Neuron(Cell):
     def GJ_degree(self):
         """Get the degree of this neuron for gap junction edges only
 
+        Gap junctions are recorded in both directions, so only those where this neuron is
+        the `~owmeta.connection.Connection.pre_cell` are counted. The count is made with a
+        single aggregate query.
+
         :returns: total number of incoming and outgoing gap junctions
         :rtype: int
         """
-        count = 0
-        for c in self.connection():
-            if c.syntype.one() == 'gapJunction':
-                count += 1
-        return count
+        return count_connections(self.rdf, self.identifier, 'pre', SynapseType.GapJunction)
 
     def Syn_degree(self):
         """Get the degree of this neuron for chemical synapse edges only
 
+        The count is made with aggregate queries for incoming and outgoing synapses.
+
         :returns: total number of incoming and outgoing chemical synapses
         :rtype: int
         """
-        count = 0
-        for c in self.connection.get('either'):
-            if c.syntype.one() == 'send':
-                count += 1
-        return count
+        return (count_connections(self.rdf, self.identifier, 'pre', SynapseType.Chemical) +
+                count_connections(self.rdf, self.identifier, 'post', SynapseType.Chemical))
 
     def get_incidents(self, type=0):
         """ Get neurons which synapse at this neuron """
@@ -255,11 +255,17 @@ class ConnectionProperty(CustomProperty):
            -------
            list of Connection
         """
-        c = self._gather_query_conns(pre_post_or_either, **kwargs)
+        terms = self._either_terms(pre_post_or_either, kwargs)
+        if terms is not None:
+            ct = self._conntype.contextualize(self.context)
+            for t in terms:
+                yield ct(ident=t)
+        else:
+            c = self._gather_query_conns(pre_post_or_either, **kwargs)
 
-        for x in c:
-            for r in x.load():
-                yield r
+            for x in c:
+                for r in x.load():
+                    yield r
 
         for x in self._conns:
             if x.defined and x.context == self.context:
@@ -281,16 +287,36 @@ class ConnectionProperty(CustomProperty):
         -------
         list of Connection
         """
-        c = self._gather_query_conns(pre_post_or_either, **kwargs)
+        terms = self._either_terms(pre_post_or_either, kwargs)
+        if terms is not None:
+            for t in terms:
+                yield t
+        else:
+            c = self._gather_query_conns(pre_post_or_either, **kwargs)
 
-        for x in c:
-            for r in x.load_terms():
-                yield r
+            for x in c:
+                for r in x.load_terms():
+                    yield r
 
         for x in self._conns:
             if x.defined and x.context == self.context:
                 yield x.identifier
 
+    def _either_terms(self, pre_post_or_either, kwargs):
+        '''
+        Get the identifiers of connections where the owner is at either end with one
+        query. Returns `None` if the query can't be made this way, in which case a query
+        for each end should be made
+        '''
+        if pre_post_or_either != 'either' or not self.owner.defined:
+            return None
+        filters = _connection_filters(self._conntype, kwargs)
+        if filters is None:
+            return None
+        ident = self.owner.identifier
+        graph = self.owner.rdf if self.context is None else self.context.rdf_graph()
+        return connection_terms(graph, [ident], 'either', **filters)[ident]
+
     def _gather_query_conns(self, pre_post_or_either, **kwargs):
         c = []
         ct = self._conntype.contextualize(self.context)
@@ -321,8 +347,12 @@ class ConnectionProperty(CustomProperty):
         elif pre_post_or_either == 'post':
             res += conntype(post_cell=self.owner, **kwargs).count()
         elif pre_post_or_either == 'either':
-            res += conntype(pre_cell=self.owner, **kwargs).count() + \
-                    conntype(post_cell=self.owner, **kwargs).count()
+            terms = self._either_terms(pre_post_or_either, kwargs)
+            if terms is not None:
+                res += len(terms)
+            else:
+                res += conntype(pre_cell=self.owner, **kwargs).count() + \
+                        conntype(post_cell=self.owner, **kwargs).count()
 
         return res
 
@@ -345,3 +375,58 @@ class ConnectionProperty(CustomProperty):
         for c in self._conns:
             for x in c.triples(**kwargs):
                 yield x
+
+
+def _connection_filters(conntype, kwargs):
+    '''
+    Converts arguments for a `Connection` query into terms for `connection_terms`. Going
+    through the `Connection` constructor normalizes values like `Connection.syntype`.
+    Returns `None` if any argument doesn't have a single, defined value
+    '''
+    if not kwargs:
+        return dict()
+    q = conntype(**kwargs)
+    res = dict()
+    for name in kwargs:
+        values = getattr(q, name).defined_values
+        if len(values) != 1:
+            return None
+        res[name] = values[0].identifier
+    return res
+
+
+def neuron_connections(neurons, pre_post_or_either='either', **kwargs):
+    '''
+    Get the connections for many neurons with a single query
+
+    Parameters
+    ----------
+    neurons : list of Neuron
+        The neurons. They should all be in the same context and have identifiers
+    pre_post_or_either : str
+        What kind of connection to look for.
+        'pre': Neuron is the source of the connection
+        'post': Neuron is the destination of the connection
+        'either': Neuron is either the source or destination of the connection
+    **kwargs
+        Values for other properties of the connections, like ``syntype='send'``
+
+    Returns
+    -------
+    dict
+        Mapping from neuron identifier to a `list` of `~owmeta.connection.Connection`
+    '''
+    neurons = list(neurons)
+    if not neurons:
+        return dict()
+    first = neurons[0]
+    conntype = Connection.contextualize(first.context)
+    filters = _connection_filters(conntype, kwargs)
+    if filters is None:
+        raise ValueError('Connection properties given for neuron_connections must each'
+                         ' have a single, defined value')
+    terms = connection_terms(first.rdf,
+                             [n.identifier for n in neurons],
+                             pre_post_or_either,
+                             **filters)
+    return {n: [conntype(ident=t) for t in ts] for n, ts in terms.items()}
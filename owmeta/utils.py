@@ -2,21 +2,82 @@
 Common utilities for translation, massaging data, etc., that don't fit
 elsewhere in owmeta
 """
+from functools import lru_cache
 import re
 
-__all__ = ['normalize_cell_name']
+__all__ = ['normalize_cell_name', 'normalize_cell_names', 'canonical_cell_name']
 # to normalize certain neuron and muscle names
 SEARCH_STRING = re.compile(r'\w+0+[1-9]+')
 REPLACE_STRING = re.compile(r'0+')
 SEARCH_STRING_MUSCLE = re.compile(r'\w+BWM\w+')
 REPLACE_STRING_MUSCLE = re.compile(r'BWM')
+# names matching neither search pattern are only upper-cased. Matching both at once is
+# cheaper than trying each in turn
+NORMALIZE_SEARCH_STRING = re.compile(f'{SEARCH_STRING.pattern}|{SEARCH_STRING_MUSCLE.pattern}')
+
+NORMALIZE_CACHE_SIZE = 8192
+''' Maximum number of names whose normalized forms are remembered '''
+
+# muscle cells that have different names in connectome sources and the cell list.
+# The wormbase cell list names are the ones used in owmeta
+MUSCLE_ALIASES = {
+    'ANAL': 'MU_ANAL',
+    'INTR': 'MU_INT_R',
+    'INTL': 'MU_INT_L',
+    'SPH': 'MU_SPH'
+}
+
+# other names used in our sources for cells that have a different name in owmeta
+# XXX: These renaming choices are arbitrary; may be inappropriate
+CELL_NAME_ALIASES = dict(MUSCLE_ALIASES, **{
+    'DB1/3': 'DB1',
+    'DB3/1': 'DB3',
+})
+
+# names used in our sources for either of a left/right pair of cells. Which cell is
+# meant is given by the first letter of its lineage name
+LINEAGE_CELL_NAME_ALIASES = {
+    'AVFL/R': {'W': 'AVFL', 'P': 'AVFR'},
+}
 
 
 def normalize_cell_name(name):
-    # normalize neuron and muscle names to match those used at other points
-    # see #137 for elaboration
-    # if there are zeroes in the middle of a name, remove them
-    if re.match(SEARCH_STRING, name):
+    """
+    Returns a neuron or muscle name normalized to match those used at other points
+
+    If there are zeroes in the middle of a name, they're removed, and so is 'BWM' in
+    body wall muscle names. See #137 for elaboration. Results are memoized, up to
+    `NORMALIZE_CACHE_SIZE` names.
+    """
+    return _normalize_cell_name(name)
+
+
+def normalize_cell_names(names):
+    """
+    Normalizes a batch of names with the same rules as `normalize_cell_name`
+
+    Cell name vocabularies are small while the edge lists naming them are large, so
+    each distinct name is normally only normalized once.
+
+    Parameters
+    ----------
+    names : iterable of str
+        The names
+
+    Returns
+    -------
+    list of str
+        The normalized names, in the same order
+    """
+    normalize = _normalize_cell_name
+    return [normalize(name) for name in names]
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_cell_name(name):
+    if NORMALIZE_SEARCH_STRING.match(name) is None:
+        return name.upper()
+    if SEARCH_STRING.match(name):
         name = REPLACE_STRING.sub('', name)
     name = normalize_muscle(name)
     name = name.upper()
@@ -26,6 +87,19 @@ def normalize_cell_name(name):
 def normalize_muscle(name):
     # normalize names of Body Wall Muscles
     # if there is 'BWM' in the name, remove it
-    if re.match(SEARCH_STRING_MUSCLE, name):
+    if SEARCH_STRING_MUSCLE.match(name):
         name = REPLACE_STRING_MUSCLE.sub('', name)
     return name
+
+
+def canonical_cell_name(name, lineage_name=None):
+    """
+    Returns the name used in owmeta for a cell name from one of our sources: the name
+    normalized with `normalize_cell_name`, replaced according to `CELL_NAME_ALIASES`, or
+    according to `LINEAGE_CELL_NAME_ALIASES` if the cell's lineage name is given
+    """
+    name = normalize_cell_name(name)
+    by_lineage = LINEAGE_CELL_NAME_ALIASES.get(name)
+    if by_lineage is not None:
+        return by_lineage.get(lineage_name[:1], name) if lineage_name else name
+    return CELL_NAME_ALIASES.get(name, name)
@@ -1,7 +1,22 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import argparse
+import ast
+import hashlib
+import importlib.util
+import json
+import os
+from os.path import join as p
+import shutil
+import tempfile
 import types
 
+from owmeta_core.capability import NoProviderGiven
 from owmeta_core.command import OWM
+from owmeta_core.data_trans.local_file_ds import LocalFileDataSource
+from owmeta_core.datasource import DataSource
+from rdflib import Dataset
+import owmeta
 from owmeta.data_trans.wormatlas import (WormAtlasCellListDataTranslator,
                                          WormAtlasCellListDataSource)
 from owmeta.data_trans.wormbase import (WormBaseCSVDataSource,
@@ -16,6 +31,106 @@ from owmeta.data_trans.connections import (NeuronConnectomeCSVTranslator,
                                            NeuronConnectomeSynapseClassTranslator)
 from owmeta.data_trans.context_merge import ContextMergeDataTranslator
 from owmeta.data_trans.data_with_evidence_ds import DataWithEvidenceDataSource as DWEDS
+from owmeta.http_cache import SQLiteHTTPCache, set_default_cache
+from owmeta.network import Network
+
+
+MANIFEST_FILE_NAME = 'save_data_hashes.json'
+'''
+Name of the file, in the project directory, where the input hash of each translation is
+recorded
+'''
+
+
+def update_file_tree_hash(h, directory):
+    '''
+    Update a hash with the names and contents of the files under a directory
+    '''
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for fname in sorted(files):
+            fpath = p(root, fname)
+            h.update(os.path.relpath(fpath, directory).encode('utf-8'))
+            with open(fpath, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    h.update(chunk)
+
+
+def update_translator_hash(h, translator):
+    '''
+    Update a hash with the identity of a translator: its class, its identifier, the owmeta
+    version, and the source of the module defining it along with the owmeta modules that
+    module imports, directly or indirectly
+    '''
+    cls = type(translator)
+    h.update(f'{cls.__module__}.{cls.__qualname__} {translator.identifier}'.encode('utf-8'))
+    h.update(f'owmeta {owmeta.__version__}'.encode('utf-8'))
+    modules = {cls.__module__}
+    if cls.__module__.split('.')[0] == 'owmeta':
+        modules = owmeta_module_dependencies(cls.__module__)
+    for name in sorted(modules):
+        source_file = _module_source_file(name)
+        if source_file is not None:
+            h.update(name.encode('utf-8'))
+            h.update(_read_source(source_file))
+
+
+def owmeta_module_dependencies(module_name):
+    '''
+    Returns the names of the modules in the owmeta package imported by a module, directly
+    or through other owmeta modules, including the module itself and the packages
+    containing them
+
+    Imports inside of functions are included, since translators often import helpers
+    where they're used
+    '''
+    res = set()
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        if name in res:
+            continue
+        res.add(name)
+        parts = name.split('.')
+        pending.extend('.'.join(parts[:i]) for i in range(1, len(parts)))
+        source_file = _module_source_file(name)
+        if source_file is None:
+            continue
+        is_package = os.path.basename(source_file) == '__init__.py'
+        tree = ast.parse(_read_source(source_file), source_file)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(a.name for a in node.names if a.name.split('.')[0] == 'owmeta')
+            elif isinstance(node, ast.ImportFrom):
+                if node.level:
+                    base = parts if is_package else parts[:-1]
+                    base = base[:len(base) - (node.level - 1)]
+                    target = '.'.join(base + ([node.module] if node.module else []))
+                else:
+                    target = node.module
+                if target.split('.')[0] != 'owmeta':
+                    continue
+                pending.append(target)
+                # `from package import module`
+                for a in node.names:
+                    if _module_source_file(f'{target}.{a.name}') is not None:
+                        pending.append(f'{target}.{a.name}')
+    return res
+
+
+def _module_source_file(name):
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not spec.origin.endswith('.py'):
+        return None
+    return spec.origin
+
+
+def _read_source(path):
+    with open(path, 'rb') as f:
+        return f.read()
 
 
 # metaclass stuff to keep track of the order of data sources in DSMethods.
@@ -44,93 +159,179 @@ class OrderedClass(type):
 
 class DSMethods(metaclass=OrderedClass):
     # Note: Keep the ordering of
-    def __init__(self):
-        self.owm = OWM()
+
+    dependencies = {
+        'wormatlas_cells': ('neurons',),
+        'connectome': ('neurons', 'wormbase_cells'),
+        'synclass': ('connectome',),
+        'openworm_data': ('neurons', 'wormbase_cells', 'ion_channels', 'bently_expression',
+                          'muscle_ion_channels', 'neuron_ion_channels', 'connectome',
+                          'synclass', 'wormatlas_cells'),
+    }
+    '''
+    Translations whose inputs are outputs of other translations. Those not listed only read
+    the source files
+    '''
+
+    def __init__(self, owmdir=None, force=False):
+        self.owm = OWM(owmdir=owmdir)
         self.ctx = self.owm.default_context.stored
+        self.force = force
+        self.built = dict()
+        '''
+        Input hashes of the translations run, or skipped, by this object
+        '''
+        self.skipped = set()
+        '''
+        Names of the translations skipped because their inputs were unchanged
+        '''
+
+    def _manifest_path(self):
+        return p(self.owm.owmdir, MANIFEST_FILE_NAME)
+
+    def _read_manifest(self):
+        '''
+        Returns the input hashes recorded for translations done previously
+        '''
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict()
+
+    def _record(self, name, digest):
+        '''
+        Record the input hash for a translation
+        '''
+        manifest = self._read_manifest()
+        manifest[name] = digest
+        with open(self._manifest_path(), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    def _input_hash(self, name, translator, data_sources=(), named_data_sources=None):
+        '''
+        Compute a hash of everything a translation reads: the translator, the files and
+        descriptions of the data sources, and, for data sources output by other
+        translations, the input hashes of those translations
+        '''
+        h = hashlib.sha256()
+        update_translator_hash(h, translator)
+        manifest = self._read_manifest()
+        for dep in self.dependencies.get(name, ()):
+            h.update(f'{dep} {self.built.get(dep) or manifest.get(dep, "")}'.encode('utf-8'))
+
+        sources = [(None, ds) for ds in data_sources]
+        if named_data_sources:
+            sources += sorted(named_data_sources.items())
+        with self.owm.connect():
+            for key, ds in sources:
+                h.update(f'{key} {ds.identifier}'.encode('utf-8'))
+                if isinstance(ds, DWEDS):
+                    # Covered by the dependencies above
+                    continue
+                src = self.owm.default_context.stored(DataSource)(ident=ds.identifier).load_one()
+                if src is None:
+                    continue
+                h.update(src.format_str(stored=True).encode('utf-8'))
+                if isinstance(src, LocalFileDataSource):
+                    try:
+                        update_file_tree_hash(h, src.basedir())
+                    except NoProviderGiven:
+                        pass
+        return h.hexdigest()
+
+    def _translate(self, name, translator, data_sources=(), named_data_sources=None,
+            description=None, **kwargs):
+        digest = self._input_hash(name, translator, data_sources, named_data_sources)
+        self.built[name] = digest
+        if not self.force and self._read_manifest().get(name) == digest:
+            print(f"Inputs for {name} are unchanged. Skipping")
+            self.skipped.add(name)
+            return None
+        output = self.owm.translate(translator,
+                data_sources=data_sources,
+                named_data_sources=named_data_sources,
+                **kwargs)
+        if description is not None:
+            self.ctx(output).description(description)
+        self._record(name, digest)
+        return output
 
     def neurons(self):
-        neurons = self.owm.translate(NeuronCSVDataTranslator(),
+        self._translate('neurons', NeuronCSVDataTranslator(),
                 data_sources=[NeuronCSVDataSource(key='neurons')],
-                output_key='neurons')
-        self.ctx(neurons).description(
-                "Contains descriptions of C. elegans neurons and is the"
+                output_key='neurons',
+                description="Contains descriptions of C. elegans neurons and is the"
                 " principle such list for OpenWorm")
 
     def wormatlas_cells(self):
-        cells = self.owm.translate(
+        self._translate('wormatlas_cells',
                 WormAtlasCellListDataTranslator(),
                 data_sources=[
                     WormAtlasCellListDataSource(key='cells'),
                     DWEDS(key='neurons')],
-                output_key='cells')
-        self.ctx(cells).description(
-                "Lineage names and descriptions of C. elegans cells from Worm Atlas")
+                output_key='cells',
+                description="Lineage names and descriptions of C. elegans cells from Worm Atlas")
 
     def ion_channels(self):
-        ion_channels = self.owm.translate(
+        self._translate('ion_channels',
                 WormbaseIonChannelCSVTranslator(),
                 data_sources=[WormbaseIonChannelCSVDataSource(key='ion_channels')],
-                output_key='ion_channels')
-        self.ctx(ion_channels).description(
-                "Contains Channels and ExpressionPatterns")
+                output_key='ion_channels',
+                description="Contains Channels and ExpressionPatterns")
 
     def wormbase_cells(self):
-        wb_cells = self.owm.translate(
+        self._translate('wormbase_cells',
                 CellWormBaseCSVTranslator(),
                 data_sources=[WormBaseCSVDataSource(key='wormbase_celegans_cells')],
-                output_key='wormbase_cells')
-        self.ctx(wb_cells).description(
-                'Contains muscles, neurons, and other cells. Neuron data is partially'
-                ' redundant to the Worm Atlas data source')
+                output_key='wormbase_cells',
+                description='Contains muscles, neurons, and other cells. Neuron data is'
+                ' partially redundant to the Worm Atlas data source')
 
     def bently_expression(self):
-        bently_expression = self.owm.translate(
+        self._translate('bently_expression',
                 NeuronCSVDataTranslator(),
                 data_sources=[NeuronCSVDataSource(key='bently_expression')],
-                output_key='bently_expression')
-        self.ctx(bently_expression).description(
-                'Adds receptor, neurotransmitter, and neuropeptide relationships for Neurons')
+                output_key='bently_expression',
+                description='Adds receptor, neurotransmitter, and neuropeptide relationships'
+                ' for Neurons')
 
     def muscle_ion_channels(self):
-        muscle_ion_channels = self.owm.translate(
+        self._translate('muscle_ion_channels',
                 WormbaseTextMatchCSVTranslator(),
                 data_sources=[WormbaseTextMatchCSVDataSource(key='muscle_ion_channels')],
-                output_key='muscle_ion_channels')
-        self.ctx(muscle_ion_channels).description(
-                'Adds relationships between muscles and ion channels')
+                output_key='muscle_ion_channels',
+                description='Adds relationships between muscles and ion channels')
 
     def neuron_ion_channels(self):
-        neuron_ion_channels = self.owm.translate(
+        self._translate('neuron_ion_channels',
                 WormbaseTextMatchCSVTranslator(),
                 data_sources=[WormbaseTextMatchCSVDataSource(key='neuron_ion_channels')],
-                output_key='neuron_ion_channels')
-        self.ctx(neuron_ion_channels).description(
-                'Adds relationships between neurons and ion channels')
+                output_key='neuron_ion_channels',
+                description='Adds relationships between neurons and ion channels')
 
     def connectome(self):
-        emmons_connectome = self.owm.translate(
-                NeuronConnectomeCSVTranslator(),
+        self._translate('connectome',
+                NeuronConnectomeCSVTranslator(bulk=True),
                 data_sources=[ConnectomeCSVDataSource(key='emmons')],
                 named_data_sources=dict(
                     muscles_source=DWEDS(key='wormbase_cells'),
                     neurons_source=DWEDS(key='neurons')),
-                output_key='connectome')
-        self.ctx(emmons_connectome).description(
-                'C. elegans connectome')
+                output_key='connectome',
+                description='C. elegans connectome')
 
     def synclass(self):
-        connectome_synclass = self.owm.translate(
+        self._translate('synclass',
                 NeuronConnectomeSynapseClassTranslator(),
                 data_sources=[DWEDS(key='connectome')],
                 named_data_sources=dict(
                     neurotransmitter_source=ConnectomeCSVDataSource(key='connectome')),
-                output_key='synclass')
-        self.ctx(connectome_synclass).description(
-                'Adds inferred relationships between connections and neurotransmitters that'
-                ' mediates communication')
+                output_key='synclass',
+                description='Adds inferred relationships between connections and'
+                ' neurotransmitters that mediates communication')
 
     def openworm_data(self):
-        combined_data_source = self.owm.translate(
+        self._translate('openworm_data',
                 ContextMergeDataTranslator(),
                 data_sources=[
                     DWEDS(key='neurons'),
@@ -145,26 +346,227 @@ class DSMethods(metaclass=OrderedClass):
                     ],
                 output_identifier='http://openworm.org/data')
 
-    def methods(self):
+    def _methods(self):
+        '''
+        Names of the translations, in the order they're defined. Other methods start with
+        an underscore
+        '''
         return list(x for x in self.member_names
-                if x not in ('save', 'methods') and
-                not x.startswith('_') and
+                if not x.startswith('_') and
                 isinstance(getattr(self, x), types.MethodType))
 
-    def save(self):
+    def _schedule(self, selected):
+        '''
+        Group the selected translations into stages. The translations in a stage only
+        depend on those in earlier stages or on translations which aren't selected, and
+        which are assumed to be built already.
+        '''
+        remaining = [x for x in self._methods() if x in selected]
+        done = set()
+        stages = []
+        while remaining:
+            stage = [x for x in remaining
+                     if all(d in done or d not in remaining
+                            for d in self.dependencies.get(x, ()))]
+            if not stage:
+                raise Exception(f'Circular dependency among {remaining}')
+            stages.append(stage)
+            done.update(stage)
+            remaining = [x for x in remaining if x not in done]
+        return stages
+
+    def _save(self):
         self.ctx.save()
 
 
+def _context_digests(graph):
+    '''
+    Returns, for each context in `graph`, a value which changes when its statements do,
+    even if the number of statements stays the same
+    '''
+    sizes = defaultdict(int)
+    sums = defaultdict(int)
+    for s, p_, o, c in graph.quads((None, None, None, None)):
+        c = getattr(c, 'identifier', c)
+        sizes[c] += 1
+        # A sum, so the digest doesn't depend on the order the statements come in
+        sums[c] = (sums[c] + hash((s, p_, o))) & 0xFFFFFFFFFFFFFFFF
+    return {c: (sizes[c], sums[c]) for c in sizes}
+
+
+def _context_triples(graph, contexts):
+    return {c: set(graph.get_context(c).triples((None, None, None))) for c in contexts}
+
+
+def _write_nquads(triples_by_context, prefix):
+    out = Dataset()
+    for c, triples in triples_by_context.items():
+        g = out.graph(c)
+        out.addN((s, p_, o, g) for s, p_, o in triples)
+    fd, res = tempfile.mkstemp(prefix=prefix, suffix='.nq')
+    os.close(fd)
+    out.serialize(res, format='nquads')
+    return res
+
+
+def build_isolated(owmdir, src, force=False, http_cache=None):
+    '''
+    Run one translation against a copy of the project store and write the statements it
+    added and those it removed to N-Quads files
+
+    Returns
+    -------
+    tuple
+        Paths to the N-Quads files with the added and removed statements, which are
+        `None` if the translation was skipped, and the input hash of the translation
+    '''
+    set_default_cache(http_cache)
+    workdir = tempfile.mkdtemp(prefix=f'save_data-{src}.')
+    try:
+        work_owmdir = p(workdir, 'owm')
+        shutil.copytree(owmdir, work_owmdir)
+        # Another copy for reading the statements in changed contexts from as they were
+        # before the translation
+        before_owmdir = p(workdir, 'before')
+        shutil.copytree(owmdir, before_owmdir)
+        m = DSMethods(owmdir=work_owmdir, force=force)
+        with m.owm.connect() as conn:
+            before = _context_digests(conn.rdf)
+            print(f"Building {src}...")
+            getattr(m, src)()
+            if src in m.skipped:
+                return None, None, m.built[src]
+            after = _context_digests(conn.rdf)
+            changed = [c for c in set(before) | set(after) if before.get(c) != after.get(c)]
+            new = _context_triples(conn.rdf, changed)
+        with OWM(owmdir=before_owmdir).connect() as conn:
+            old = _context_triples(conn.rdf, changed)
+        added = _write_nquads({c: new[c] - old[c] for c in changed},
+                              f'save_data-{src}-added.')
+        removed = _write_nquads({c: old[c] - new[c] for c in changed},
+                                f'save_data-{src}-removed.')
+        return added, removed, m.built[src]
+    finally:
+        shutil.rmtree(workdir)
+
+
+def merge(m, added_file, removed_file):
+    '''
+    Apply the changes written by `build_isolated` to the project store
+
+    Only the statements the translation added or removed are changed, so changes to the
+    same context from translations built at the same time are all kept
+    '''
+    removed = Dataset()
+    removed.parse(removed_file, format='nquads')
+    with m.owm.connect() as conn, conn.transaction_manager:
+        for s, p_, o, c in removed.quads((None, None, None, None)):
+            conn.rdf.get_context(getattr(c, 'identifier', c)).remove((s, p_, o))
+        conn.rdf.parse(added_file, format='nquads')
+
+
+def build_parallel(m, selected, jobs, force, http_cache):
+    '''
+    Run the selected translations with `build_isolated` in separate processes, stage by
+    stage, and merge the results into the project store
+    '''
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for stage in m._schedule(selected):
+            futures = [executor.submit(build_isolated, m.owm.owmdir, src, force,
+                                       http_cache)
+                       for src in stage]
+            for src, fut in zip(stage, futures):
+                added_file, removed_file, digest = fut.result()
+                if added_file is None:
+                    print(f"Inputs for {src} are unchanged. Skipped")
+                    continue
+                try:
+                    print(f"Merging {src}...")
+                    merge(m, added_file, removed_file)
+                finally:
+                    os.unlink(added_file)
+                    os.unlink(removed_file)
+                m._record(src, digest)
+
+
+def write_connectome_snapshot(m, path=None):
+    '''
+    Write a `~owmeta.connectome_snapshot.ConnectomeSnapshot` of the network in the
+    project's default context
+
+    The snapshot is versioned by a hash of the input hashes of all of the translations,
+    so it changes whenever the data it was made from might have.
+
+    Parameters
+    ----------
+    m : DSMethods
+        Gives the project to take the snapshot from
+    path : str, optional
+        Where to write the snapshot. Defaults to
+        `~owmeta.connectome_snapshot.SNAPSHOT_FILE_NAME` in the project directory, which
+        is where ``owmeta-data-bundle.yml`` includes it from
+
+    Returns
+    -------
+    str
+        The path written to
+    '''
+    from owmeta.connectome_snapshot import ConnectomeSnapshot, SNAPSHOT_FILE_NAME
+    if path is None:
+        path = p(m.owm.basedir, SNAPSHOT_FILE_NAME)
+    h = hashlib.sha256()
+    for name, digest in sorted(m._read_manifest().items()):
+        h.update(f'{name} {digest}'.encode('utf-8'))
+    with m.owm.connect():
+        networks = list(m.owm.default_context.stored(Network).query().load())
+        if len(networks) != 1:
+            raise Exception(f'Expected one Network in the default context, but found'
+                            f' {len(networks)}')
+        snapshot = ConnectomeSnapshot.from_network(networks[0], data_version=h.hexdigest())
+    snapshot.save(path)
+    return path
+
+
 def main():
     parser = argparse.ArgumentParser()
     m = DSMethods()
-    parser.add_argument('source', nargs='*', choices=m.methods() + ['all'])
+    parser.add_argument('source', nargs='*', choices=m._methods() + ['all'])
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+            help='Number of translations to run at the same time. Translations that do not'
+                 ' depend on each other are run in separate processes, each against its own'
+                 ' copy of the project store, and the results are merged afterward')
+
+    parser.add_argument('--force', '-f', action='store_true',
+            help='Run translations even if their inputs have not changed since they were'
+                 ' last run')
+    parser.add_argument('--http-cache', metavar='PATH',
+            help='SQLite database in which to cache responses from WormBase, Pubmed, and'
+                 ' Crossref')
+    parser.add_argument('--offline', action='store_true',
+            help='Only use responses in the HTTP cache rather than making requests')
+    parser.add_argument('--connectome-snapshot', action='store_true',
+            help='After translating, write a snapshot of the connectome to include in the'
+                 ' data bundle. Requires NumPy')
 
     ns = parser.parse_args()
-    for src in m.methods():
-        if 'all' in ns.source or src in ns.source:
+    m.force = ns.force
+    http_cache = None
+    if ns.http_cache:
+        http_cache = SQLiteHTTPCache(ns.http_cache, offline=ns.offline)
+    elif ns.offline:
+        parser.error('--offline requires --http-cache')
+    set_default_cache(http_cache)
+    selected = [src for src in m._methods() if 'all' in ns.source or src in ns.source]
+    if ns.jobs <= 1:
+        for src in selected:
             print(f"Building {src}...")
             getattr(m, src)()
+    else:
+        build_parallel(m, selected, ns.jobs, ns.force, http_cache)
+
+    if ns.connectome_snapshot:
+        print("Writing connectome snapshot...")
+        print(f"Wrote {write_connectome_snapshot(m)}")
 
 
 if __name__ == '__main__':
@@ -33,15 +33,21 @@ setup(
     name='owmeta',
     zip_safe=False,
     install_requires=[
-        'owmeta-core>=0.14.0.dev0',
+        # owmeta.context_cache relies on Context._change_counter, which isn't public.
+        # Check ContextCacheTest before allowing a new minor version
+        'owmeta-core>=0.14.0.dev0,<0.15',
         'bibtexparser~=1.1.0',
         'libneuroml',
         'rdflib>=4.1.2',
         'six~=1.10',
         'requests',
     ],
+    extras_require={
+        'analysis': ['numpy'],
+    },
     version=version,
     packages=['owmeta',
+              'owmeta.analysis',
               'owmeta.data_trans',
               'owmeta.commands'],
     author='OpenWorm.org authors and contributors',
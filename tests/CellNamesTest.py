@@ -0,0 +1,192 @@
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import owmeta_core
+from owmeta_core.context import Context
+from owmeta_core.data import Data, TRANSACTION_MANAGER_KEY
+from rdflib.term import URIRef
+
+from owmeta.cell import Cell
+from owmeta.commands.biology import CellCmd
+from owmeta.cell_names import CellNameIndex, cell_name_index
+from owmeta.muscle import Muscle
+from owmeta.neuron import Neuron
+from owmeta.utils import canonical_cell_name
+
+from .DataTestTemplate import _DataTest
+
+
+class CanonicalCellNameTest(unittest.TestCase):
+    def test_zeros(self):
+        self.assertEqual('VD1', canonical_cell_name('VD01'))
+
+    def test_muscle_alias(self):
+        self.assertEqual('MU_ANAL', canonical_cell_name('ANAL'))
+
+    def test_ambiguous_name_alias(self):
+        self.assertEqual('DB1', canonical_cell_name('DB1/3'))
+
+    def test_lineage_alias(self):
+        self.assertEqual('AVFL', canonical_cell_name('AVFL/R', 'W.aapa'))
+        self.assertEqual('AVFR', canonical_cell_name('AVFL/R', 'P1.aaaa'))
+
+    def test_lineage_alias_without_lineage(self):
+        self.assertEqual('AVFL/R', canonical_cell_name('AVFL/R'))
+
+    def test_unchanged(self):
+        self.assertEqual('AVAL', canonical_cell_name('AVAL'))
+
+
+class CellNameIndexTest(_DataTest):
+    ctx_classes = (Cell, Neuron, Muscle)
+
+    def setUp(self):
+        super(CellNameIndexTest, self).setUp()
+        self.aval = self.ctx.Neuron(name='AVAL')
+        self.aval.synonym('AVA left')
+        self.vd1 = self.ctx.Neuron(name='VD1')
+        self.anal = self.ctx.Muscle(name='MU_ANAL')
+        self.db1 = self.ctx.Neuron(name='DB1')
+        self.db1.synonym('SHARED')
+        self.db3 = self.ctx.Neuron(name='DB3')
+        self.db3.synonym('SHARED')
+        self.save()
+        self.index = cell_name_index(self.context.stored)
+
+    def test_name(self):
+        self.assertEqual(self.aval.identifier, self.index.identifier('AVAL'))
+
+    def test_normalized_name(self):
+        self.assertEqual(self.vd1.identifier, self.index.identifier('VD01'))
+
+    def test_alias(self):
+        self.assertEqual(self.anal.identifier, self.index.identifier('ANAL'))
+        self.assertEqual(self.db1.identifier, self.index.identifier('DB1/3'))
+
+    def test_synonym(self):
+        self.assertEqual(self.aval.identifier, self.index.identifier('AVA left'))
+
+    def test_ambiguous(self):
+        self.assertIsNone(self.index.identifier('SHARED'))
+        self.assertEqual({self.db1.identifier, self.db3.identifier},
+                         self.index.candidates('SHARED'))
+
+    def test_unknown(self):
+        self.assertIsNone(self.index.identifier('NOTACELL'))
+
+    def test_resolve(self):
+        self.assertEqual({'VD01': self.vd1.identifier, 'ANAL': self.anal.identifier},
+                         self.index.resolve(['VD01', 'ANAL', 'NOTACELL', 'SHARED']))
+
+    def test_cached(self):
+        self.assertIs(self.index, cell_name_index(self.context.stored))
+
+    def test_invalidated_on_change(self):
+        self.ctx.Neuron(name='AVAR')
+        self.save()
+        self.assertIsNotNone(cell_name_index(self.context.stored).identifier('AVAR'))
+
+
+class CellNameIndexPersistenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix=__name__ + '.')
+        self.cache_dir = os.path.join(self.tempdir, 'cache')
+        self.connect()
+        self.ctx(Neuron)(name='AVAL')
+        self.save()
+
+    def tearDown(self):
+        self.connection.disconnect()
+        shutil.rmtree(self.tempdir)
+
+    def connect(self):
+        self.conf = Data({'rdf.source': 'ZODB',
+                          'rdf.store_conf': os.path.join(self.tempdir, 'worm.db')})
+        self.connection = owmeta_core.connect(conf=self.conf)
+        self.ctx = self.connection(Context)(ident='http://example.org/test-context')
+
+    def reconnect(self):
+        self.connection.disconnect()
+        self.connect()
+
+    def save(self):
+        with self.conf[TRANSACTION_MANAGER_KEY]:
+            self.ctx.save_context()
+
+    def test_saved(self):
+        cell_name_index(self.ctx.stored, cache_dir=self.cache_dir)
+        files = os.listdir(self.cache_dir)
+        self.assertEqual(1, len(files))
+        index, _ = CellNameIndex.load(os.path.join(self.cache_dir, files[0]))
+        self.assertIsNotNone(index.identifier('AVAL'))
+
+    def test_reused_between_connections(self):
+        cell_name_index(self.ctx.stored, cache_dir=self.cache_dir)
+        self.reconnect()
+        with patch.object(CellNameIndex, 'from_graph') as from_graph:
+            index = cell_name_index(self.ctx.stored, cache_dir=self.cache_dir)
+        from_graph.assert_not_called()
+        self.assertIsNotNone(index.identifier('AVAL'))
+
+    def test_rebuilt_after_commit(self):
+        cell_name_index(self.ctx.stored, cache_dir=self.cache_dir)
+        self.reconnect()
+        self.ctx(Neuron)(name='AVAR')
+        self.save()
+        self.reconnect()
+        index = cell_name_index(self.ctx.stored, cache_dir=self.cache_dir)
+        self.assertIsNotNone(index.identifier('AVAR'))
+
+    def test_save_load(self):
+        index = cell_name_index(self.ctx.stored)
+        fname = os.path.join(self.tempdir, 'index.pickle')
+        index.save(fname, 'fp')
+        loaded, fingerprint = CellNameIndex.load(fname)
+        self.assertEqual('fp', fingerprint)
+        self.assertEqual(index.resolve(['AVAL']), loaded.resolve(['AVAL']))
+
+
+class CellCmdShowTest(_DataTest):
+    ctx_classes = (Cell,)
+
+    def setUp(self):
+        super(CellCmdShowTest, self).setUp()
+        self.aval = self.ctx.Cell(name='AVAL')
+        self.aval.synonym('AVA left')
+        self.save()
+        self.parent = Mock(name='parent')
+        self.parent._default_ctx = self.context
+        self.parent._den3.side_effect = URIRef
+        self.parent.owmdir = '/owm'
+        self.cut = CellCmd(self.parent)
+
+    def test_show_by_synonym(self):
+        cells = list(self.cut.show('AVA left'))
+        self.assertEqual([self.aval.identifier], [c.identifier for c in cells])
+
+    def test_show_by_uri(self):
+        cells = list(self.cut.show(str(self.aval.identifier)))
+        self.assertEqual([self.aval.identifier], [c.identifier for c in cells])
+
+    def test_show_ambiguous(self):
+        avar = self.ctx.Cell(name='AVAR')
+        avar.synonym('AVA')
+        self.aval.synonym('AVA')
+        self.save()
+        cells = list(self.cut.show('AVA'))
+        self.assertEqual([], cells)
+        self.parent.message.assert_any_call('AVA is ambiguous. It could name any of:')
+        for ident in (self.aval.identifier, avar.identifier):
+            self.parent.message.assert_any_call('   ', ident)
+
+    def test_show_uses_project_cache(self):
+        with patch('owmeta.commands.biology.cell_name_index',
+                   wraps=cell_name_index) as index:
+            list(self.cut.show('AVAL'))
+        index.assert_called_with(self.context.stored,
+                                 cache_dir=os.path.join('/owm', 'cache', 'cell_names'))
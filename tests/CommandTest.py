@@ -1,6 +1,7 @@
 from __future__ import print_function
+import os
 import unittest
-from unittest.mock import Mock, ANY
+from unittest.mock import Mock, ANY, patch
 from rdflib.term import URIRef
 from owmeta_core.command import GenericUserError
 from owmeta_core.context_dataobject import ContextDataObject
@@ -115,3 +116,60 @@ class OWMEvidenceGetContextTest(unittest.TestCase):
 
         # then
         self.parent.message.assert_not_called()
+
+
+class OWMEvidenceCoverageTest(unittest.TestCase):
+    def setUp(self):
+        self.parent = Mock(name='parent')
+        self.cut = OWMEvidence(self.parent)
+
+    def test_summary(self):
+        from owmeta.evidence import TypeCoverage
+        from owmeta.neuron import Neuron
+        with patch('owmeta.evidence.EvidenceCoverage') as cov:
+            cov().contexts.return_value = []
+            cov().summary.return_value = [TypeCoverage(Neuron, 1, 4)]
+            res = self.cut.coverage()
+            self.assertEqual(list(res), [TypeCoverage(Neuron, 1, 4)])
+            self.assertEqual(res.text_format(TypeCoverage(Neuron, 1, 4)),
+                             'Neuron: 1/4 (25.0%)')
+
+    def test_contexts_messaged(self):
+        from owmeta.evidence import ContextCoverage
+        from owmeta.neuron import Neuron
+        with patch('owmeta.evidence.EvidenceCoverage') as cov:
+            cov().contexts.return_value = [
+                ContextCoverage(URIRef('http://example.org/ctx'), True, {Neuron: 3})]
+            cov().summary.return_value = []
+            self.cut.coverage(contexts=True)
+        self.parent.message.assert_called_with('+', URIRef('http://example.org/ctx'),
+                                               'Neuron: 3')
+
+
+class OWMEvidenceSupportedByTest(unittest.TestCase):
+    def setUp(self):
+        self.parent = Mock(name='parent')
+        self.parent._den3.side_effect = lambda x: URIRef(x)
+        self.parent.owmdir = '/owm'
+        self.cut = OWMEvidence(self.parent)
+
+    def test_contexts_paged(self):
+        ctxs = [(URIRef(f'http://example.org/ctx{i}'), i) for i in range(5)]
+        with patch('owmeta.evidence.evidence_index_for_reference') as index:
+            index().contexts_supported_by.return_value = ctxs
+            res = self.cut.supported_by('http://example.org/doc', offset=1, limit=2)
+            index().contexts_supported_by.assert_called_with(
+                    URIRef('http://example.org/doc'))
+        self.assertEqual(list(res), ctxs[1:3])
+
+    def test_statements(self):
+        with patch('owmeta.evidence.evidence_index_for_reference') as index:
+            self.cut.supported_by('http://example.org/doc', statements=True, limit='10')
+            index().statements_supported_by.assert_called_with(
+                    ANY, URIRef('http://example.org/doc'), 0, 10)
+
+    def test_index_cached_in_owmdir(self):
+        with patch('owmeta.evidence.evidence_index_for_reference') as index:
+            self.cut.supported_by('http://example.org/doc')
+            index.assert_called_with(ANY, URIRef('http://example.org/doc'),
+                                     cache_dir=os.path.join('/owm', 'cache', 'evidence'))
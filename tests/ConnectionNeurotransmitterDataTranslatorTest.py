@@ -7,7 +7,8 @@ from os.path import join as p
 
 from owmeta.data_trans.data_with_evidence_ds import DataWithEvidenceDataSource
 from owmeta.data_trans.connections import (NeuronConnectomeSynapseClassTranslator,
-                                           ConnectomeCSVDataSource)
+                                           ConnectomeCSVDataSource,
+                                           ConnectionIndex)
 from owmeta.neuron import Neuron
 from owmeta.connection import Connection
 from owmeta_core.context import IMPORTS_CONTEXT_KEY
@@ -81,3 +82,33 @@ class ExactNumberMatchTest(_Base):
         res = self.cut(self.conn_ds, self.nt_ds)
         conn = res.data_context.stored(Connection).query()
         self.assertEqual(list(conn.load())[0].synclass(), 'neurotransmitter')
+
+
+class ConnectionIndexTest(_DataTest):
+    ctx_classes = (Neuron, Connection)
+
+    def setUp(self):
+        super(ConnectionIndexTest, self).setUp()
+        self.c0 = self.ctx.Connection(pre_cell=self.ctx.Neuron('PreCell'),
+                                      post_cell=self.ctx.Neuron('PostCell'),
+                                      syntype='send',
+                                      number=3)
+        self.c1 = self.ctx.Connection(pre_cell=self.ctx.Neuron('PreCell'),
+                                      post_cell=self.ctx.Neuron('PostCell'),
+                                      syntype='gapJunction')
+        self.save()
+        self.cut = ConnectionIndex(self.context.stored.rdf_graph())
+
+    def test_exact(self):
+        self.assertEqual({self.c0.identifier}, set(self.cut.exact('PreCell', 'PostCell', 'send', 3)))
+
+    def test_exact_wrong_number(self):
+        self.assertEqual(set(), set(self.cut.exact('PreCell', 'PostCell', 'send', 4)))
+
+    def test_any_number(self):
+        self.assertEqual({self.c1.identifier},
+                         set(self.cut.any_number('PreCell', 'PostCell', 'GapJunction')))
+
+    def test_any_number_any_syntype(self):
+        self.assertEqual({self.c0.identifier, self.c1.identifier},
+                         set(self.cut.any_number('PreCell', 'PostCell', None)))
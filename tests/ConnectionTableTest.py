@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+from os.path import join as p
+import shutil
+import tempfile
+
+import numpy as np
+
+from owmeta.worm import Worm
+from owmeta.network import Network
+from owmeta.neuron import Neuron
+from owmeta.muscle import Muscle
+from owmeta.connection import Connection
+from owmeta.connection_table import ConnectionTable, MISSING
+
+from .DataTestTemplate import _DataTest
+
+
+class ConnectionTableTest(_DataTest):
+
+    ctx_classes = (Worm, Network, Neuron, Muscle, Connection)
+
+    def setUp(self):
+        super(ConnectionTableTest, self).setUp()
+        self.net = self.ctx.Network(conf=self.TestConfig)
+        self.ctx.Worm().neuron_network(self.net)
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        m0 = self.ctx.Muscle(name='MUSCLE0')
+        self.net.neuron(n0)
+        self.net.neuron(n1)
+        self.net.neuron(self.ctx.Neuron(name='NEURON2'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3,
+                                             syntype='send', synclass='Acetylcholine',
+                                             termination='neuron'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=n0, number=2,
+                                             syntype='gapJunction', termination='neuron'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=m0, syntype='send',
+                                             synclass='GABA', termination='muscle'))
+        self.table = self.net.connection_table()
+        self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
+
+    def tearDown(self):
+        super(ConnectionTableTest, self).tearDown()
+        shutil.rmtree(self.testdir)
+
+    def rows(self, table):
+        return set((r.pre, r.post, r.syntype, r.termination, r.number, r.synclass)
+                   for r in table)
+
+    def test_rows(self):
+        self.assertEqual({('NEURON0', 'NEURON1', 'send', 'neuron', 3, 'Acetylcholine'),
+                          ('NEURON1', 'NEURON0', 'gapJunction', 'neuron', 2, None),
+                          ('NEURON0', 'MUSCLE0', 'send', 'muscle', None, 'GABA')},
+                         self.rows(self.table))
+
+    def test_names(self):
+        self.assertEqual(['MUSCLE0', 'NEURON0', 'NEURON1', 'NEURON2'],
+                         list(self.table.names))
+
+    def test_dtypes(self):
+        self.assertEqual(np.int32, self.table.pre.dtype)
+        self.assertEqual(np.int32, self.table.post.dtype)
+        self.assertEqual(np.int8, self.table.syntype.dtype)
+        self.assertEqual(np.int8, self.table.termination.dtype)
+        self.assertEqual(np.int32, self.table.number.dtype)
+        self.assertEqual(np.int16, self.table.synclass.dtype)
+
+    def test_missing_number(self):
+        self.assertEqual(1, np.count_nonzero(self.table.number == MISSING))
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.table.pre = None
+        with self.assertRaises(ValueError):
+            self.table.pre[0] = 5
+
+    def test_mask(self):
+        sel = self.table.select(self.table.mask(pre='NEURON0', syntype='send'))
+        self.assertEqual({'NEURON1', 'MUSCLE0'}, set(r.post for r in sel))
+
+    def test_mask_synclass(self):
+        sel = self.table.select(self.table.mask(synclass='GABA'))
+        self.assertEqual(['MUSCLE0'], [r.post for r in sel])
+
+    def test_mask_unknown_values(self):
+        self.assertFalse(self.table.mask(pre='NOTACELL').any())
+        self.assertFalse(self.table.mask(synclass='Dopamine').any())
+
+    def test_mask_unknown_syntype_termination(self):
+        table = self.table_without_syntype()
+        self.assertFalse(table.mask(syntype='electrical').any())
+        self.assertFalse(table.mask(termination='gland').any())
+
+    def test_mask_known_syntype_excludes_missing(self):
+        table = self.table_without_syntype()
+        self.assertEqual([True, False], list(table.mask(syntype='send')))
+
+    def test_caller_arrays_writeable(self):
+        pre = np.array([0, 1], dtype=np.int32)
+        table = ConnectionTable(names=['A', 'B'], pre=pre, post=[1, 0], syntype=[1, 0],
+                                termination=[0, 0], number=[1, 1],
+                                synclass=[MISSING, MISSING], synclasses=[])
+        pre[0] = 1
+        self.assertTrue(pre.flags.writeable)
+        self.assertFalse(table.pre.flags.writeable)
+
+    def table_without_syntype(self):
+        # The second connection has neither a synapse type nor a termination
+        return ConnectionTable(names=['A', 'B'], pre=[0, 1], post=[1, 0], syntype=[1, 0],
+                               termination=[1, 0], number=[1, 1],
+                               synclass=[MISSING, MISSING], synclasses=[])
+
+    def test_group_by_pre(self):
+        counts = np.bincount(self.table.pre, minlength=len(self.table.names))
+        self.assertEqual(2, counts[self.table.index('NEURON0')])
+
+    def test_getitem_negative(self):
+        self.assertEqual(self.table[len(self.table) - 1].pre, self.table[-1].pre)
+
+    def test_save_load(self):
+        fname = p(self.testdir, 'connections.npz')
+        self.table.save(fname)
+        self.assertEqual(self.rows(self.table), self.rows(ConnectionTable.load(fname)))
+
+    def test_save_load_mmap(self):
+        fname = p(self.testdir, 'connections.npz')
+        self.table.save(fname)
+        loaded = ConnectionTable.load(fname, mmap=True)
+        self.assertIsInstance(loaded.pre, np.memmap)
+        self.assertEqual(self.rows(self.table), self.rows(loaded))
+
+    def test_save_load_mmap_empty(self):
+        fname = p(self.testdir, 'connections.npz')
+        self.table.select(self.table.mask(pre='NEURON2')).save(fname)
+        loaded = ConnectionTable.load(fname, mmap=True)
+        self.assertEqual(0, len(loaded))
+        self.assertEqual(list(self.table.names), list(loaded.names))
+
+    def test_cached(self):
+        self.assertIs(self.table, self.net.connection_table())
@@ -0,0 +1,164 @@
+from __future__ import absolute_import
+from os.path import join as p
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import owmeta_core
+from owmeta_core.bundle import Bundle, Descriptor, Installer
+from owmeta_core.context import Context
+from owmeta_core.data import Data, TRANSACTION_MANAGER_KEY
+
+from owmeta.worm import Worm
+from owmeta.network import Network, NeuronDegree, CONNECTOME_SNAPSHOT_CONF_KEY
+from owmeta.neuron import Neuron
+from owmeta.muscle import Muscle
+from owmeta.connection import Connection
+from owmeta.connection_table import ConnectionTable
+from owmeta.connectome_snapshot import (ConnectomeSnapshot, SNAPSHOT_FILE_NAME,
+                                        bundle_snapshot_path, load_snapshot)
+
+from .DataTestTemplate import _DataTest
+
+
+class ConnectomeSnapshotTest(_DataTest):
+
+    ctx_classes = (Worm, Network, Neuron, Muscle, Connection)
+
+    def setUp(self):
+        super(ConnectomeSnapshotTest, self).setUp()
+        self.net = self.ctx.Network(worm=self.ctx.Worm())
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        n2 = self.ctx.Neuron(name='NEURON2')
+        m0 = self.ctx.Muscle(name='MUSCLE0')
+        for n in (n0, n1, n2):
+            self.net.neuron(n)
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3,
+                                             syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n2, syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=n0, number=2,
+                                             syntype='gapJunction'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=1,
+                                             syntype='gapJunction'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n2, post_cell=m0, number=4,
+                                             syntype='send'))
+        self.save()
+        self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
+        self.path = p(self.testdir, 'snapshot.npz')
+        ConnectomeSnapshot.from_network(self.net, data_version='v1').save(self.path)
+
+    def tearDown(self):
+        self.conf[CONNECTOME_SNAPSHOT_CONF_KEY] = None
+        super(ConnectomeSnapshotTest, self).tearDown()
+        shutil.rmtree(self.testdir)
+
+    def use_snapshot(self):
+        self.conf[CONNECTOME_SNAPSHOT_CONF_KEY] = self.path
+
+    def test_load(self):
+        snapshot = ConnectomeSnapshot.load(self.path)
+        self.assertEqual(self.net.identifier, snapshot.network)
+        self.assertEqual('v1', snapshot.data_version)
+        self.assertEqual(5, len(snapshot.table))
+
+    def test_readable_as_connection_table(self):
+        self.assertEqual(5, len(ConnectionTable.load(self.path)))
+
+    def test_neuron_names(self):
+        expected = self.net.neuron_names()
+        self.use_snapshot()
+        self.assertEqual(expected, self.net.neuron_names())
+
+    def test_degree_table(self):
+        expected = self.net.degree_table()
+        self.use_snapshot()
+        self.assertEqual(expected, self.net.degree_table())
+
+    def test_degree_table_other_connections(self):
+        # A connection in the same context, but not one of the network's synapses
+        self.ctx.Connection(pre_cell=self.ctx.Neuron(name='NEURON0'),
+                            post_cell=self.ctx.Neuron(name='NEURON2'),
+                            number=5, syntype='gapJunction')
+        self.save()
+        expected = self.net.degree_table()
+        self.assertEqual(1, expected['NEURON0'].gap_degree)
+        self.use_snapshot()
+        self.assertEqual(expected, self.net.degree_table())
+
+    def test_adjacency(self):
+        for syntype in (None, 'send', 'gapJunction'):
+            expected = self.net.adjacency(syntype)
+            self.use_snapshot()
+            actual = self.net.adjacency(syntype)
+            self.conf[CONNECTOME_SNAPSHOT_CONF_KEY] = None
+            self.assertEqual(expected.names, actual.names)
+            self.assertEqual(expected.indptr, actual.indptr)
+            self.assertEqual(expected.indices, actual.indices)
+            self.assertEqual(expected.data, actual.data)
+
+    def test_connection_table_from_snapshot(self):
+        self.use_snapshot()
+        self.assertIs(load_snapshot(self.path).table, self.net.connection_table())
+
+    def test_used_without_querying(self):
+        self.use_snapshot()
+        self.net.neuron(self.ctx.Neuron(name='NEURON3'))
+        self.save()
+        self.assertNotIn('NEURON3', self.net.neuron_names())
+
+    def test_other_network_ignored(self):
+        self.use_snapshot()
+        other = self.ctx.Network(ident='http://example.org/other_network')
+        other.neuron(self.ctx.Neuron(name='NEURON3'))
+        self.assertEqual({'NEURON3'}, other.neuron_names())
+
+    def test_load_snapshot_reused(self):
+        self.assertIs(load_snapshot(self.path), load_snapshot(self.path))
+
+
+class BundleSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
+        conf = Data({'rdf.source': 'ZODB', 'rdf.store_conf': p(self.testdir, 'worm.db')})
+        conn = owmeta_core.connect(conf=conf)
+        try:
+            ctx = conn(Context)(ident='http://example.org/network')
+            net = ctx(Network)(worm=ctx(Worm)())
+            n0 = ctx(Neuron)(name='NEURON0')
+            n1 = ctx(Neuron)(name='NEURON1')
+            net.neuron(n0)
+            net.neuron(n1)
+            net.synapse(ctx(Connection)(pre_cell=n0, post_cell=n1, number=2,
+                                        syntype='send'))
+            with conf[TRANSACTION_MANAGER_KEY]:
+                ctx.save_context()
+            self.net_id = net.identifier
+            source_dir = p(self.testdir, 'source')
+            os.mkdir(source_dir)
+            ConnectomeSnapshot.from_network(net).save(p(source_dir, SNAPSHOT_FILE_NAME))
+            self.bundles_dir = p(self.testdir, 'bundles')
+            descriptor = Descriptor.make({'id': 'test/network',
+                                          'version': 1,
+                                          'includes': [ctx.identifier],
+                                          'files': {'includes': [SNAPSHOT_FILE_NAME]}})
+            Installer(source_dir, self.bundles_dir, graph=conf['rdf.graph']).install(
+                    descriptor)
+        finally:
+            conn.disconnect()
+
+    def tearDown(self):
+        shutil.rmtree(self.testdir)
+
+    def test_snapshot_found(self):
+        with Bundle('test/network', bundles_directory=self.bundles_dir) as bnd:
+            self.assertIsNotNone(bundle_snapshot_path(bnd))
+            net = bnd(Network)(ident=self.net_id)
+            with patch('owmeta.connectome_snapshot.load_snapshot',
+                       wraps=load_snapshot) as load:
+                degrees = net.degree_table()
+            load.assert_called_with(bundle_snapshot_path(bnd))
+        self.assertEqual(NeuronDegree(0, 1, 0), degrees['NEURON0'])
@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+
+from rdflib.term import Literal
+
+from owmeta.connection import Connection
+from owmeta.context_cache import ContextCache, context_fingerprint
+from owmeta.network import Network
+from owmeta.neuron import Neuron
+from owmeta.worm import Worm
+
+from .DataTestTemplate import _DataTest
+
+
+class ContextFingerprintTest(_DataTest):
+
+    ctx_classes = (Network, Neuron, Connection)
+
+    def test_unchanged(self):
+        self.ctx.Neuron(name='NEURON0')
+        self.assertEqual(context_fingerprint(self.context),
+                         context_fingerprint(self.context))
+
+    def test_type_declaration_ignored(self):
+        before = context_fingerprint(self.context)
+        self.ctx.Neuron(ident='http://example.org/NEURON0')
+        self.assertEqual(before, context_fingerprint(self.context))
+
+    def test_staged_statement(self):
+        n0 = self.ctx.Neuron(ident='http://example.org/NEURON0')
+        before = context_fingerprint(self.context)
+        n0.name('NEURON0')
+        self.assertNotEqual(before, context_fingerprint(self.context))
+
+    def test_staged_statement_replaced(self):
+        ''' Replacing a staged statement keeps the number of statements, but is a change '''
+        n0 = self.ctx.Neuron(ident='http://example.org/NEURON0')
+        n0.name('NEURON0')
+        before = context_fingerprint(self.context)
+        length = len(self.context)
+        name, = (s for s in self.context.contents() if s.to_triple()[1] == Neuron.name.link)
+        self.context.remove_statement(name)
+        n0.synonym('NEURON1')
+        self.assertEqual(length, len(self.context))
+        self.assertNotEqual(before, context_fingerprint(self.context))
+
+    def test_change_counter(self):
+        '''
+        Staged changes are counted with `Context._change_counter`, which isn't public in
+        owmeta_core
+        '''
+        msg = ('owmeta_core.context.Context._change_counter is missing or no longer'
+               ' counts staged changes. Update owmeta.context_cache._StagedChanges')
+        self.assertTrue(hasattr(self.context, '_change_counter'), msg)
+        before = self.context._change_counter
+        self.ctx.Neuron(ident='http://example.org/NEURON0').name('NEURON0')
+        self.assertGreater(self.context._change_counter, before, msg)
+
+    def test_saved_statement(self):
+        self.ctx.Neuron(name='NEURON0')
+        before = context_fingerprint(self.context.stored)
+        self.save()
+        self.assertNotEqual(before, context_fingerprint(self.context.stored))
+
+    def test_replaced_stored_statement(self):
+        ''' Replacing a statement keeps the number of statements, but is still a change '''
+        self.ctx.Neuron(name='NEURON0')
+        self.save()
+        before = context_fingerprint(self.context.stored)
+        graph = self.TestConfig['rdf.graph'].get_context(self.context.identifier)
+        n0, = graph.subjects(Neuron.name.link, Literal('NEURON0'))
+        graph.set((n0, Neuron.name.link, Literal('NEURON1')))
+        self.assertNotEqual(before, context_fingerprint(self.context.stored))
+
+    def test_other_context_object(self):
+        other = self.connection(type(self.context))(ident=self.context.identifier,
+                                                    conf=self.TestConfig)
+        self.assertNotEqual(context_fingerprint(self.context),
+                            context_fingerprint(other))
+
+
+class ContextCacheTest(_DataTest):
+
+    ctx_classes = (Worm, Network, Neuron, Connection)
+
+    def setUp(self):
+        super(ContextCacheTest, self).setUp()
+        self.cut = ContextCache()
+        self.builds = 0
+
+    def make(self):
+        self.builds += 1
+        return object()
+
+    def test_cached(self):
+        self.assertIs(self.cut.get(self.context, 'k', self.make),
+                      self.cut.get(self.context, 'k', self.make))
+
+    def test_cached_across_object_creation(self):
+        self.cut.get(self.context, 'k', self.make)
+        self.ctx.Neuron(ident='http://example.org/NEURON0')
+        self.cut.get(self.context, 'k', self.make)
+        self.assertEqual(1, self.builds)
+
+    def test_connection_number_change(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        conn = self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3, syntype='send')
+        net = self.ctx.Network()
+        self.ctx.Worm().neuron_network(net)
+        net.synapse(conn)
+        self.save()
+        net = self.context.stored(Network)()
+        self.assertEqual([('NEURON0', 'NEURON1', 3)], list(net.adjacency().edges()))
+        graph = self.TestConfig['rdf.graph'].get_context(self.context.identifier)
+        graph.set((conn.identifier, Connection.number.link, Literal(5)))
+        self.assertEqual([('NEURON0', 'NEURON1', 5)], list(net.adjacency().edges()))
+
+    def test_invalidate(self):
+        self.cut.get(self.context, 'k', self.make)
+        self.cut.invalidate(self.context.identifier)
+        self.cut.get(self.context, 'k', self.make)
+        self.assertEqual(2, self.builds)
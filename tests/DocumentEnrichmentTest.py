@@ -0,0 +1,151 @@
+from os import makedirs
+from os.path import join as p
+import json
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from owmeta.document import Document
+from owmeta.document_enrichment import (DocumentEnricher, enrich_documents,
+                                        _EnrichmentRun)
+
+
+ESUMMARY = '''<?xml version="1.0" encoding="UTF-8" ?>
+<eSummaryResult>
+<DocSum>
+    <Id>24098140</Id>
+    <Item Name="PubDate" Type="Date">2013 Oct</Item>
+    <Item Name="AuthorList" Type="List">
+        <Item Name="Author" Type="String">Leroux MR</Item>
+    </Item>
+    <Item Name="Title" Type="String">The Pubmed title</Item>
+</DocSum>
+</eSummaryResult>
+'''
+
+WORMBASE_PAPER = {
+    'fields': {
+        'authors': {'data': [{'label': 'Frederic MY'}]},
+        'pmid': {'data': '24098140'},
+        'year': {'data': None},
+    }
+}
+
+CROSSREF = [{
+    'coins': 'ctx_ver=Z39.88-2004&amp;rft.au=Emmons+S&amp;rft.au=Cook+S',
+    'title': 'The Crossref title',
+    'year': '2015',
+}]
+
+
+@pytest.fixture
+def metadata_server(http_server):
+    wbdir = p(http_server.directory, 'rest', 'widget', 'paper', 'WBPaper00044287')
+    makedirs(wbdir)
+    with open(p(wbdir, 'overview'), 'w') as f:
+        json.dump(WORMBASE_PAPER, f)
+    with open(p(http_server.directory, 'esummary.fcgi'), 'w') as f:
+        f.write(ESUMMARY)
+    with open(p(http_server.directory, 'dois'), 'w') as f:
+        json.dump(CROSSREF, f)
+    http_server.enricher_args = dict(
+            wormbase_root_url=http_server.url,
+            pubmed_url=http_server.url + '/esummary.fcgi',
+            crossref_url=http_server.url + '/dois',
+            api_key='key')
+    return http_server
+
+
+def _requested_paths(http_server):
+    paths = []
+    while True:
+        try:
+            req = http_server.requests.get(timeout=0.5)
+        except queue.Empty:
+            return paths
+        if req['method'] == 'GET':
+            paths.append(req['path'])
+
+
+def test_wormbase_then_pubmed(metadata_server):
+    doc = Document(wormbase='WBPaper00044287')
+    res = enrich_documents([doc], **metadata_server.enricher_args)
+    assert res.updated == [(doc, 'wormbase'), (doc, 'pubmed')]
+    assert set(doc.author()) == {'Frederic MY', 'Leroux MR'}
+    assert doc.title() == 'The Pubmed title'
+
+
+def test_crossref(metadata_server):
+    doc = Document(doi='10.1000/xyz')
+    res = enrich_documents([doc], **metadata_server.enricher_args)
+    assert res.updated == [(doc, 'crossref')]
+    assert set(doc.author()) == {'Emmons S', 'Cook S'}
+    assert doc.year() == '2015'
+
+
+def test_restrict_sources(metadata_server):
+    doc = Document(wormbase='WBPaper00044287')
+    res = enrich_documents([doc], sources=('pubmed',), **metadata_server.enricher_args)
+    assert res == ([], [], [])
+    assert _requested_paths(metadata_server) == []
+
+
+def test_duplicate_documents(metadata_server):
+    doc = Document(doi='10.1000/xyz')
+    res = enrich_documents([doc, doc], **metadata_server.enricher_args)
+    assert res.updated == [(doc, 'crossref')]
+    assert res.failed == []
+    assert len(_requested_paths(metadata_server)) == 1
+
+
+def test_unknown_source():
+    with pytest.raises(ValueError):
+        enrich_documents([Document(doi='10.1000/xyz')], sources=('bogus',))
+
+
+def test_retries(metadata_server):
+    doc = Document(wormbase='WBPaper00000000')
+    res = enrich_documents([doc], retries=2, backoff=0, **metadata_server.enricher_args)
+    assert [(d, s) for d, s, _ in res.failed] == [(doc, 'wormbase')]
+    assert len(_requested_paths(metadata_server)) == 3
+
+
+def test_deadline():
+    # A socket which accepts connections, but never responds
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    try:
+        url = 'http://{}:{}/esummary.fcgi'.format(*sock.getsockname())
+        doc = Document(pmid='24098140')
+        start = time.monotonic()
+        res = enrich_documents([doc], deadline=0.2, timeout=2, pubmed_url=url,
+                               api_key='key')
+        assert time.monotonic() - start < 1.5
+        assert res.unfinished == [(doc, 'pubmed')]
+    finally:
+        sock.close()
+
+
+def test_per_host_limit(monkeypatch):
+    lock = threading.Lock()
+    active = [0]
+    max_active = [0]
+
+    def fetch_json(self, url, session):
+        with lock:
+            active[0] += 1
+            max_active[0] = max(max_active[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return []
+
+    monkeypatch.setattr(_EnrichmentRun, 'fetch_json', fetch_json)
+    docs = [Document(doi=f'10.1000/{i}') for i in range(8)]
+    res = DocumentEnricher(per_host_limit=2).enrich(docs)
+    assert len(res.updated) == 8
+    assert max_active[0] == 2
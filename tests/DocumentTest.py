@@ -4,8 +4,11 @@ from .DataTestTemplate import _DataTest
 from owmeta_core.graph_object import IdentifierMissingException
 from owmeta.document import (Document,
                              _doi_uri_to_doi,
+                             update_documents_from_pubmed,
                              WormbaseRetrievalException)
 import pytest
+from os.path import join as p
+import queue
 
 
 class DocumentTest(_DataTest):
@@ -138,3 +141,91 @@ class DocumentElaborationTest(_DataTest):
         doc = self.ctx.Document()
         with self.assertRaises(WormbaseRetrievalException):
             doc.update_from_wormbase()
+
+
+ESUMMARY = """<?xml version="1.0" encoding="UTF-8" ?>
+<eSummaryResult>
+<DocSum>
+    <Id>{pmid1}</Id>
+    <Item Name="PubDate" Type="Date">2013 Oct</Item>
+    <Item Name="AuthorList" Type="List">
+        <Item Name="Author" Type="String">Frédéric MY</Item>
+        <Item Name="Author" Type="String">Leroux MR</Item>
+    </Item>
+    <Item Name="Title" Type="String">The first title</Item>
+    <Item Name="DOI" Type="String">10.1000/first</Item>
+</DocSum>
+<DocSum>
+    <Id>{pmid2}</Id>
+    <Item Name="PubDate" Type="Date">2015</Item>
+    <Item Name="AuthorList" Type="List">
+        <Item Name="Author" Type="String">Emmons S</Item>
+    </Item>
+    <Item Name="Title" Type="String">The second title</Item>
+</DocSum>
+</eSummaryResult>
+"""
+
+
+def _write_esummary(http_server):
+    with open(p(http_server.directory, 'esummary.fcgi'), 'w', encoding='UTF-8') as f:
+        f.write(ESUMMARY.format(pmid1='24098140', pmid2='12345'))
+
+
+def _requested_paths(http_server):
+    paths = []
+    while True:
+        try:
+            req = http_server.requests.get(timeout=0.5)
+        except queue.Empty:
+            return paths
+        if req['method'] == 'GET':
+            paths.append(req['path'])
+
+
+def test_update_documents_from_pubmed(http_server):
+    _write_esummary(http_server)
+    doc1 = Document(pmid='24098140')
+    doc2 = Document(pmid='12345')
+    updated = update_documents_from_pubmed([doc1, doc2], api_key='key',
+            url=http_server.url + '/esummary.fcgi')
+    assert set(updated) == {doc1, doc2}
+    assert set(doc1.author()) == {'Frédéric MY', 'Leroux MR'}
+    assert doc1.title() == 'The first title'
+    assert doc1.doi() == '10.1000/first'
+    assert doc2.year() == '2015'
+
+
+def test_update_documents_from_pubmed_one_request_per_batch(http_server):
+    _write_esummary(http_server)
+    docs = [Document(pmid='24098140'), Document(pmid='12345'), Document(pmid='999')]
+    update_documents_from_pubmed(docs, batch_size=2, api_key='key',
+            url=http_server.url + '/esummary.fcgi')
+    paths = _requested_paths(http_server)
+    assert len(paths) == 2
+    assert 'id=24098140,12345&' in paths[0]
+    assert 'id=999&' in paths[1]
+
+
+def test_update_documents_from_pubmed_same_pmid_once(http_server):
+    _write_esummary(http_server)
+    docs = [Document(pmid='24098140'), Document(pmid='24098140')]
+    update_documents_from_pubmed(docs, api_key='key',
+            url=http_server.url + '/esummary.fcgi')
+    assert len(_requested_paths(http_server)) == 1
+    assert all(d.title() == 'The first title' for d in docs)
+
+
+def test_update_from_pubmed_local(http_server):
+    _write_esummary(http_server)
+    doc = Document(pmid='12345')
+    doc.update_from_pubmed(url=http_server.url + '/esummary.fcgi')
+    assert doc.title() == 'The second title'
+    assert _requested_paths(http_server)[0].endswith('id=12345')
+
+
+def test_update_documents_from_pubmed_skips_without_pmid(http_server):
+    _write_esummary(http_server)
+    assert update_documents_from_pubmed([Document(doi='10.1000/first')], api_key='key',
+            url=http_server.url + '/esummary.fcgi') == []
+    assert _requested_paths(http_server) == []
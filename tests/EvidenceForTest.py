@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 from __future__ import print_function
+from os.path import join as p
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
 
+import owmeta_core
 from owmeta_core.context import Context
+from owmeta_core.data import Data, TRANSACTION_MANAGER_KEY
+from rdflib.namespace import RDF
+from rdflib.term import URIRef
+from owmeta.document import Document
 from owmeta.neuron import Neuron
+from owmeta.muscle import Muscle, BodyWallMuscle
 from owmeta.evidence import Evidence
-from owmeta.evidence import evidence_for
+from owmeta.evidence import (evidence_for, query_context, EvidenceIndex,
+                             EvidenceCoverage, TypeCoverage, FORMAT_VERSION,
+                             evidence_index_for_reference)
 from .DataTestTemplate import _DataTest
 
 
@@ -91,3 +106,284 @@ class EvidenceForTest(_DataTest):
         # Verify that there is at least one evidence object returned
         ev = next(ev_iterable, None)
         self.assertEqual(ev, None)
+
+
+class EvidenceIndexTest(_DataTest):
+    def setUp(self):
+        super(EvidenceIndexTest, self).setUp()
+        self.process_class(Evidence)
+        c1 = Context(ident='http://example.org/statements', conf=self.conf)
+        c1(Neuron)('AVAL').innexin('UNC-7')
+        c1(Neuron)('AVAR').innexin('UNC-9')
+        c2 = Context(ident='http://example.org/other_statements', conf=self.conf)
+        c2(Neuron)('AVAL').innexin('UNC-7')
+        evc = Context(ident='http://example.org/metadata', conf=self.conf)
+        evc(Evidence)(key='js2019').supports(c1.rdf_object)
+        evc(Evidence)(key='ab2020').refutes(c2.rdf_object)
+        c1.save_context()
+        c2.save_context()
+        evc.save_context()
+        self.ctx = self.connection(Context)().stored
+        self.index = EvidenceIndex.build(self.ctx.rdf_graph())
+
+    def test_contexts_for(self):
+        qctx = Context()
+        qctx(Neuron)('AVAL').innexin('UNC-7')
+        self.assertEqual(self.index.contexts_for(qctx.contents_triples()),
+                         {URIRef('http://example.org/statements'),
+                          URIRef('http://example.org/other_statements')})
+
+    def test_contexts_for_narrowed(self):
+        qctx = Context()
+        qctx(Neuron)('AVAL').innexin('UNC-7')
+        qctx(Neuron)('AVAR').innexin('UNC-9')
+        self.assertEqual(self.index.contexts_for(qctx.contents_triples()),
+                         {URIRef('http://example.org/statements')})
+
+    def test_query_context_same_as_unindexed(self):
+        qctx = Context()
+        qctx(Neuron)('AVAL').innexin('UNC-7')
+        graph = self.ctx.rdf_graph()
+        self.assertEqual(set(c.identifier for c in query_context(graph, qctx)),
+                         set(c.identifier for c in query_context(graph, qctx, self.index)))
+
+    def test_evidence_for_same_as_unindexed(self):
+        qctx = Context()
+        qctx(Neuron)('AVAL').innexin('UNC-7')
+        self.assertEqual(set(e.identifier for e in evidence_for(qctx, self.ctx)),
+                         set(e.identifier for e in evidence_for(qctx, self.ctx,
+                                                                index=self.index)))
+
+    def test_refuting(self):
+        qctx = Context()
+        qctx(Neuron)('AVAL').innexin('UNC-7')
+        self.assertEqual(self.index.evidence_for(qctx.contents_triples(), refuting=True),
+                         {Evidence(key='ab2020').identifier})
+
+    def test_no_evidence(self):
+        qctx = Context()
+        qctx(Neuron)('PVCL').innexin('UNC-7')
+        self.assertEqual(self.index.evidence_for(qctx.contents_triples()), set())
+
+    def test_save_load(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            fname = p(tempdir, 'index')
+            self.index.save(fname, 'fp')
+            loaded, fingerprint = EvidenceIndex.load(fname)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual('fp', fingerprint)
+        qctx = Context()
+        qctx(Neuron)('AVAL').innexin('UNC-7')
+        self.assertEqual(loaded.evidence_for(qctx.contents_triples()),
+                         self.index.evidence_for(qctx.contents_triples()))
+
+    def test_load_other_version(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            fname = p(tempdir, 'index')
+            with open(fname, 'wb') as f:
+                pickle.dump((FORMAT_VERSION + 1, None, {}, {}, {}, {}, {}, {}), f)
+            with self.assertRaises(ValueError):
+                EvidenceIndex.load(fname)
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_is_current(self):
+        self.assertTrue(self.index.is_current(self.ctx.rdf_graph()))
+
+    def test_not_current_after_change(self):
+        c1 = Context(ident='http://example.org/statements', conf=self.conf)
+        c1(Neuron)('PVCL').innexin('UNC-7')
+        c1.save_context()
+        self.assertFalse(self.index.is_current(self.ctx.rdf_graph()))
+
+
+class EvidenceCoverageTest(_DataTest):
+    def setUp(self):
+        super(EvidenceCoverageTest, self).setUp()
+        self.process_class(Evidence)
+        self.c1 = Context(ident='http://example.org/statements', conf=self.conf)
+        self.c1(Neuron)('AVAL').innexin('UNC-7')
+        self.c2 = Context(ident='http://example.org/other_statements', conf=self.conf)
+        self.c2(Neuron)('AVAR').innexin('UNC-9')
+        self.c2(BodyWallMuscle)('MDL8')
+        evc = Context(ident='http://example.org/metadata', conf=self.conf)
+        evc(Evidence)(key='js2019').supports(self.c1.rdf_object)
+        self.c1.save_context()
+        self.c2.save_context()
+        evc.save_context()
+        self.graph = self.connection(Context)().stored.rdf_graph()
+
+    def count(self, ctx, cls):
+        graph = self.graph
+        res = 0
+        for s, _, _ in graph.triples((None, None, None), ctx.identifier):
+            if (s, RDF.type, cls.rdf_type) in graph:
+                res += 1
+        return res
+
+    def test_contexts(self):
+        cov = EvidenceCoverage(self.graph, types=(Neuron, Muscle))
+        contexts = {c.context: c for c in cov.contexts()}
+        c1 = contexts[self.c1.identifier]
+        c2 = contexts[self.c2.identifier]
+        self.assertTrue(c1.supported)
+        self.assertFalse(c2.supported)
+        self.assertEqual(set(c1.counts), {Neuron})
+        self.assertEqual(set(c2.counts), {Neuron, Muscle})
+        self.assertFalse(contexts[URIRef('http://example.org/metadata')].counts)
+
+    def test_summary(self):
+        cov = EvidenceCoverage(self.graph, types=(Neuron, Muscle))
+        neuron, muscle = cov.summary()
+        n1 = self.count(self.c1, Neuron)
+        n2 = self.count(self.c2, Neuron)
+        self.assertEqual(neuron, TypeCoverage(Neuron, n1, n1 + n2))
+        self.assertEqual(muscle, TypeCoverage(Muscle, 0, self.count(self.c2, BodyWallMuscle)))
+        self.assertEqual(muscle.fraction, 0)
+        self.assertEqual(neuron.fraction, n1 / (n1 + n2))
+
+    def test_summary_after_contexts(self):
+        cov = EvidenceCoverage(self.graph, types=(Neuron, Muscle))
+        list(cov.contexts())
+        self.assertEqual(cov.summary(),
+                         EvidenceCoverage(self.graph, types=(Neuron, Muscle)).summary())
+
+    def test_no_statements(self):
+        from owmeta.channel import Channel
+        cov = EvidenceCoverage(self.graph, types=(Channel,))
+        self.assertIsNone(cov.summary()[0].fraction)
+
+
+class EvidenceIndexSupportedByTest(_DataTest):
+    def setUp(self):
+        super(EvidenceIndexSupportedByTest, self).setUp()
+        self.process_class(Evidence)
+        self.c1 = Context(ident='http://example.org/statements', conf=self.conf)
+        self.c1(Neuron)('AVAL').innexin('UNC-7')
+        self.c2 = Context(ident='http://example.org/other_statements', conf=self.conf)
+        self.c2(Neuron)('AVAR').innexin('UNC-9')
+        self.c3 = Context(ident='http://example.org/unsupported', conf=self.conf)
+        self.c3(Neuron)('PVCL').innexin('UNC-9')
+        evc = Context(ident='http://example.org/metadata', conf=self.conf)
+        self.doc = evc(Document)(key='emmons2015')
+        other = evc(Document)(key='white1986')
+        evc(Evidence)(key='ev1', reference=self.doc).supports(self.c1.rdf_object)
+        evc(Evidence)(key='ev2', reference=self.doc).supports(self.c2.rdf_object)
+        evc(Evidence)(key='ev3', reference=other).supports(self.c3.rdf_object)
+        for ctx in (self.c1, self.c2, self.c3, evc):
+            ctx.save_context()
+        self.graph = self.connection(Context)().stored.rdf_graph()
+        self.index = EvidenceIndex.build(self.graph, statements=False)
+
+    def test_contexts_supported_by(self):
+        ctxs = self.index.contexts_supported_by(self.doc.identifier)
+        self.assertEqual([c for c, _ in ctxs], [self.c2.identifier, self.c1.identifier])
+        for c, n in ctxs:
+            self.assertEqual(n, len(list(self.graph.quads((None, None, None, c)))))
+
+    def test_unknown_reference(self):
+        self.assertEqual(self.index.contexts_supported_by(URIRef('http://example.org/x')),
+                         [])
+
+    def test_statements_supported_by(self):
+        stmts = list(self.index.statements_supported_by(self.graph, self.doc.identifier))
+        self.assertEqual(set(q[3] for q in stmts), {self.c1.identifier, self.c2.identifier})
+        self.assertEqual(len(stmts), sum(n for _, n in
+                                         self.index.contexts_supported_by(self.doc.identifier)))
+
+    def test_statements_supported_by_paged(self):
+        stmts = list(self.index.statements_supported_by(self.graph, self.doc.identifier))
+        for offset in range(len(stmts) + 1):
+            for limit in (0, 1, 2, 5, len(stmts)):
+                self.assertEqual(
+                        list(self.index.statements_supported_by(
+                            self.graph, self.doc.identifier, offset, limit)),
+                        stmts[offset:offset + limit])
+
+    def test_for_reference(self):
+        index = EvidenceIndex.for_reference(self.graph, self.doc.identifier)
+        self.assertEqual(index.contexts_supported_by(self.doc.identifier),
+                         self.index.contexts_supported_by(self.doc.identifier))
+
+    def test_for_reference_counts_supported_contexts(self):
+        index = EvidenceIndex.for_reference(self.graph, self.doc.identifier)
+        self.assertEqual({self.c1.identifier, self.c2.identifier}, set(index.context_sizes))
+
+    def test_save_load(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            fname = p(tempdir, 'index')
+            self.index.save(fname)
+            loaded, _ = EvidenceIndex.load(fname)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual(loaded.contexts_supported_by(self.doc.identifier),
+                         self.index.contexts_supported_by(self.doc.identifier))
+
+
+class EvidenceIndexPersistenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix=__name__ + '.')
+        self.cache_dir = p(self.tempdir, 'cache')
+        self.doc = URIRef('http://example.org/doc')
+        self.connect()
+        self.ctx(Neuron)('AVAL').innexin('UNC-7')
+        ev = self.ctx(Evidence)(key='js2019')
+        ev.supports(self.ctx.rdf_object)
+        ev.reference(self.ctx(Document)(ident=self.doc))
+        self.save()
+
+    def tearDown(self):
+        self.connection.disconnect()
+        shutil.rmtree(self.tempdir)
+
+    def connect(self):
+        self.conf = Data({'rdf.source': 'ZODB',
+                          'rdf.store_conf': p(self.tempdir, 'worm.db')})
+        self.connection = owmeta_core.connect(conf=self.conf)
+        self.ctx = self.connection(Context)(ident='http://example.org/test-context')
+
+    def reconnect(self):
+        self.connection.disconnect()
+        self.connect()
+
+    def save(self):
+        with self.conf[TRANSACTION_MANAGER_KEY]:
+            self.ctx.save_context()
+
+    def supported(self):
+        index = evidence_index_for_reference(self.ctx.stored, self.doc,
+                                             cache_dir=self.cache_dir)
+        return dict(index.contexts_supported_by(self.doc))
+
+    def test_saved(self):
+        self.assertIn(self.ctx.identifier, self.supported())
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+    def test_reused_between_connections(self):
+        expected = self.supported()
+        self.reconnect()
+        with patch.object(EvidenceIndex, 'for_reference') as for_reference:
+            self.assertEqual(expected, self.supported())
+        for_reference.assert_not_called()
+
+    def test_rebuilt_after_commit(self):
+        before = self.supported()[self.ctx.identifier]
+        self.reconnect()
+        self.ctx(Neuron)('AVAR').innexin('UNC-9')
+        self.save()
+        self.reconnect()
+        self.assertGreater(self.supported()[self.ctx.identifier], before)
+
+    def test_other_version_rebuilt(self):
+        self.supported()
+        fname = p(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(fname, 'wb') as f:
+            pickle.dump((FORMAT_VERSION + 1, None, {}, {}, {}, {}, {}, {}), f)
+        self.reconnect()
+        self.assertIn(self.ctx.identifier, self.supported())
+        EvidenceIndex.load(fname)
@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+from os.path import join as p
+import shutil
+import tempfile
+import unittest
+
+from owmeta.analysis.extrasynaptic import CellExpression, Edge, read_mapping
+from owmeta.network import Network
+from owmeta.neuron import Neuron
+from owmeta.worm import Worm
+
+from .DataTestTemplate import _DataTest
+
+
+def naive_edges(released, mapping, expressed):
+    receptor_cells = dict()
+    for cell, receptors in expressed.items():
+        for r in receptors:
+            receptor_cells.setdefault(r, set()).add(cell)
+    return set(Edge(pre, post, t, r)
+               for pre, transmitters in released.items()
+               for t in transmitters
+               for r in mapping.get(t, ())
+               for post in receptor_cells.get(r, ()))
+
+
+class CellExpressionTest(unittest.TestCase):
+    def setUp(self):
+        self.released = {'ADEL': {'Dopamine'},
+                         'RIML': {'Tyramine', 'FLP-18'},
+                         'AVAL': set()}
+        self.expressed = {'AVAL': {'DOP-1', 'SER-4'},
+                          'RIML': {'DOP-1', 'NPR-1'},
+                          'ADEL': {'TYRA-2'}}
+        self.mapping = {'Dopamine': {'DOP-1', 'DOP-2'},
+                        'Tyramine': {'TYRA-2', 'SER-2'},
+                        'FLP-18': {'NPR-1'},
+                        'Serotonin': {'SER-4'}}
+        self.expression = CellExpression(self.released, self.expressed)
+
+    def test_edges(self):
+        self.assertEqual(naive_edges(self.released, self.mapping, self.expressed),
+                         set(self.expression.edges(self.mapping)))
+
+    def test_edges_sorted(self):
+        edges = list(self.expression.edges(self.mapping))
+        self.assertEqual(sorted(edges), edges)
+
+    def test_no_edges(self):
+        self.assertEqual(0, len(self.expression.edges({'Octopamine': {'OCTR-1'}})))
+
+    def test_ignore_case(self):
+        edges = self.expression.edges({'DOPAMINE': {'dop-1'}})
+        self.assertEqual({Edge('ADEL', 'AVAL', 'Dopamine', 'DOP-1'),
+                          Edge('ADEL', 'RIML', 'Dopamine', 'DOP-1')},
+                         set(edges))
+
+    def test_match_case(self):
+        expression = CellExpression(self.released, self.expressed, ignore_case=False)
+        self.assertEqual(0, len(expression.edges({'DOPAMINE': {'dop-1'}})))
+
+    def test_adjacency(self):
+        adj = self.expression.edges(self.mapping).adjacency()
+        self.assertEqual({('ADEL', 'AVAL', 1), ('ADEL', 'RIML', 1),
+                          ('RIML', 'ADEL', 1), ('RIML', 'RIML', 1)},
+                         set(adj.edges()))
+
+
+class ReadWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
+
+    def tearDown(self):
+        shutil.rmtree(self.testdir)
+
+    def test_read_mapping(self):
+        fname = p(self.testdir, 'mapping.tsv')
+        with open(fname, 'w') as f:
+            f.write('monoamine\treceptor\texcluded\n'
+                    'Dopamine\tDOP-1\t0\n'
+                    'Dopamine\tDOP-2\t\n'
+                    'Dopamine\tLGC-53\t1\n'
+                    'Tyramine\tSER-2\t0\n')
+        self.assertEqual({'Dopamine': {'DOP-1', 'DOP-2'}, 'Tyramine': {'SER-2'}},
+                         read_mapping(fname, 'monoamine'))
+
+    def test_write(self):
+        expression = CellExpression({'ADEL': {'Dopamine'}}, {'AVAL': {'DOP-1'}})
+        fname = p(self.testdir, 'edges.tsv')
+        expression.edges({'Dopamine': {'DOP-1'}}).write(fname)
+        with open(fname) as f:
+            self.assertEqual('pre_cell\tpost_cell\ttransmitter\treceptor\n'
+                             'ADEL\tAVAL\tDopamine\tDOP-1\n', f.read())
+
+
+class CellExpressionFromNetworkTest(_DataTest):
+
+    ctx_classes = (Worm, Network, Neuron)
+
+    def test_from_network(self):
+        net = self.ctx.Network(worm=self.ctx.Worm())
+        adel = self.ctx.Neuron(name='ADEL')
+        adel.neurotransmitter('Dopamine')
+        riml = self.ctx.Neuron(name='RIML')
+        riml.neuropeptide('FLP-18')
+        riml.receptor('DOP-1')
+        aval = self.ctx.Neuron(name='AVAL')
+        aval.receptor('NPR-1')
+        for n in (adel, riml, aval):
+            net.neuron(n)
+        self.ctx.Neuron(name='NOTINNETWORK').receptor('DOP-1')
+        self.save()
+
+        expression = CellExpression.from_network(net)
+        edges = expression.edges({'Dopamine': {'DOP-1'}, 'FLP-18': {'NPR-1'}})
+        self.assertEqual({Edge('ADEL', 'RIML', 'Dopamine', 'DOP-1'),
+                          Edge('RIML', 'AVAL', 'FLP-18', 'NPR-1')},
+                         set(edges))
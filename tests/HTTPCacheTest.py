@@ -0,0 +1,158 @@
+from os.path import join as p
+import os
+import queue
+import time
+
+import pytest
+
+from owmeta.document import Document, _json_request, _url_request
+from owmeta.http_cache import (CacheEntry, CacheMiss, SQLiteHTTPCache, cache_key,
+                               get_default_cache, set_default_cache)
+
+
+ESUMMARY = '''<?xml version="1.0" encoding="UTF-8" ?>
+<eSummaryResult>
+<DocSum>
+    <Id>12345</Id>
+    <Item Name="Title" Type="String">The title</Item>
+</DocSum>
+</eSummaryResult>
+'''
+
+
+@pytest.fixture
+def cache(tempdir):
+    return SQLiteHTTPCache(p(tempdir, 'cache.sqlite'))
+
+
+@pytest.fixture
+def server(http_server):
+    with open(p(http_server.directory, 'data.json'), 'w') as f:
+        f.write('{"a": 1}')
+    with open(p(http_server.directory, 'esummary.fcgi'), 'w') as f:
+        f.write(ESUMMARY)
+    return http_server
+
+
+def _requests(http_server):
+    res = []
+    while True:
+        try:
+            req = http_server.requests.get(timeout=0.5)
+        except queue.Empty:
+            return res
+        if req['method'] == 'GET':
+            res.append(req)
+
+
+def test_stores_response(server, cache):
+    url = server.url + '/data.json'
+    assert _json_request(url, cache=cache) == {'a': 1}
+    assert len(cache) == 1
+    assert cache.get(url).content == b'{"a": 1}'
+
+
+def test_fresh_entry_makes_no_request(server, cache):
+    url = server.url + '/data.json'
+    _url_request(url, cache=cache)
+    _requests(server)
+    resp = _url_request(url, cache=cache)
+    assert resp.json() == {'a': 1}
+    assert resp.from_cache
+    assert _requests(server) == []
+
+
+def test_expired_entry_revalidated(server, cache):
+    url = server.url + '/data.json'
+    _url_request(url, cache=cache)
+    cache.touch(url, now=0)
+    _requests(server)
+    cache.ttl = 60
+    resp = _url_request(url, cache=cache)
+    reqs = _requests(server)
+    assert len(reqs) == 1
+    assert 'if-modified-since' in reqs[0]['headers']
+    assert resp.json() == {'a': 1}
+    assert cache.get(url).age() < 60
+
+
+def test_expired_entry_replaced_when_changed(server, cache):
+    url = server.url + '/data.json'
+    _url_request(url, cache=cache)
+    cache.touch(url, now=0)
+    fname = p(server.directory, 'data.json')
+    with open(fname, 'w') as f:
+        f.write('{"a": 2}')
+    later = time.time() + 10
+    os.utime(fname, (later, later))
+    assert _url_request(url, cache=cache).json() == {'a': 2}
+    assert cache.get(url).content == b'{"a": 2}'
+
+
+def test_etag_sent_when_revalidating(server, cache):
+    url = server.url + '/data.json'
+    cache.put(CacheEntry(url, 200, {'ETag': '"abc"'}, b'{}', 0))
+    _url_request(url, cache=cache)
+    reqs = _requests(server)
+    assert reqs[0]['headers']['if-none-match'] == '"abc"'
+
+
+def test_offline_uses_expired_entry(server, cache):
+    url = server.url + '/data.json'
+    cache.put(CacheEntry(url, 200, {}, b'{"a": 3}', 0))
+    cache.offline = True
+    assert _json_request(url, cache=cache) == {'a': 3}
+    assert _requests(server) == []
+
+
+def test_offline_miss(cache):
+    cache.offline = True
+    with pytest.raises(CacheMiss):
+        _url_request('http://example.org/nothing', cache=cache)
+
+
+def test_persistent(server, cache):
+    url = server.url + '/data.json'
+    _url_request(url, cache=cache)
+    assert SQLiteHTTPCache(cache.path).get(url).content == b'{"a": 1}'
+
+
+def test_default_cache_pubmed(server, cache):
+    prev = get_default_cache()
+    set_default_cache(cache)
+    try:
+        for _ in range(2):
+            doc = Document(pmid='12345')
+            doc.update_from_pubmed(url=server.url + '/esummary.fcgi')
+            assert doc.title() == 'The title'
+    finally:
+        set_default_cache(prev)
+    assert len(_requests(server)) == 1
+
+
+def test_cache_key_drops_api_key():
+    assert (cache_key('http://example.org/esummary.fcgi?db=pubmed&id=1,2&api_key=secret')
+            == 'http://example.org/esummary.fcgi?db=pubmed&id=1,2')
+
+
+def test_cache_key_unchanged():
+    url = 'http://example.org/esummary.fcgi?db=pubmed&id=1,2'
+    assert cache_key(url) == url
+
+
+def test_api_key_not_stored(server, cache):
+    url = server.url + '/data.json?api_key=secret'
+    _url_request(url, cache=cache)
+    assert cache.get(server.url + '/data.json').content == b'{"a": 1}'
+    with open(cache.path, 'rb') as f:
+        assert b'secret' not in f.read()
+
+
+def test_streamed_response_stored_when_read(server, cache):
+    url = server.url + '/esummary.fcgi'
+    resp = _url_request(url, cache=cache, stream=True)
+    with resp:
+        assert not resp._content_consumed
+        assert cache.get(url) is None
+        content = b''.join(resp.iter_content(16))
+    assert cache.get(url).content == content == ESUMMARY.encode()
@@ -0,0 +1,248 @@
+from __future__ import absolute_import
+import unittest
+
+from rdflib.graph import Graph
+from rdflib.term import Literal, URIRef
+
+from owmeta.cell import Cell
+from owmeta.lineage import (LineageTree, LineageTrie, lineage_tree, lineage_trie,
+                            lineage_triples, parse_lineage_name, write_lineage)
+
+from .DataTestTemplate import _DataTest
+
+
+class ParseLineageNameTest(unittest.TestCase):
+    def test_space(self):
+        self.assertEqual(('AB', 'plapaaaapp'), parse_lineage_name('AB plapaaaapp'))
+
+    def test_dot(self):
+        self.assertEqual(('P6', 'paa'), parse_lineage_name('P6.paa'))
+
+    def test_no_separator_founder(self):
+        self.assertEqual(('MS', 'pappa'), parse_lineage_name('MSpappa'))
+
+    def test_blast_only(self):
+        self.assertEqual(('EMS', ''), parse_lineage_name('EMS'))
+        self.assertEqual(('V5', ''), parse_lineage_name('V5'))
+
+    def test_ventral_cord_no_separator(self):
+        self.assertEqual(('P11', 'aap'), parse_lineage_name('P11aap'))
+        self.assertEqual(('P3', 'aap'), parse_lineage_name('P3aap'))
+
+    def test_ventral_cord_dot(self):
+        self.assertEqual(('P12', 'pa'), parse_lineage_name('P12.pa'))
+
+
+class LineageTrieTest(unittest.TestCase):
+    def setUp(self):
+        self.trie = LineageTrie()
+        self.trie.add('AB plapaaaapp', 'adal', 'ADAL')
+        self.trie.add('AB prapaaaapp', 'adar', 'ADAR')
+        self.trie.add('AB plapaaaapa', 'adel', 'ADEL')
+        self.trie.add('AB plapaaaap', 'parent', 'PARENT')
+        self.trie.add('MS pappa', 'ms', 'MSCELL')
+        self.trie.add('V5 paa', 'v5', 'V5CELL')
+
+    def test_descendants(self):
+        self.assertEqual({'ADAL', 'ADEL', 'PARENT'}, self.trie.descendants('AB pla'))
+
+    def test_descendants_of_cell(self):
+        self.assertEqual({'ADAL', 'ADEL'},
+                         self.trie.descendants('PARENT', include_self=False))
+
+    def test_descendants_of_founder(self):
+        self.assertEqual({'MSCELL'}, self.trie.descendants('EMS'))
+
+    def test_lca(self):
+        self.assertEqual('AB p', self.trie.lca('ADAL', 'ADAR'))
+        self.assertEqual('AB plapaaaap', self.trie.lca('ADAL', 'ADEL'))
+
+    def test_lca_across_founders(self):
+        self.assertEqual('P0', self.trie.lca('ADAL', 'MSCELL'))
+
+    def test_lca_separate_lineages(self):
+        self.assertIsNone(self.trie.lca('ADAL', 'V5CELL'))
+        self.assertIsNone(self.trie.distance('ADAL', 'V5CELL'))
+
+    def test_distance(self):
+        self.assertEqual(18, self.trie.distance('ADAL', 'ADAR'))
+        self.assertEqual(1, self.trie.distance('ADAL', 'PARENT'))
+        self.assertEqual(0, self.trie.distance('ADAL', 'AB plapaaaapp'))
+
+    def test_ancestors(self):
+        self.assertEqual(['MS pap', 'MS pa', 'MS p', 'MS', 'EMS', 'P1', 'P0'],
+                         self.trie.ancestors('MS papp'))
+
+    def test_unknown(self):
+        self.assertIsNone(self.trie.node('AB aaaa'))
+        with self.assertRaises(KeyError):
+            self.trie.lca('NOTACELL', 'ADAL')
+
+    def test_parent_links(self):
+        self.assertEqual({('parent', 'adal'), ('parent', 'adel')},
+                         set(self.trie.parent_links()))
+
+
+class LineageTrieContextTest(_DataTest):
+    ctx_classes = (Cell,)
+
+    def setUp(self):
+        super(LineageTrieContextTest, self).setUp()
+        self.ctx.Cell(name='ADAL', lineageName='AB plapaaaapp')
+        self.ctx.Cell(name='ADAR', lineageName='AB prapaaaapp')
+        self.ctx.Cell(name='PARENT', lineageName='AB plapaaaap')
+        self.save()
+
+    def test_from_context(self):
+        trie = lineage_trie(self.context.stored)
+        self.assertEqual('AB p', trie.lca('ADAL', 'ADAR'))
+
+    def test_cached(self):
+        self.assertIs(lineage_trie(self.context.stored), lineage_trie(self.context.stored))
+
+    def test_link_cells(self):
+        trie = lineage_trie(self.context.stored)
+        self.assertEqual(1, trie.link_cells(self.context))
+        self.save()
+        self.assertEqual('PARENT', self.ctx.Cell(name='ADAL').daughterOf().name())
+        self.assertEqual({'ADAL'},
+                         set(x.name() for x in self.ctx.Cell(name='PARENT').parentOf()))
+
+
+class VentralCordLineageTest(unittest.TestCase):
+    def setUp(self):
+        self.trie = LineageTrie()
+        self.trie.add('P3.aap', 'vc1', 'VC1')
+        self.trie.add('P4.aap', 'vc2', 'VC2')
+        self.trie.add('P11.aaap', 'as11', 'AS11')
+        self.trie.add('P12.pa', 'pda', 'PDA')
+        self.trie.add('D aaaa', 'd', 'DCELL')
+        self.trie.add('Z2', 'z2', 'Z2')
+
+    def test_ancestors(self):
+        self.assertEqual(['P3.aa', 'P3.a', 'P3.'], self.trie.ancestors('VC1'))
+        self.assertEqual(['P11.aaa', 'P11.aa', 'P11.a', 'P11'],
+                         self.trie.ancestors('AS11'))
+
+    def test_germline_ancestors(self):
+        self.assertEqual(['P4', 'P3', 'P2', 'P1', 'P0'], self.trie.ancestors('Z2'))
+
+    def test_separate_from_germline(self):
+        self.assertIsNone(self.trie.lca('VC1', 'DCELL'))
+        self.assertEqual({'DCELL', 'Z2'}, self.trie.descendants('P3'))
+        self.assertEqual({'VC1'}, self.trie.descendants('P3.'))
+
+    def test_separate_blasts(self):
+        self.assertIsNone(self.trie.lca('VC1', 'VC2'))
+
+    def test_no_separator(self):
+        self.assertIs(self.trie.node('AS11'), self.trie.node('P11aaap'))
+
+    def test_lineage_name_round_trip(self):
+        for name in self.trie.ancestors('VC1') + self.trie.ancestors('AS11'):
+            self.assertEqual(name, self.trie.node(name).lineage_name)
+
+
+class LineageTreeTest(unittest.TestCase):
+    def setUp(self):
+        #      a
+        #    /   \
+        #   b     c
+        #  / \     \
+        # d   e     f
+        #           |
+        #           g
+        self.tree = LineageTree([('a', 'b'), ('a', 'c'), ('b', 'd'), ('b', 'e'),
+                                 ('c', 'f'), ('f', 'g'), ('x', 'y')])
+
+    def test_depth(self):
+        self.assertEqual(0, self.tree.depth_of('a'))
+        self.assertEqual(3, self.tree.depth_of('g'))
+
+    def test_parent(self):
+        self.assertEqual('f', self.tree.parent_of('g'))
+        self.assertIsNone(self.tree.parent_of('a'))
+
+    def test_ancestors(self):
+        self.assertEqual(['f', 'c', 'a'], self.tree.ancestors('g'))
+
+    def test_subtree(self):
+        self.assertEqual({'b', 'd', 'e'}, set(self.tree.subtree('b')))
+        self.assertEqual({'f', 'g'}, set(self.tree.subtree('c', include_self=False)))
+
+    def test_subtree_parents_first(self):
+        sub = self.tree.subtree('a')
+        for cell in sub:
+            parent = self.tree.parent_of(cell)
+            if parent is not None:
+                self.assertLess(sub.index(parent), sub.index(cell))
+
+    def test_is_ancestor(self):
+        self.assertTrue(self.tree.is_ancestor('a', 'g'))
+        self.assertFalse(self.tree.is_ancestor('b', 'g'))
+
+    def test_lca(self):
+        self.assertEqual('a', self.tree.lca('d', 'g'))
+        self.assertEqual('b', self.tree.lca('d', 'e'))
+        self.assertEqual('c', self.tree.lca('g', 'c'))
+        self.assertIsNone(self.tree.lca('d', 'y'))
+
+    def test_lca_same_as_naive(self):
+        cells = list(self.tree.identifiers)
+        for a in cells:
+            for b in cells:
+                ancestors_a = [a] + self.tree.ancestors(a)
+                ancestors_b = set([b] + self.tree.ancestors(b))
+                expected = next((x for x in ancestors_a if x in ancestors_b), None)
+                self.assertEqual(expected, self.tree.lca(a, b))
+
+    def test_cycle(self):
+        tree = LineageTree([('a', 'b'), ('b', 'c'), ('c', 'a')])
+        self.assertEqual(3, len(tree))
+        self.assertEqual(2, max(tree.depth))
+
+
+class LineageTriplesTest(unittest.TestCase):
+    def setUp(self):
+        self.trie = LineageTrie()
+        self.trie.add('AB plapaaaap', URIRef('http://example.org/parent'), 'PARENT')
+        self.trie.add('AB plapaaaapp', URIRef('http://example.org/adal'), 'ADAL')
+
+    def test_direct_only(self):
+        triples = [t for batch in lineage_triples(self.trie, intermediate=False)
+                   for t in batch]
+        self.assertEqual({(URIRef('http://example.org/parent'), Cell.parentOf.link,
+                           URIRef('http://example.org/adal')),
+                          (URIRef('http://example.org/adal'), Cell.daughterOf.link,
+                           URIRef('http://example.org/parent'))},
+                         set(triples))
+
+    def test_batches(self):
+        batches = list(lineage_triples(self.trie, batch_size=7))
+        self.assertTrue(all(len(b) <= 7 for b in batches))
+        self.assertGreater(len(batches), 1)
+
+    def test_full_lineage(self):
+        graph = Graph()
+        write_lineage(self.trie, graph, batch_size=5)
+        tree = LineageTree.from_graph(graph)
+        adal = URIRef('http://example.org/adal')
+        # P0 -> AB -> ABp -> ... -> ABplapaaaap -> ADAL
+        self.assertEqual(11, tree.depth_of(adal))
+        self.assertEqual(Cell.make_identifier_direct('P0'), tree.ancestors(adal)[-1])
+        self.assertEqual(Literal('AB pla'),
+                         graph.value(Cell.make_identifier_direct('ABpla'),
+                                     Cell.lineageName.link))
+
+
+class LineageTreeContextTest(_DataTest):
+    ctx_classes = (Cell,)
+
+    def test_from_context(self):
+        p = self.ctx.Cell(name='peas')
+        c = self.ctx.Cell(name='carrots')
+        c.daughterOf(p)
+        self.save()
+        tree = lineage_tree(self.context.stored)
+        self.assertEqual(p.identifier, tree.parent_of(c.identifier))
+        self.assertIs(tree, lineage_tree(self.context.stored))
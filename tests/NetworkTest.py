@@ -1,4 +1,6 @@
 from __future__ import absolute_import
+from unittest.mock import patch
+
 from owmeta.worm import Worm
 from owmeta.network import Network
 from owmeta.neuron import Neuron
@@ -9,7 +11,7 @@ from .DataTestTemplate import _DataTest
 
 class NetworkTest(_DataTest):
 
-    ctx_classes = (Worm, Network, Neuron)
+    ctx_classes = (Worm, Network, Neuron, Connection)
 
     def setUp(self):
         super(NetworkTest, self).setUp()
@@ -52,3 +54,238 @@ class NetworkTest(_DataTest):
         self.save()
         n = self.context.stored(Network)()
         self.assertIn(n1.identifier, [x.identifier for x in n.interneurons()])
+
+    def test_adjacency(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        n2 = self.ctx.Neuron(name='NEURON2')
+        self.net.neuron(n0)
+        self.net.neuron(n1)
+        self.net.neuron(n2)
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3, syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=n0, number=2, syntype='gapJunction'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n2, syntype='send'))
+        adj = self.net.adjacency()
+        self.assertEqual(['NEURON0', 'NEURON1', 'NEURON2'], adj.names)
+        self.assertEqual([0, 2, 3, 3], adj.indptr)
+        self.assertEqual({('NEURON0', 'NEURON1', 3),
+                          ('NEURON0', 'NEURON2', 1),
+                          ('NEURON1', 'NEURON0', 2)}, set(adj.edges()))
+
+    def test_adjacency_syntype(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3, syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=n0, number=2, syntype='gapJunction'))
+        adj = self.net.adjacency(syntype='gapJunction')
+        self.assertEqual([('NEURON1', 'NEURON0', 2)], list(adj.edges()))
+
+    def test_adjacency_cached(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3, syntype='send'))
+        self.assertIs(self.net.adjacency(), self.net.adjacency())
+
+    def test_adjacency_cache_invalidated_on_change(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3, syntype='send'))
+        self.save()
+        adj = self.net.adjacency()
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=n0, number=1, syntype='send'))
+        self.save()
+        self.assertEqual(2, len(self.net.adjacency()))
+        self.assertEqual(1, len(adj))
+
+    def test_degree_table(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        n2 = self.ctx.Neuron(name='NEURON2')
+        self.net.neuron(n0)
+        self.net.neuron(n1)
+        self.net.neuron(n2)
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=3,
+                                             syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n2, number=1,
+                                             syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=n0,
+                                             syntype='gapJunction'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1,
+                                             syntype='gapJunction'))
+        # Not one of the network's synapses
+        self.ctx.Connection(pre_cell=n2, post_cell=n0, syntype='send')
+        table = self.net.degree_table()
+        self.assertEqual((0, 2, 1), table['NEURON0'])
+        self.assertEqual((1, 0, 1), table['NEURON1'])
+        self.assertEqual((1, 0, 0), table['NEURON2'])
+
+    def _add_expression(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n0.receptor('GLR-1')
+        n0.receptor('NMR-1')
+        n0.type('interneuron')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        n1.receptor('GLR-1')
+        n1.neurotransmitter('Serotonin')
+        n1.innexin('UNC-7')
+        self.net.neuron(n0)
+        self.net.neuron(n1)
+        other = self.ctx.Neuron(name='NOTINNETWORK')
+        other.receptor('GLR-1')
+        self.save()
+
+    def test_property_index_get(self):
+        self._add_expression()
+        index = self.net.property_index()
+        self.assertEqual({'NEURON0', 'NEURON1'}, index.get('receptor', 'GLR-1'))
+        self.assertEqual({'NEURON1'}, index.get('neurotransmitter', 'Serotonin'))
+        self.assertEqual({'NEURON1'}, index.get('innexin', 'UNC-7'))
+        self.assertEqual({'NEURON0'}, index.get('type', 'interneuron'))
+        self.assertEqual(set(), index.get('neuropeptide', 'FLP-1'))
+
+    def test_property_index_batched(self):
+        self._add_expression()
+        index = self.net.property_index()
+        self.assertEqual({'GLR-1': {'NEURON0', 'NEURON1'}, 'NMR-1': {'NEURON0'},
+                          'DOP-1': set()},
+                         index.get_many('receptor', ['GLR-1', 'NMR-1', 'DOP-1']))
+        self.assertEqual({'NEURON0', 'NEURON1'},
+                         index.any_of('receptor', ['NMR-1', 'GLR-1']))
+        self.assertEqual({'NEURON0'}, index.all_of('receptor', ['NMR-1', 'GLR-1']))
+        self.assertEqual(set(), index.all_of('receptor', []))
+
+    def test_property_index_values(self):
+        self._add_expression()
+        self.assertEqual({'GLR-1', 'NMR-1'}, self.net.property_index().values('receptor'))
+
+    def test_property_index_unknown_property(self):
+        with self.assertRaises(ValueError):
+            self.net.property_index().get('name', 'NEURON0')
+
+    def test_property_index_cached(self):
+        self._add_expression()
+        self.assertIs(self.net.property_index(), self.net.property_index())
+
+    def test_property_index_invalidated_on_change(self):
+        self._add_expression()
+        self.net.property_index()
+        n2 = self.ctx.Neuron(name='NEURON2')
+        n2.receptor('GLR-1')
+        self.net.neuron(n2)
+        self.save()
+        self.assertIn('NEURON2', self.net.property_index().get('receptor', 'GLR-1'))
+
+    def test_neurons_by_type(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n0.type('sensory')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        n1.type('interneuron')
+        n1.type('motor')
+        n2 = self.ctx.Neuron(name='NEURON2')
+        for n in (n0, n1, n2):
+            self.net.neuron(n)
+        self.save()
+        by_type = self.net.neurons_by_type()
+        self.assertEqual({'sensory': [n0.identifier],
+                          'interneuron': [n1.identifier],
+                          'motor': [n1.identifier]},
+                         {t: [n.identifier for n in ns] for t, ns in by_type.items()})
+        self.assertTrue(all(isinstance(n, Neuron)
+                            for ns in by_type.values() for n in ns))
+
+    def test_neurons_by_type_does_not_modify_network(self):
+        self.net.neuron(self.ctx.Neuron(name='NEURON0'))
+        self.save()
+        before = len(self.net.neuron.defined_values)
+        self.net.sensory()
+        self.net.interneurons()
+        self.net.motor()
+        self.assertEqual(before, len(self.net.neuron.defined_values))
+
+    def test_type_methods_build_once(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n0.type('sensory')
+        self.net.neuron(n0)
+        self.save()
+        with patch.object(Network, '_make_neurons_by_type',
+                          autospec=True,
+                          side_effect=Network._make_neurons_by_type) as make:
+            self.net.sensory()
+            self.net.interneurons()
+            self.net.motor()
+        self.assertEqual(1, make.call_count)
+
+    def test_type_methods_build_once_stored(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n0.type('sensory')
+        self.net.neuron(n0)
+        self.save()
+        net = self.context.stored(Network)()
+        with patch.object(Network, '_make_neurons_by_type',
+                          autospec=True,
+                          side_effect=Network._make_neurons_by_type) as make:
+            self.assertEqual([n0.identifier], [n.identifier for n in net.sensory()])
+            net.interneurons()
+            net.motor()
+        self.assertEqual(1, make.call_count)
+
+    def test_type_methods_empty(self):
+        self.assertEqual([], self.net.sensory())
+        self.assertEqual([], self.net.motor())
+
+    def _add_named(self):
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n0.synonym('N0')
+        n0.synonym('SHARED')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        n1.synonym('SHARED')
+        self.net.neuron(n0)
+        self.net.neuron(n1)
+        self.save()
+        return n0, n1
+
+    def test_aneuron_indexed(self):
+        n0, _ = self._add_named()
+        neuron = self.net.aneuron('NEURON0')
+        self.assertEqual(n0.identifier, neuron.identifier)
+        self.assertEqual('NEURON0', neuron.name())
+
+    def test_aneuron_synonym(self):
+        n0, _ = self._add_named()
+        self.assertEqual(n0.identifier, self.net.aneuron('N0').identifier)
+
+    def test_aneuron_ambiguous_synonym(self):
+        self._add_named()
+        self.assertIsNone(self.net.name_index().identifier('SHARED'))
+
+    def test_aneurons(self):
+        n0, n1 = self._add_named()
+        neurons = self.net.aneurons(['NEURON1', 'NEURON0', 'NOTANEURON'])
+        self.assertEqual([n1.identifier, n0.identifier],
+                         [n.identifier for n in neurons[:2]])
+        self.assertEqual('NOTANEURON', neurons[2].name())
+
+    def test_aneuron_builds_index_once(self):
+        self._add_named()
+        with patch.object(Network, '_make_name_index',
+                          autospec=True,
+                          side_effect=Network._make_name_index) as make:
+            self.net.aneuron('NEURON0')
+            self.net.aneuron('NEURON1')
+            self.net.aneuron('N0')
+            self.net.aneurons(['NEURON0', 'NEURON1'])
+            self.net.aneurons(['N0'])
+        self.assertEqual(1, make.call_count)
+
+    def test_name_index_identifiers(self):
+        n0, n1 = self._add_named()
+        self.assertEqual({'NEURON1': n1.identifier, 'N0': n0.identifier},
+                         self.net.name_index().identifiers(['NEURON1', 'N0', 'SHARED']))
+
+    def test_name_index_invalidated_on_change(self):
+        self._add_named()
+        self.assertIsNone(self.net.name_index().identifier('NEURON2'))
+        n2 = self.ctx.Neuron(name='NEURON2')
+        self.net.neuron(n2)
+        self.save()
+        self.assertEqual(n2.identifier, self.net.name_index().identifier('NEURON2'))
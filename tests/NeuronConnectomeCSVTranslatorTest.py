@@ -0,0 +1,127 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import tempfile
+import shutil
+from os.path import join as p
+
+from owmeta_core.context import IMPORTS_CONTEXT_KEY
+
+from owmeta.data_trans.data_with_evidence_ds import DataWithEvidenceDataSource
+from owmeta.data_trans.connections import (NeuronConnectomeCSVTranslator,
+                                           ConnectomeCSVDataSource)
+from owmeta.cell import Cell
+from owmeta.connection import Connection
+from owmeta.muscle import Muscle, BodyWallMuscle
+from owmeta.network import Network
+from owmeta.neuron import Neuron
+from owmeta.worm import Worm
+
+from .DataTestTemplate import _DataTest
+
+
+CSV = '''Source,Target,Weight,Type
+AVAL,AVAR,2,electrical
+AVAL,PVCL,5,chemical
+PVCL,MDL08,1,chemical
+mdl08,AVAL,3,chemical
+AVAR,MC1V,4,chemical
+AVAR,NOTACELL,1,chemical
+'''
+
+
+class NeuronConnectomeCSVTranslatorTest(_DataTest):
+    ctx_classes = (Worm, Network, Neuron, Muscle, BodyWallMuscle, Cell, Connection)
+
+    def setUp(self):
+        super(NeuronConnectomeCSVTranslatorTest, self).setUp()
+        self.conf[IMPORTS_CONTEXT_KEY] = 'http://example.org/imports_context'
+        self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
+        with open(p(self.testdir, 'connectome.csv'), 'w') as f:
+            f.write(CSV)
+        self.mapper.add_class(Connection)
+        self.mapper.save()
+
+        self.neurons_ds = self.context(DataWithEvidenceDataSource)(key='neurons')
+        net = self.neurons_ds.data_context(Network)(
+                worm=self.neurons_ds.data_context(Worm)())
+        for name in ('AVAL', 'AVAR', 'PVCL'):
+            net.neuron(self.neurons_ds.data_context(Neuron)(name))
+        self.pvcl = self.neurons_ds.data_context(Neuron)('PVCL')
+        self.pvcl.synonym('PVC left')
+        self.neurons_ds.data_context.save()
+
+        self.muscles_ds = self.context(DataWithEvidenceDataSource)(key='muscles')
+        worm = self.muscles_ds.data_context(Worm)()
+        worm.muscle(self.muscles_ds.data_context(Muscle)('MDL8'))
+        self.muscles_ds.data_context.save()
+
+        self.connectome_ds = self.context(ConnectomeCSVDataSource)(key='connectome')
+        self.connectome_ds.file_name('connectome.csv')
+        self.connectome_ds.basedir = lambda: self.testdir
+
+    def tearDown(self):
+        super(NeuronConnectomeCSVTranslatorTest, self).tearDown()
+        shutil.rmtree(self.testdir)
+
+    def translate(self, **kwargs):
+        cut = self.context(NeuronConnectomeCSVTranslator)(**kwargs)
+        res = cut(self.connectome_ds, self.neurons_ds, self.muscles_ds)
+        return res
+
+    def output_triples(self, res):
+        triples = set(res.data_context.contents_triples())
+        for ctx in res.data_context.imports:
+            triples |= set((ctx.identifier,) + t for t in ctx.contents_triples())
+        return triples
+
+    def test_connections(self):
+        res = self.translate()
+        conns = res.data_context.stored(Connection).query()
+        res.data_context.save_imports(transitive=False)
+        res.data_context.save()
+        for ctx in res.data_context.imports:
+            ctx.save()
+        self.assertEqual(len(list(conns.load())), 5)
+
+    def test_bulk_output_identical(self):
+        expected = self.output_triples(self.translate())
+        actual = self.output_triples(self.translate(bulk=True))
+        self.assertTrue(expected)
+        self.assertEqual(expected, actual)
+
+    def test_bulk_output_identical_small_batches(self):
+        expected = self.output_triples(self.translate())
+        actual = self.output_triples(self.translate(bulk=True, batch_size=1))
+        self.assertEqual(expected, actual)
+
+    def test_bulk_output_identical_syntype_case(self):
+        self.write_csv('AVAL,AVAR,2,Send\nAVAL,PVCL,5,GAPJUNCTION\n')
+        expected = self.output_triples(self.translate())
+        actual = self.output_triples(self.translate(bulk=True))
+        self.assertEqual(expected, actual)
+        self.assertEqual({'send', 'gapJunction'}, self.syntypes(actual))
+
+    def test_bulk_output_identical_unknown_syntype(self):
+        self.write_csv('AVAL,AVAR,2,bogus\n')
+        expected = self.output_triples(self.translate())
+        actual = self.output_triples(self.translate(bulk=True))
+        self.assertEqual(expected, actual)
+        self.assertEqual(set(), self.syntypes(actual))
+
+    def write_csv(self, rows):
+        with open(p(self.testdir, 'connectome.csv'), 'w') as f:
+            f.write('Source,Target,Weight,Type\n' + rows)
+
+    def syntypes(self, triples):
+        return set(str(t[-1]) for t in triples if t[-2] == Connection.syntype.link)
+
+    def test_synonym(self):
+        self.assertEqual({self.pvcl.identifier}, self.synonym_post_cells())
+
+    def test_synonym_bulk(self):
+        self.assertEqual({self.pvcl.identifier}, self.synonym_post_cells(bulk=True))
+
+    def synonym_post_cells(self, **kwargs):
+        self.write_csv('AVAL,PVC left,5,chemical\n')
+        triples = self.output_triples(self.translate(**kwargs))
+        return set(t[-1] for t in triples if t[-2] == Connection.post_cell.link)
@@ -3,7 +3,7 @@ from __future__ import absolute_import
 
 from .DataTestTemplate import _DataTest
 
-from owmeta.neuron import Neuron
+from owmeta.neuron import Neuron, neuron_connections
 from owmeta.cell import Cell
 from owmeta.connection import Connection
 from owmeta_core.context import Context
@@ -95,6 +95,103 @@ class NeuronTest(_DataTest):
         n.connection(self.ctx.Connection(n, self.neur('PVCL'), syntype='send'))
         self.assertEqual(1, n.connection.count())
 
+    def test_GJ_degree(self):
+        n0 = self.neur('NEURON0')
+        n1 = self.neur('NEURON1')
+        self.ctx.Connection(pre_cell=n0, post_cell=n1, syntype='gapJunction')
+        self.ctx.Connection(pre_cell=n1, post_cell=n0, syntype='gapJunction')
+        self.ctx.Connection(pre_cell=n0, post_cell=n1, syntype='send')
+        self.save()
+        self.assertEqual(1, self.neur('NEURON0').GJ_degree())
+
+    def test_Syn_degree(self):
+        n0 = self.neur('NEURON0')
+        n1 = self.neur('NEURON1')
+        n2 = self.neur('NEURON2')
+        self.ctx.Connection(pre_cell=n0, post_cell=n1, syntype='send')
+        self.ctx.Connection(pre_cell=n2, post_cell=n0, syntype='send')
+        self.ctx.Connection(pre_cell=n1, post_cell=n0, syntype='gapJunction')
+        self.save()
+        self.assertEqual(2, self.neur('NEURON0').Syn_degree())
+
+    def test_load_prefetch(self):
+        n0 = self.neur('NEURON0')
+        n0.receptor('GLR-1')
+        n0.receptor('GLR-2')
+        n0.type('interneuron')
+        self.neur('NEURON1').receptor('UNC-8')
+        self.save()
+        q = self.context.stored(Neuron).query()
+        loaded = {n.name(): n for n in q.load(prefetch=('name', 'receptor', 'type'))}
+        self.assertEqual({'GLR-1', 'GLR-2'}, loaded['NEURON0'].receptor())
+        self.assertEqual({'UNC-8'}, loaded['NEURON1'].receptor())
+        self.assertEqual('interneuron', loaded['NEURON0'].type.one())
+        self.assertEqual(set(), loaded['NEURON1'].type())
+
+    def test_load_prefetch_no_query(self):
+        self.neur('NEURON0').receptor('GLR-1')
+        self.save()
+        q = self.context.stored(Neuron).query()
+        loaded = list(q.load(prefetch=('receptor',)))
+        self.TestConfig['rdf.graph'].remove((None, None, None))
+        self.assertEqual({'GLR-1'}, loaded[0].receptor())
+
+    def test_load_prefetch_not_datatype_property(self):
+        q = self.context.stored(Neuron).query()
+        with self.assertRaises(ValueError):
+            q.load(prefetch=('channel',))
+
+    def test_connection_either(self):
+        n0 = self.neur('NEURON0')
+        n1 = self.neur('NEURON1')
+        n2 = self.neur('NEURON2')
+        c0 = self.ctx.Connection(pre_cell=n0, post_cell=n1, syntype='send')
+        c1 = self.ctx.Connection(pre_cell=n2, post_cell=n0, syntype='gapJunction')
+        self.ctx.Connection(pre_cell=n1, post_cell=n2, syntype='send')
+        self.save()
+        self.assertEqual({c0.identifier, c1.identifier},
+                         set(self.neur('NEURON0').connection.get_terms('either')))
+        self.assertEqual({c0.identifier, c1.identifier},
+                         set(c.identifier for c in self.neur('NEURON0').connection.get('either')))
+
+    def test_connection_either_filter(self):
+        n0 = self.neur('NEURON0')
+        n1 = self.neur('NEURON1')
+        n2 = self.neur('NEURON2')
+        c0 = self.ctx.Connection(pre_cell=n0, post_cell=n1, syntype='send')
+        self.ctx.Connection(pre_cell=n2, post_cell=n0, syntype='gapJunction')
+        self.save()
+        self.assertEqual([c0.identifier],
+                         list(self.neur('NEURON0').connection.get_terms('either', syntype='send')))
+
+    def test_connection_either_self_loop_once(self):
+        n0 = self.neur('NEURON0')
+        self.ctx.Connection(pre_cell=n0, post_cell=n0, syntype='send')
+        self.save()
+        self.assertEqual(1, len(list(self.neur('NEURON0').connection.get('either'))))
+        self.assertEqual(1, self.neur('NEURON0').connection.count('either'))
+
+    def test_neuron_connections(self):
+        n0 = self.neur('NEURON0')
+        n1 = self.neur('NEURON1')
+        n2 = self.neur('NEURON2')
+        c0 = self.ctx.Connection(pre_cell=n0, post_cell=n1, syntype='send')
+        c1 = self.ctx.Connection(pre_cell=n1, post_cell=n2, syntype='send')
+        self.save()
+        res = neuron_connections([self.neur('NEURON0'), self.neur('NEURON1'), self.neur('NEURON2')])
+        self.assertEqual({c0.identifier}, set(c.identifier for c in res[n0.identifier]))
+        self.assertEqual({c0.identifier, c1.identifier}, set(c.identifier for c in res[n1.identifier]))
+        self.assertEqual({c1.identifier}, set(c.identifier for c in res[n2.identifier]))
+
+    def test_neuron_connections_pre(self):
+        n0 = self.neur('NEURON0')
+        n1 = self.neur('NEURON1')
+        c0 = self.ctx.Connection(pre_cell=n0, post_cell=n1, syntype='send')
+        self.save()
+        res = neuron_connections([self.neur('NEURON0'), self.neur('NEURON1')], 'pre')
+        self.assertEqual([c0.identifier], [c.identifier for c in res[n0.identifier]])
+        self.assertEqual([], res[n1.identifier])
+
     def test_neighbor_context(self):
         n0 = self.ctx.Neuron(name='NEURON0')
         n1 = self.ctx.Neuron(name='NEURON1')
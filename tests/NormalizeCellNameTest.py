@@ -0,0 +1,58 @@
+from __future__ import absolute_import
+import random
+import re
+import unittest
+
+from owmeta.utils import normalize_cell_name, normalize_cell_names
+
+
+def reference_normalize_cell_name(name):
+    # The rules as first written for #137
+    if re.match(r'\w+0+[1-9]+', name):
+        name = re.sub(r'0+', '', name)
+    if re.match(r'\w+BWM\w+', name):
+        name = re.sub(r'BWM', '', name)
+    return name.upper()
+
+
+CASES = ['VD01', 'DB02', 'AS10', 'AS010', 'VA012', 'DD05', 'AVAL', 'avar', 'MU_ANAL',
+         'dBWML1', 'vBWMR10', 'dBWMR07', 'BWM', 'xBWM', 'BWMx', 'xBW0M01', '0BWMx01',
+         'VD10', 'PVQL', 'I1L', 'M2R', 'DB1/3', '', 'MVL01', 'DR05BWM']
+
+
+class NormalizeCellNameTest(unittest.TestCase):
+    def test_zeros(self):
+        self.assertEqual('VD1', normalize_cell_name('VD01'))
+
+    def test_trailing_zero_kept(self):
+        self.assertEqual('AS10', normalize_cell_name('AS10'))
+
+    def test_body_wall_muscle(self):
+        self.assertEqual('DL1', normalize_cell_name('dBWML1'))
+
+    def test_same_as_reference(self):
+        for name in CASES:
+            self.assertEqual(reference_normalize_cell_name(name),
+                             normalize_cell_name(name), name)
+
+    def test_batch(self):
+        self.assertEqual([reference_normalize_cell_name(n) for n in CASES],
+                         normalize_cell_names(CASES))
+
+    def test_batch_iterable(self):
+        self.assertEqual(['VD1', 'AVAL'], normalize_cell_names(iter(['VD01', 'aval'])))
+
+
+def test_normalize_cell_names_benchmark():
+    """
+    Not really a test, but a benchmark: normalizes the names in a connectome-sized edge
+    list, which names a few hundred cells many times over
+    """
+    rng = random.Random(0)
+    vocabulary = ['{}{:02d}'.format(prefix, i)
+                  for prefix in ('VD', 'DB', 'AS', 'VA', 'dBWML', 'vBWMR', 'AVAL', 'PVQ')
+                  for i in range(1, 25)]
+    names = [rng.choice(vocabulary) for _ in range(200000)]
+    normalized = normalize_cell_names(names)
+    expected = {n: reference_normalize_cell_name(n) for n in vocabulary}
+    assert normalized == [expected[n] for n in names]
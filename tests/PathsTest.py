@@ -0,0 +1,168 @@
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from owmeta.analysis.paths import (distance_matrix, dijkstra, edge_lengths,
+                                   floyd_warshall, shortest_paths)
+from owmeta.connection import Connection
+from owmeta.network import Adjacency, Network
+from owmeta.neuron import Neuron
+from owmeta.muscle import Muscle
+from owmeta.worm import Worm
+
+from .DataTestTemplate import _DataTest
+
+
+def adjacency(edges):
+    names = sorted(set(a for a, _, _ in edges) | set(b for _, b, _ in edges))
+    index = {n: i for i, n in enumerate(names)}
+    indptr = [0] * (len(names) + 1)
+    indices = []
+    data = []
+    for a, b, w in sorted(edges, key=lambda e: (index[e[0]], index[e[1]])):
+        indptr[index[a] + 1] += 1
+        indices.append(index[b])
+        data.append(w)
+    for i in range(len(names)):
+        indptr[i + 1] += indptr[i]
+    return Adjacency(names, index, indptr, indices, data)
+
+
+def naive_apsp(mat):
+    n = mat.shape[0]
+    mat = mat.copy()
+    for k in range(n):
+        for i in range(n):
+            for j in range(n):
+                if mat[i, k] + mat[k, j] < mat[i, j]:
+                    mat[i, j] = mat[i, k] + mat[k, j]
+    return mat
+
+
+class PathFunctionsTest(unittest.TestCase):
+    def setUp(self):
+        self.adj = adjacency([('A', 'B', 1), ('B', 'C', 4), ('A', 'C', 1), ('C', 'D', 2)])
+
+    def test_distance_matrix(self):
+        names, mat = distance_matrix(self.adj)
+        self.assertEqual(['A', 'B', 'C', 'D'], names)
+        self.assertEqual(1.0, mat[0, 1])
+        self.assertEqual(0.25, mat[1, 2])
+        self.assertEqual(np.inf, mat[1, 0])
+        self.assertEqual(0, mat[3, 3])
+
+    def test_floyd_warshall(self):
+        _, mat = distance_matrix(self.adj)
+        floyd_warshall(mat)
+        self.assertEqual(1.5, mat[0, 3])
+        self.assertEqual(0.75, mat[1, 3])
+        self.assertEqual(np.inf, mat[3, 0])
+
+    def test_floyd_warshall_same_as_naive(self):
+        rng = np.random.default_rng(0)
+        mat = rng.uniform(1, 10, (30, 30))
+        mat[rng.uniform(size=mat.shape) < 0.8] = np.inf
+        np.fill_diagonal(mat, 0)
+        np.testing.assert_array_equal(naive_apsp(mat), floyd_warshall(mat.copy()))
+
+    def test_dijkstra_same_as_floyd_warshall(self):
+        _, mat = distance_matrix(self.adj, weight='hops', directed=False)
+        paths = dijkstra(self.adj, weight='hops', directed=False)
+        np.testing.assert_array_equal(floyd_warshall(mat), paths.distances)
+
+    def test_dijkstra_sources(self):
+        paths = dijkstra(self.adj, sources=['B', 'A'])
+        self.assertEqual((2, 4), paths.distances.shape)
+        self.assertEqual(0.75, paths.distance('B', 'D'))
+        self.assertEqual(1.5, paths.distance('A', 'D'))
+
+    def test_undirected(self):
+        _, mat = distance_matrix(self.adj, directed=False)
+        floyd_warshall(mat)
+        self.assertEqual(1.5, mat[3, 0])
+
+    def test_cells(self):
+        names, mat = distance_matrix(self.adj, cells=['A', 'B', 'D'])
+        self.assertEqual(['A', 'B', 'D'], names)
+        floyd_warshall(mat)
+        self.assertEqual(np.inf, mat[0, 2])
+
+    def test_weight_function(self):
+        np.testing.assert_array_equal([2.0, 4.0], edge_lengths([1, 2], lambda d: d * 2))
+
+    def test_unknown_weighting(self):
+        with self.assertRaises(ValueError):
+            edge_lengths([1], 'bogus')
+
+
+class ShortestPathsTest(_DataTest):
+
+    ctx_classes = (Worm, Network, Neuron, Muscle, Connection)
+
+    def setUp(self):
+        super(ShortestPathsTest, self).setUp()
+        self.net = self.ctx.Network(worm=self.ctx.Worm())
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n1 = self.ctx.Neuron(name='NEURON1')
+        n2 = self.ctx.Neuron(name='NEURON2')
+        m0 = self.ctx.Muscle(name='MUSCLE0')
+        for n in (n0, n1, n2):
+            self.net.neuron(n)
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n1, number=2,
+                                             syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=m0, number=4,
+                                             syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=m0, post_cell=n2, number=1,
+                                             syntype='send'))
+        self.net.synapse(self.ctx.Connection(pre_cell=n1, post_cell=n2, number=1,
+                                             syntype='gapJunction'))
+        self.save()
+        self.cache_dir = tempfile.mkdtemp(prefix=__name__ + '.')
+
+    def tearDown(self):
+        super(ShortestPathsTest, self).tearDown()
+        shutil.rmtree(self.cache_dir)
+
+    def test_shortest_paths(self):
+        paths = shortest_paths(self.net)
+        self.assertEqual(1.5, paths.distance('NEURON0', 'NEURON2'))
+
+    def test_syntype(self):
+        paths = shortest_paths(self.net, syntype='send')
+        self.assertEqual(1.75, paths.distance('NEURON0', 'NEURON2'))
+
+    def test_neurons_only(self):
+        paths = shortest_paths(self.net, syntype='send', neurons_only=True)
+        self.assertNotIn('MUSCLE0', paths.names)
+        self.assertEqual(np.inf, paths.distance('NEURON0', 'NEURON2'))
+
+    def test_dijkstra_method(self):
+        np.testing.assert_array_equal(
+                shortest_paths(self.net).distances,
+                shortest_paths(self.net, method='dijkstra').distances)
+
+    def test_cached(self):
+        paths = shortest_paths(self.net, cache_dir=self.cache_dir)
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+        cached = shortest_paths(self.net, cache_dir=self.cache_dir)
+        self.assertEqual(paths.names, cached.names)
+        np.testing.assert_array_equal(paths.distances, cached.distances)
+
+    def test_cache_keyed_by_arguments(self):
+        shortest_paths(self.net, cache_dir=self.cache_dir)
+        shortest_paths(self.net, syntype='send', cache_dir=self.cache_dir)
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+    def test_cache_invalidated_on_change(self):
+        shortest_paths(self.net, cache_dir=self.cache_dir)
+        n0 = self.ctx.Neuron(name='NEURON0')
+        n2 = self.ctx.Neuron(name='NEURON2')
+        self.net.synapse(self.ctx.Connection(pre_cell=n0, post_cell=n2, number=10,
+                                             syntype='send'))
+        self.save()
+        paths = shortest_paths(self.net, cache_dir=self.cache_dir)
+        self.assertEqual(0.1, paths.distance('NEURON0', 'NEURON2'))
@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+from os.path import join as p
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from owmeta_core.command import OWM
+from rdflib.term import Literal, URIRef
+
+from owmeta.data_trans.connections import NeuronConnectomeCSVTranslator
+import owmeta.utils
+import save_data
+from save_data import (DSMethods, build_isolated, merge, owmeta_module_dependencies,
+                       update_translator_hash)
+
+
+CTX = URIRef('http://example.org/ctx')
+S = URIRef('http://example.org/s')
+P = URIRef('http://example.org/p')
+Q = URIRef('http://example.org/q')
+
+
+def rewrite(self):
+    ''' A translation which changes a statement and removes another '''
+    with self.owm.connect() as conn, conn.transaction_manager:
+        ctx = conn.rdf.get_context(CTX)
+        ctx.set((S, P, Literal(2)))
+        ctx.remove((S, Q, None))
+    self.built['rewrite'] = 'digest'
+
+
+class BuildIsolatedTest(unittest.TestCase):
+    def setUp(self):
+        self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
+        self.owmdir = p(self.testdir, '.owm')
+        owm = OWM(owmdir=self.owmdir, non_interactive=True)
+        owm.message = lambda *args, **kwargs: None
+        owm.init(default_context_id='http://example.org/default')
+        with owm.connect() as conn, conn.transaction_manager:
+            ctx = conn.rdf.get_context(CTX)
+            ctx.add((S, P, Literal(1)))
+            ctx.add((S, Q, Literal(1)))
+
+    def tearDown(self):
+        shutil.rmtree(self.testdir)
+
+    def test_methods(self):
+        methods = DSMethods(owmdir=self.owmdir)._methods()
+        self.assertIn('connectome', methods)
+        self.assertTrue(all(not m.startswith('_') for m in methods))
+
+    def test_changes_merged(self):
+        with patch.object(DSMethods, 'rewrite', rewrite, create=True):
+            added, removed, digest = build_isolated(self.owmdir, 'rewrite')
+        try:
+            m = DSMethods(owmdir=self.owmdir)
+            merge(m, added, removed)
+        finally:
+            os.unlink(added)
+            os.unlink(removed)
+        with m.owm.connect() as conn:
+            self.assertEqual({(S, P, Literal(2))},
+                             set(conn.rdf.get_context(CTX).triples((None, None, None))))
+
+    def test_same_size_rewrite_changes_digest(self):
+        owm = OWM(owmdir=self.owmdir)
+        with owm.connect() as conn:
+            before = save_data._context_digests(conn.rdf)
+            with conn.transaction_manager:
+                conn.rdf.get_context(CTX).set((S, P, Literal(2)))
+            after = save_data._context_digests(conn.rdf)
+        self.assertEqual(before[CTX][0], after[CTX][0])
+        self.assertNotEqual(before[CTX], after[CTX])
+
+
+class TranslatorHashTest(unittest.TestCase):
+    def digest(self):
+        h = hashlib.sha256()
+        update_translator_hash(h, NeuronConnectomeCSVTranslator())
+        return h.hexdigest()
+
+    def test_dependencies(self):
+        deps = owmeta_module_dependencies('owmeta.data_trans.connections')
+        self.assertTrue({'owmeta.utils', 'owmeta.connection', 'owmeta.bulk_query',
+                         'owmeta.cell_names'} <= deps)
+
+    def test_helper_change_forces_rebuild(self):
+        expected = self.digest()
+        read_source = save_data._read_source
+
+        def changed_utils(path):
+            res = read_source(path)
+            if path == owmeta.utils.__file__:
+                res += b'\n# changed\n'
+            return res
+
+        with patch('save_data._read_source', side_effect=changed_utils):
+            self.assertNotEqual(expected, self.digest())
+        self.assertEqual(expected, self.digest())
@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+import tempfile
+import shutil
+from os.path import join as p
+
+from owmeta_core.context import IMPORTS_CONTEXT_KEY
+
+from owmeta.cell import Cell
+from owmeta.data_trans.data_with_evidence_ds import DataWithEvidenceDataSource
+from owmeta.data_trans.wormatlas import (WormAtlasCellListDataTranslator,
+                                         WormAtlasCellListDataSource)
+from owmeta.network import Network
+from owmeta.neuron import Neuron
+from owmeta.worm import Worm
+
+from .DataTestTemplate import _DataTest
+
+
+CELL_LIST = '''Cell\tLineage Name\tDescription
+AVAL\tAB alppaaapa\tventral cord interneuron
+PVC left\tC aappa\tventral cord interneuron
+'''
+
+
+class WormAtlasCellListDataTranslatorTest(_DataTest):
+    ctx_classes = (Worm, Network, Neuron)
+
+    def setUp(self):
+        super(WormAtlasCellListDataTranslatorTest, self).setUp()
+        self.conf[IMPORTS_CONTEXT_KEY] = 'http://example.org/imports_context'
+        self.testdir = tempfile.mkdtemp(prefix=__name__ + '.')
+        with open(p(self.testdir, 'cells.tsv'), 'w') as f:
+            f.write(CELL_LIST)
+
+        self.neurons_ds = self.context(DataWithEvidenceDataSource)(key='neurons')
+        net = self.neurons_ds.data_context(Network)(
+                worm=self.neurons_ds.data_context(Worm)())
+        net.neuron(self.neurons_ds.data_context(Neuron)('AVAL'))
+        pvcl = self.neurons_ds.data_context(Neuron)('PVCL')
+        pvcl.synonym('PVC left')
+        net.neuron(pvcl)
+        self.neurons_ds.data_context.save()
+
+        self.cell_list_ds = self.context(WormAtlasCellListDataSource)(key='cell_list')
+        self.cell_list_ds.file_name('cells.tsv')
+        self.cell_list_ds.basedir = lambda: self.testdir
+
+    def tearDown(self):
+        super(WormAtlasCellListDataTranslatorTest, self).tearDown()
+        shutil.rmtree(self.testdir)
+
+    def lineage_names(self):
+        cut = self.context(WormAtlasCellListDataTranslator)()
+        res = cut(self.cell_list_ds, self.neurons_ds)
+        triples = set()
+        for ctx in res.data_context.imports:
+            triples |= set(ctx.contents_triples())
+        return {s: str(o) for s, p, o in triples if p == Cell.lineageName.link}
+
+    def test_lineage_name(self):
+        aval = Neuron.make_identifier_direct('AVAL')
+        self.assertEqual('AB alppaaapa', self.lineage_names()[aval])
+
+    def test_lineage_name_by_synonym(self):
+        pvcl = Neuron.make_identifier_direct('PVCL')
+        self.assertEqual('C aappa', self.lineage_names()[pvcl])
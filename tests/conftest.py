@@ -22,9 +22,10 @@ def tempdir():
 
 
 class ServerData():
-    def __init__(self, server, request_queue):
+    def __init__(self, server, request_queue, directory=None):
         self.server = server
         self.requests = request_queue
+        self.directory = directory
         self.scheme = 'http'
 
     @property
@@ -46,7 +47,7 @@ def _http_server():
 
         process = Process(target=pfunc)
 
-        server_data = ServerData(server, request_queue)
+        server_data = ServerData(server, request_queue, srvdir)
 
         def start():
             process.start()
@@ -86,14 +87,21 @@ def http_server():
 
 def make_server(request_queue):
     class _Handler(SimpleHTTPRequestHandler):
-        def handle_request(self, code):
+        def record_request(self):
             request_queue.put(dict(
                 method=self.command,
                 path=self.path,
                 headers={k.lower(): v for k, v in self.headers.items()}))
+
+        def handle_request(self, code):
+            self.record_request()
             self.send_response(code)
             self.end_headers()
 
+        def do_GET(self):
+            self.record_request()
+            super().do_GET()
+
         def do_POST(self):
             self.handle_request(201)
 